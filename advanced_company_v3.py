@@ -15,6 +15,12 @@ from enum import Enum, auto
 from pathlib import Path
 import uuid
 
+from telemetry import get_telemetry
+from cassette import pace
+from scheduler import get_scheduler
+from quorum import gather_quorum
+from decision_history import DecisionHistory
+
 class TaskPriority(Enum):
     """任务优先级"""
     CRITICAL = auto()  # 紧急
@@ -298,7 +304,7 @@ class AdvancedCompanySystem:
         self.meetings: List[Meeting] = []
         
         # 通信
-        self.messages: List[Dict] = []
+        self.messages = DecisionHistory("messages", agent_key="from")
         self.notifications: List[Dict] = []
         
         # 财务
@@ -554,16 +560,19 @@ class AdvancedCompanySystem:
             duration=60
         )
         
-        # 并行评估
-        eval_results = await asyncio.gather(
-            self._agent_evaluate("cto", project, "technical"),
-            self._agent_evaluate("cfo", project, "financial"),
-            self._agent_evaluate("cpo", project, "product"),
-            self._agent_evaluate("coo", project, "operational")
-        )
+        # 并行评估（达到法定人数或截止时间即进入CEO决策）
+        gathered = await gather_quorum({
+            "cto": self._agent_evaluate("cto", project, "technical"),
+            "cfo": self._agent_evaluate("cfo", project, "financial"),
+            "cpo": self._agent_evaluate("cpo", project, "product"),
+            "coo": self._agent_evaluate("coo", project, "operational")
+        })
         
-        # CEO决策
-        decision = await self._ceo_decision(project, eval_results)
+        # CEO决策（注明所依据的评估，迟到的评估事后追加）
+        decision = await self._ceo_decision(project, list(gathered.results.values()))
+        decision["inputs"] = gathered.inputs()
+        if gathered.missing:
+            print(f"   ⏱️ 未等待: {', '.join(gathered.missing)} ({gathered.reason})")
         
         if decision["approved"]:
             project.budget = decision["budget"]
@@ -591,8 +600,11 @@ class AdvancedCompanySystem:
         """Agent评估"""
         agent = self.agents[agent_id]
         agent.state = AgentState.THINKING
-        
-        await asyncio.sleep(0.5)  # 模拟思考时间
+        try:
+            await pace(0.5)  # 模拟思考时间（回放模式跳过）
+        finally:
+            # 法定人数已满足时迟到评估会被取消（late=cancel），也要恢复状态
+            agent.state = AgentState.IDLE
         
         scores = {
             "technical": {"feasible": True, "complexity": random.choice(["low", "medium", "high"]), "score": random.randint(60, 95)},
@@ -601,7 +613,6 @@ class AdvancedCompanySystem:
             "operational": {"team_ready": random.choice([True, False]), "resources": random.choice(["sufficient", "limited", "insufficient"]), "score": random.randint(60, 95)}
         }
         
-        agent.state = AgentState.IDLE
         agent.tasks_completed += 1
         
         return {"agent": agent_id, "aspect": aspect, **scores[aspect]}
@@ -613,7 +624,7 @@ class AdvancedCompanySystem:
         
         # 综合评分
         total_score = sum(r.get("score", 0) for r in eval_results)
-        avg_score = total_score / len(eval_results)
+        avg_score = total_score / len(eval_results) if eval_results else 0
         
         # 决策逻辑
         approved = avg_score >= 75 and all(r.get("feasible", True) for r in eval_results if "feasible" in r)
@@ -778,7 +789,9 @@ class AdvancedCompanySystem:
                 "decisions": self.metrics["total_decisions"],
                 "employee_satisfaction": f"{self.metrics['employee_satisfaction']:.1f}%"
             },
-            "recent_messages": self.messages[-10:]
+            "recent_messages": self.messages.recent(10),
+            "llm_telemetry": get_telemetry().snapshot(),
+            "llm_scheduler": get_scheduler().get_stats()
         }
 
 async def main():
@@ -0,0 +1,908 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Agent Client - 统一的Agent调用接口
+提示词构建、响应解析、降级、连接池、缓存、限流、容错、磁带与遥测由 AgentClient 统一处理，
+各供应商的请求格式与响应解析由可插拔的 ProviderAdapter 实现：
+    anthropic: /v1/messages（Kimi Coding 等Anthropic兼容接口）
+    openai:    /chat/completions（Moonshot 等OpenAI兼容接口）
+ProviderRouter 按当前延迟或价格为每个Agent选择供应商
+AgentRoster 由公司系统持有，启动时打开并预连接全部Agent客户端，运行期间复用
+"""
+
+import os
+import json
+import time
+import asyncio
+import aiohttp
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+from dataclasses import dataclass, field, asdict, replace
+from datetime import datetime
+
+from http_pool import get_pool_manager
+from llm_cache import LLMResponseCache, get_response_cache
+from single_flight import get_single_flight
+from rate_limiter import APIStatusError, estimate_tokens, get_rate_limiter, parse_retry_after
+from resilience import CircuitOpenError, get_resilience
+from prompt_compactor import CompactResult, get_prompt_compactor
+from decision_parser import decision_block_complete, parse_decision
+from telemetry import CallRecord, estimate_cost, get_telemetry
+from cassette import Cassette, get_cassette
+from scheduler import get_scheduler
+from decision_history import DecisionHistory
+
+
+@dataclass
+class AgentConfig:
+    """Agent配置（provider 决定使用哪个供应商适配器）"""
+    agent_id: str
+    name: str
+    role: str
+    system_prompt: str
+    api_key: str
+    base_url: Optional[str] = None  # 未设置时由适配器按环境变量/默认地址确定
+    model: str = "kimi-coding/k2p5"
+    temperature: float = 0.7
+    max_tokens: int = 4000
+    timeout: int = 60
+    stream: bool = False        # 流式读取，决策JSON块结束即提前返回
+    prompt_cache: bool = True   # 为稳定前缀添加 cache_control 标记（仅anthropic）
+    provider: str = "anthropic"
+
+
+@dataclass
+class CallContext:
+    """
+    单次调用的上游状态（用量、状态、耗时、重试记录等）
+    每次 think 各自持有，共享同一客户端的并发调用、对冲请求之间互不覆盖
+    """
+    cache_hit: bool = False
+    status: Any = None
+    usage: Dict[str, int] = field(default_factory=dict)             # input_tokens / output_tokens
+    prompt_cache: Dict[str, int] = field(default_factory=dict)      # 前缀缓存 read / write tokens
+    trace: Dict[str, Any] = field(default_factory=dict)             # 重试/对冲记录 attempts / hedged
+    timing: Dict[str, float] = field(default_factory=lambda: {"queue_wait_ms": 0.0})   # queue_wait_ms / ttfb_ms
+    stream_metrics: Optional[Dict] = None                           # ttft_ms / total_ms / chars / early_exit
+    compaction: Optional[CompactResult] = None                      # 上下文压缩结果
+
+
+# ============== 供应商适配器 ==============
+
+class ProviderAdapter:
+    """供应商适配器：请求头、请求体、单次上游调用与流式解析"""
+
+    name = ""
+    api_type = ""
+    path = ""
+    default_base_url = ""
+    base_url_env = ""
+    api_key_envs: tuple = ()
+
+    def base_url(self, config: AgentConfig) -> str:
+        return (config.base_url or os.getenv(self.base_url_env) or self.default_base_url).rstrip("/")
+
+    def api_key_from_env(self) -> Optional[str]:
+        for env in self.api_key_envs:
+            if os.getenv(env):
+                return os.getenv(env)
+        return None
+
+    def headers(self, api_key: str) -> Dict[str, str]:
+        raise NotImplementedError
+
+    def build_payload(self, config: AgentConfig, system_text: str, shared: str, prompt: str) -> Dict:
+        raise NotImplementedError
+
+    async def post(self, client: "AgentClient", call: CallContext, url: str, payload: Dict) -> str:
+        """非流式调用，用量与耗时写入 call"""
+        raise NotImplementedError
+
+    def iter_stream(self, client: "AgentClient", call: CallContext, url: str, payload: Dict) -> AsyncIterator[str]:
+        """流式调用，逐段产出模型文本，用量与耗时写入 call"""
+        raise NotImplementedError
+
+    @staticmethod
+    async def _raise_for_status(response: aiohttp.ClientResponse):
+        if response.status != 200:
+            error_text = await response.text()
+            raise APIStatusError(
+                response.status, error_text,
+                parse_retry_after(response.headers.get("Retry-After"))
+            )
+
+
+class AnthropicAdapter(ProviderAdapter):
+    """Anthropic兼容接口 /v1/messages"""
+
+    name = "anthropic"
+    api_type = "anthropic_compatible"
+    path = "/v1/messages"
+    default_base_url = "https://api.kimi.com/coding"
+    base_url_env = "ANTHROPIC_BASE_URL"
+    api_key_envs = ("ANTHROPIC_API_KEY", "KIMI_API_KEY")
+
+    def headers(self, api_key: str) -> Dict[str, str]:
+        return {
+            "x-api-key": api_key,
+            "Content-Type": "application/json",
+            "anthropic-version": "2023-06-01"
+        }
+
+    def build_payload(self, config: AgentConfig, system_text: str, shared: str, prompt: str) -> Dict:
+        """
+        内容顺序：系统提示词 → 会议共享信息 → 本次任务，前两段打 cache_control 断点
+        """
+        system_block = {"type": "text", "text": system_text}
+        content = []
+        if shared:
+            content.append({"type": "text", "text": shared})
+        content.append({"type": "text", "text": prompt})
+
+        if config.prompt_cache:
+            system_block["cache_control"] = {"type": "ephemeral"}
+            if shared:
+                content[0]["cache_control"] = {"type": "ephemeral"}
+
+        return {
+            "model": config.model,
+            "max_tokens": config.max_tokens,
+            "temperature": config.temperature,
+            "system": [system_block],
+            "messages": [
+                {"role": "user", "content": content}
+            ]
+        }
+
+    @staticmethod
+    def _prompt_cache(usage: Dict) -> Dict[str, int]:
+        """前缀缓存命中(read)与写入(write)的token数"""
+        return {
+            "read": usage.get("cache_read_input_tokens") or 0,
+            "write": usage.get("cache_creation_input_tokens") or 0
+        }
+
+    async def post(self, client: "AgentClient", call: CallContext, url: str, payload: Dict) -> str:
+        timeout = aiohttp.ClientTimeout(total=client.config.timeout)
+        started = time.monotonic()
+        async with client.session.post(url, json=payload, timeout=timeout) as response:
+            call.timing["ttfb_ms"] = (time.monotonic() - started) * 1000
+            await self._raise_for_status(response)
+            data = await response.json()
+            usage = data.get("usage") or {}
+            call.usage = {
+                "input_tokens": usage.get("input_tokens", 0),
+                "output_tokens": usage.get("output_tokens", 0)
+            }
+            call.prompt_cache = self._prompt_cache(usage)
+            return data["content"][0]["text"]
+
+    async def iter_stream(self, client: "AgentClient", call: CallContext, url: str, payload: Dict) -> AsyncIterator[str]:
+        """解析 server-sent events，产出 text_delta"""
+        timeout = aiohttp.ClientTimeout(total=client.config.timeout)
+        started = time.monotonic()
+        async with client.session.post(url, json={**payload, "stream": True}, timeout=timeout) as response:
+            call.timing["ttfb_ms"] = (time.monotonic() - started) * 1000
+            await self._raise_for_status(response)
+
+            async for raw_line in response.content:
+                line = raw_line.decode("utf-8").strip()
+                if not line.startswith("data:"):
+                    continue
+                data = line[5:].strip()
+                if not data or data == "[DONE]":
+                    continue
+
+                event = json.loads(data)
+                event_type = event.get("type")
+                if event_type == "message_start":
+                    usage = event.get("message", {}).get("usage") or {}
+                    call.usage["input_tokens"] = usage.get("input_tokens", 0)
+                    call.prompt_cache = self._prompt_cache(usage)
+                elif event_type == "message_delta":
+                    usage = event.get("usage") or {}
+                    call.usage["output_tokens"] = usage.get("output_tokens", 0)
+                elif event_type == "content_block_delta":
+                    delta = event.get("delta", {})
+                    text = delta.get("text", "") if delta.get("type") == "text_delta" else ""
+                    if text:
+                        yield text
+                elif event_type == "message_stop":
+                    break
+                elif event_type == "error":
+                    raise Exception(f"API Stream Error: {event.get('error')}")
+
+
+class OpenAIAdapter(ProviderAdapter):
+    """OpenAI兼容接口 /chat/completions（Moonshot）"""
+
+    name = "openai"
+    api_type = "openai_compatible"
+    path = "/chat/completions"
+    default_base_url = "https://api.moonshot.cn/v1"
+    base_url_env = "KIMI_BASE_URL"
+    api_key_envs = ("KIMI_API_KEY",)
+
+    def headers(self, api_key: str) -> Dict[str, str]:
+        return {
+            "Authorization": f"Bearer {api_key}",
+            "Content-Type": "application/json"
+        }
+
+    def build_payload(self, config: AgentConfig, system_text: str, shared: str, prompt: str) -> Dict:
+        """内容顺序：系统提示词 → 会议共享信息 → 本次任务，稳定部分构成服务端自动缓存的公共前缀"""
+        user_text = f"{shared}\n\n{prompt}" if shared else prompt
+        return {
+            "model": config.model,
+            "messages": [
+                {"role": "system", "content": system_text},
+                {"role": "user", "content": user_text}
+            ],
+            "temperature": config.temperature,
+            "max_tokens": config.max_tokens,
+            "stream": False
+        }
+
+    @staticmethod
+    def _record_usage(call: CallContext, usage: Dict):
+        # 服务端自动前缀缓存：Moonshot 返回 cached_tokens，OpenAI格式在 prompt_tokens_details 中
+        cached = usage.get("cached_tokens")
+        if cached is None:
+            cached = (usage.get("prompt_tokens_details") or {}).get("cached_tokens", 0)
+        cached = cached or 0
+        # prompt_tokens 已包含缓存命中部分，拆分后与Anthropic一致：input_tokens 不含缓存读取
+        call.usage = {
+            "input_tokens": max(0, usage.get("prompt_tokens", 0) - cached),
+            "output_tokens": usage.get("completion_tokens", 0)
+        }
+        call.prompt_cache = {"read": cached, "write": 0}
+
+    async def post(self, client: "AgentClient", call: CallContext, url: str, payload: Dict) -> str:
+        timeout = aiohttp.ClientTimeout(total=client.config.timeout)
+        started = time.monotonic()
+        async with client.session.post(url, json=payload, timeout=timeout) as response:
+            call.timing["ttfb_ms"] = (time.monotonic() - started) * 1000
+            await self._raise_for_status(response)
+            data = await response.json()
+            self._record_usage(call, data.get("usage") or {})
+            return data["choices"][0]["message"]["content"]
+
+    async def iter_stream(self, client: "AgentClient", call: CallContext, url: str, payload: Dict) -> AsyncIterator[str]:
+        """解析 data: 分块，产出 delta.content"""
+        timeout = aiohttp.ClientTimeout(total=client.config.timeout)
+        started = time.monotonic()
+        payload = {**payload, "stream": True, "stream_options": {"include_usage": True}}
+        async with client.session.post(url, json=payload, timeout=timeout) as response:
+            call.timing["ttfb_ms"] = (time.monotonic() - started) * 1000
+            await self._raise_for_status(response)
+
+            async for raw_line in response.content:
+                line = raw_line.decode("utf-8").strip()
+                if not line.startswith("data:"):
+                    continue
+                data = line[5:].strip()
+                if data == "[DONE]":
+                    break
+                if not data:
+                    continue
+
+                chunk = json.loads(data)
+                if chunk.get("usage"):
+                    self._record_usage(call, chunk["usage"])
+                for choice in chunk.get("choices") or []:
+                    text = (choice.get("delta") or {}).get("content")
+                    if text:
+                        yield text
+
+
+PROVIDER_ADAPTERS: Dict[str, ProviderAdapter] = {
+    "anthropic": AnthropicAdapter(),
+    "openai": OpenAIAdapter(),
+}
+
+
+# ============== Agent Client ==============
+
+class AgentClient:
+    """
+    Agent运行器
+    相同请求在飞行中合并 → 磁带回放 → 响应缓存 → 限流 + 重试/对冲/熔断 → 供应商适配器
+    """
+
+    provider: Optional[str] = None  # 子类可固定供应商，否则取 config.provider
+
+    def __init__(self, config: AgentConfig, cache: LLMResponseCache = None):
+        self.config = config
+        self.adapter = PROVIDER_ADAPTERS[self.provider or config.provider]
+        self.base_url = self.adapter.base_url(config)
+        self.session: Optional[aiohttp.ClientSession] = None
+        self._held = False
+        # 决策记录（内存有界，超出部分落盘，见 decision_history）
+        self.decision_log = DecisionHistory(f"client-{config.agent_id}-{self.adapter.name}", type_key="step_kind")
+        # 响应缓存（可选，未传入时使用 NEXUS_LLM_CACHE 启用的全局缓存）
+        self.cache = cache if cache is not None else get_response_cache()
+        # 单次调用的状态保存在各自的 CallContext 中（客户端由多个步骤并发共享）；
+        # 以下两项仅供调用方在 think() / stream() 返回后立即读取
+        self.last_call_record: Optional[CallRecord] = None
+        self.last_stream_metrics: Optional[Dict] = None
+
+    async def __aenter__(self):
+        """异步上下文管理器入口 - 从进程级连接池借用session"""
+        self._borrow()
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        """异步上下文管理器出口 - 归还session（连接由连接池保持；长期持有的客户端不归还）"""
+        if not self._held:
+            self.session = None
+
+    def _borrow(self):
+        if self.session is None or self.session.closed:
+            self.session = get_pool_manager().get_session(
+                self.base_url,
+                self.config.api_key,
+                headers=self.adapter.headers(self.config.api_key)
+            )
+
+    def open(self) -> "AgentClient":
+        """长期持有session直到 close()（必须在事件循环中调用）"""
+        self._held = True
+        self._borrow()
+        return self
+
+    def close(self):
+        """释放长期持有的session"""
+        self._held = False
+        self.session = None
+
+    async def preconnect(self, timeout: float = 5.0) -> bool:
+        """
+        预连接：向 base_url 发送一次HEAD请求，提前完成DNS/TCP/TLS握手，
+        连接随后留在连接池中供首次调用复用（任何HTTP状态都视为成功）
+        """
+        if not self.session:
+            raise RuntimeError("Agent not initialized. Use 'async with' context manager.")
+        try:
+            async with self.session.head(
+                self.base_url,
+                allow_redirects=False,
+                timeout=aiohttp.ClientTimeout(total=timeout)
+            ):
+                return True
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            return False
+
+    async def think(self, task: str, context: Dict = None, step_kind: str = None,
+                    shared_context: Dict = None, priority: Any = None,
+                    deadline: Optional[float] = None, cache_exclude: List[str] = None) -> Dict[str, Any]:
+        """
+        Agent思考并做出决策
+
+        Args:
+            task: 任务描述
+            context: 上下文信息（公司状态、市场数据等）
+            step_kind: 步骤类型（决定缓存TTL，默认取 context["step_kind"]）
+            shared_context: 会议共享信息（各Agent相同，放在任务之前作为可缓存前缀）
+            priority: 调度优先级（TaskPriority 或类别名，默认按 step_kind 映射）
+            deadline: 调度截止时间（time.monotonic() 时间戳）
+            cache_exclude: 不参与响应缓存Key的上下文字段（如 step_id，仍会发送给模型）
+
+        Returns:
+            决策结果字典（API不可用时为 mode=fallback / circuit_open 的降级决策）
+        """
+        started = time.monotonic()
+        step_kind = step_kind or (context or {}).get("step_kind")
+        call = CallContext()
+        shared = self._build_shared(shared_context, step_kind)
+        prompt, call.compaction = self._build_prompt(task, context, step_kind, estimate_tokens(shared))
+        cache_prompt = None
+        if self.cache and context and cache_exclude:
+            key_context = {k: v for k, v in context.items() if k not in cache_exclude}
+            cache_prompt, _ = self._build_prompt(task, key_context, step_kind, estimate_tokens(shared))
+
+        try:
+            # 同一Agent的相同请求在飞行中只调用一次上游，共享解析后的决策（合并的调用不填写 call）
+            (response, decision), coalesced = await get_single_flight().do(
+                self._flight_key(shared + prompt),
+                lambda: self._request_decision(prompt, call, step_kind, shared, priority, deadline, cache_prompt)
+            )
+        except CircuitOpenError as e:
+            # 熔断期间不再请求上游，直接降级
+            self._record_call(call, step_kind, started, status="circuit_open")
+            decision = self._generate_fallback_decision(task, str(e))
+            decision["mode"] = "circuit_open"
+            return decision
+        except Exception as e:
+            print(f"⚠️ API调用失败: {e}")
+            failed_status = call.status if call.status not in (None, 200) else "error"
+            self._record_call(call, step_kind, started, status=failed_status)
+            return self._generate_fallback_decision(task, str(e))
+
+        # 记录决策
+        self.decision_log.append({
+            "timestamp": datetime.now().isoformat(),
+            "agent_id": self.config.agent_id,
+            "step_kind": step_kind,
+            "task": task,
+            "decision": decision,
+            "raw_response": response,
+            "mode": "real_ai",
+            "model": self.config.model,
+            "api_type": self.adapter.api_type,
+            "cache_hit": call.cache_hit,
+            "coalesced": coalesced,
+            "attempts": call.trace.get("attempts", 0),
+            "hedged": call.trace.get("hedged", False),
+            "tokens_saved": call.compaction.saved if call.compaction else 0,
+            "prompt_cache": dict(call.prompt_cache),
+            "stream_metrics": call.stream_metrics if self.config.stream else None,
+            "metrics": asdict(self._record_call(call, step_kind, started, coalesced=coalesced))
+        })
+
+        return decision
+
+    def _record_call(self, call: CallContext, step_kind: str, started: float,
+                     status: Any = None, coalesced: bool = False) -> CallRecord:
+        """写入调用遥测（合并调用与缓存命中不计上游token）"""
+        upstream = not coalesced and not call.cache_hit
+        usage = call.usage if upstream else {}
+        prompt_cache = call.prompt_cache if upstream else {}
+        if status is None:
+            status = "cache" if call.cache_hit else (call.status if upstream else 200)
+        record = CallRecord(
+            agent_id=self.config.agent_id,
+            model=self.config.model,
+            step_kind=step_kind,
+            status=status,
+            latency_ms=(time.monotonic() - started) * 1000,
+            queue_wait_ms=call.timing.get("queue_wait_ms", 0.0) if upstream else 0.0,
+            ttfb_ms=call.timing.get("ttfb_ms") if upstream else None,
+            input_tokens=usage.get("input_tokens", 0),
+            output_tokens=usage.get("output_tokens", 0),
+            cache_read_tokens=prompt_cache.get("read", 0),
+            cache_write_tokens=prompt_cache.get("write", 0),
+            retries=max(0, call.trace.get("attempts", 1) - 1) if upstream else 0,
+            hedged=call.trace.get("hedged", False) if upstream else False,
+            cache_hit=call.cache_hit and not coalesced,
+            coalesced=coalesced
+        )
+        record.cost = estimate_cost(
+            record.model, record.input_tokens, record.output_tokens,
+            record.cache_read_tokens, record.cache_write_tokens
+        )
+        get_telemetry().record(record)
+        self.last_call_record = record
+        return record
+
+    def circuit_open(self) -> bool:
+        """该端点的熔断器是否处于打开状态"""
+        return get_resilience().breaker(self.endpoint).is_open()
+
+    @property
+    def endpoint(self) -> str:
+        """请求地址，同时是熔断与延迟统计的端点标识"""
+        return f"{self.base_url}{self.adapter.path}"
+
+    async def _request_decision(self, prompt: str, call: CallContext, step_kind: str = None, shared: str = "",
+                                priority: Any = None, deadline: Optional[float] = None,
+                                cache_prompt: Optional[str] = None):
+        """调用API并解析决策，返回 (原始响应, 决策)"""
+        response = await self._call_api(prompt, call, step_kind, shared, priority, deadline, cache_prompt)
+        return response, self._parse_response(response)
+
+    def _flight_key(self, prompt: str) -> str:
+        """请求合并Key"""
+        return LLMResponseCache.make_key({
+            "agent_id": self.config.agent_id,
+            "base_url": self.base_url,
+            "model": self.config.model,
+            "temperature": self.config.temperature,
+            "max_tokens": self.config.max_tokens,
+            "prompt": prompt
+        })
+
+    # ============== 提示词 ==============
+
+    def _system_text(self) -> str:
+        """稳定前缀：系统提示词 + 角色信息 + 决策格式（同一Agent每次调用完全相同）"""
+        return f"""{self.config.system_prompt}
+
+## 角色信息
+- 姓名: {self.config.name}
+- 职位: {self.config.role}
+- Agent ID: {self.config.agent_id}
+
+## 决策格式
+请使用以下JSON格式返回你的决策：
+```json
+{{
+    "decision": "你的决策（批准/拒绝/需要更多信息）",
+    "confidence": 0.85,
+    "reasoning": "详细的推理过程",
+    "action_items": ["具体行动项1", "行动项2"],
+    "risks": ["风险1", "风险2"],
+    "recommendations": ["建议1", "建议2"],
+    "budget_request": 0,
+    "timeline_days": 30,
+    "team_requirements": ["需要的团队成员"]
+}}
+```
+
+请确保你的决策符合你的角色职责和专业领域。"""
+
+    def _build_shared(self, shared_context: Dict = None, step_kind: str = None) -> str:
+        """会议共享信息（紧随系统提示词，构成可复用前缀）"""
+        if not shared_context:
+            return ""
+        compacted = get_prompt_compactor().compact(shared_context, step_kind, estimate_tokens(self._system_text()))
+        return f"## 会议共享信息\n{compacted.text}"
+
+    def _build_prompt(self, task: str, context: Dict = None, step_kind: str = None,
+                      reserved_tokens: int = 0) -> Tuple[str, Optional[CompactResult]]:
+        """构建本次调用独有的提示词（任务 + 上下文），放在前缀之后，返回 (提示词, 上下文压缩结果)"""
+        prompt = f"## 当前任务\n{task}"
+
+        compaction = None
+        if context:
+            # 紧凑序列化并按token预算裁剪上下文
+            reserved = reserved_tokens + estimate_tokens(self._system_text()) + estimate_tokens(prompt)
+            compaction = get_prompt_compactor().compact(context, step_kind, reserved)
+            prompt += f"\n\n## 上下文信息\n{compaction.text}"
+
+        return prompt, compaction
+
+    # ============== 调用 ==============
+
+    async def _call_api(self, prompt: str, call: CallContext, step_kind: str = None, shared: str = "",
+                        priority: Any = None, deadline: Optional[float] = None,
+                        cache_prompt: Optional[str] = None) -> str:
+        """
+        调用上游API（回放模式读磁带，启用缓存时先查缓存），用量与状态写入 call
+        cache_prompt 为去掉 cache_exclude 字段后的提示词，仅用于计算缓存Key
+        """
+        if not self.session:
+            raise RuntimeError("Agent not initialized. Use 'async with' context manager.")
+
+        system_text = self._system_text()
+        payload = self.adapter.build_payload(self.config, system_text, shared, prompt)
+        est_tokens = estimate_tokens(system_text) + estimate_tokens(shared) + estimate_tokens(prompt)
+
+        # 回放模式直接返回录制的响应，不访问网络
+        cassette = get_cassette()
+        tape_key = Cassette.make_key(self.config.agent_id, payload)
+        if cassette.replaying:
+            entry = cassette.replay(tape_key, self.config.agent_id, step_kind)
+            call.usage = dict(entry.usage)
+            call.prompt_cache = dict(entry.prompt_cache)
+            call.status = "replay"
+            return entry.response
+
+        cache_key = None
+        if self.cache:
+            key_payload = payload
+            if cache_prompt is not None:
+                key_payload = self.adapter.build_payload(self.config, system_text, shared, cache_prompt)
+            cache_key = self.cache.make_key({"url": self.endpoint, **key_payload})
+            cached = self.cache.get(cache_key, step_kind)
+            if cached is not None:
+                call.cache_hit = True
+                cassette.record(tape_key, self.config.agent_id, step_kind, cached)
+                return cached
+
+        # 可重试错误按抖动退避重试，关键步骤超过p95延迟时发起对冲请求
+        text = await get_resilience().call(
+            self.endpoint,
+            lambda: self._send(payload, est_tokens, call, step_kind, priority, deadline),
+            step_kind=step_kind,
+            trace=call.trace
+        )
+
+        if cache_key:
+            self.cache.put(cache_key, text, step_kind)
+        cassette.record(tape_key, self.config.agent_id, step_kind, text, call.usage, call.prompt_cache)
+        return text
+
+    async def _send(self, payload: Dict, est_tokens: int, call: CallContext, step_kind: str = None,
+                    priority: Any = None, deadline: Optional[float] = None) -> str:
+        """
+        单次上游调用：先经全局调度器按优先级排队，再按API Key / base_url 限流，
+        429/5xx时限流器收缩并发窗口
+        """
+        async with get_scheduler().slot(
+            self.config.agent_id, self.config.api_key, self.base_url,
+            step_kind=step_kind, priority=priority, deadline=deadline, cost=est_tokens
+        ) as scheduled_wait:
+            return await self._send_admitted(payload, est_tokens, call, scheduled_wait)
+
+    async def _send_admitted(self, payload: Dict, est_tokens: int, call: CallContext, scheduled_wait: float) -> str:
+        # 每次尝试单独记录用量，成功后写回 call（对冲时两个请求同时进行，互不覆盖）
+        attempt = CallContext()
+        limiter = get_rate_limiter()
+        async with limiter.acquire(self.config.api_key, self.base_url, est_tokens) as permit:
+            # 调度排队与限流排队合计，重试时累加
+            waited = (scheduled_wait + permit.queue_wait) * 1000
+            call.timing["queue_wait_ms"] = call.timing.get("queue_wait_ms", 0.0) + waited
+            try:
+                if self.config.stream:
+                    text = await self._collect_stream(payload, attempt)
+                else:
+                    text = await self.adapter.post(self, attempt, self.endpoint, payload)
+            except APIStatusError as e:
+                call.status = e.status
+                raise
+            if attempt.usage:
+                permit.tokens_used = sum(attempt.usage.values())
+        call.status = 200
+        call.usage = attempt.usage
+        call.prompt_cache = attempt.prompt_cache
+        call.stream_metrics = attempt.stream_metrics
+        if "ttfb_ms" in attempt.timing:
+            call.timing["ttfb_ms"] = attempt.timing["ttfb_ms"]
+        return text
+
+    # ============== 流式调用 ==============
+
+    async def stream(self, task: str, context: Dict = None, shared_context: Dict = None) -> AsyncIterator[str]:
+        """
+        流式思考，逐段产出模型文本
+        结束后可通过 last_stream_metrics 读取首字延迟等指标
+        """
+        if not self.session:
+            raise RuntimeError("Agent not initialized. Use 'async with' context manager.")
+
+        shared = self._build_shared(shared_context)
+        prompt, _ = self._build_prompt(task, context, reserved_tokens=estimate_tokens(shared))
+        call = CallContext()
+        system_text = self._system_text()
+        payload = self.adapter.build_payload(self.config, system_text, shared, prompt)
+        est_tokens = estimate_tokens(system_text) + estimate_tokens(shared) + estimate_tokens(prompt)
+        async with get_scheduler().slot(self.config.agent_id, self.config.api_key, self.base_url, cost=est_tokens):
+            async with get_rate_limiter().acquire(self.config.api_key, self.base_url, est_tokens):
+                try:
+                    async for delta in self._iter_stream_deltas(payload, call):
+                        yield delta
+                finally:
+                    self.last_stream_metrics = call.stream_metrics
+
+    async def _collect_stream(self, payload: Dict, call: CallContext) -> str:
+        """读取流式响应，决策JSON块闭合后立即停止并释放连接"""
+        chunks: List[str] = []
+        deltas = self._iter_stream_deltas(payload, call)
+        try:
+            async for delta in deltas:
+                chunks.append(delta)
+                if "}" in delta and decision_block_complete("".join(chunks)):
+                    call.stream_metrics["early_exit"] = True
+                    break
+        finally:
+            # 显式关闭生成器，立即退出响应上下文并释放连接
+            await deltas.aclose()
+        return "".join(chunks)
+
+    async def _iter_stream_deltas(self, payload: Dict, call: CallContext) -> AsyncIterator[str]:
+        """适配器流式解析 + 首字延迟统计（写入 call.stream_metrics）"""
+        started = time.monotonic()
+        metrics = {"ttft_ms": None, "total_ms": None, "chars": 0, "early_exit": False}
+        call.stream_metrics = metrics
+        deltas = self.adapter.iter_stream(self, call, self.endpoint, payload)
+        try:
+            async for text in deltas:
+                if metrics["ttft_ms"] is None:
+                    metrics["ttft_ms"] = (time.monotonic() - started) * 1000
+                metrics["chars"] += len(text)
+                yield text
+        finally:
+            await deltas.aclose()
+            metrics["total_ms"] = (time.monotonic() - started) * 1000
+
+    # ============== 解析与降级 ==============
+
+    def _parse_response(self, response: str) -> Dict:
+        """解析API响应（定位JSON对象、容错修复并规范化字段）"""
+        decision, _ = parse_decision(response)
+        if decision is not None:
+            return decision
+        return {
+            "decision": "需要讨论",
+            "confidence": 0.5,
+            "reasoning": response[:500] if response else "无法解析",
+            "action_items": [],
+            "risks": [],
+            "recommendations": ["重新格式化"],
+            "budget_request": 0,
+            "timeline_days": 0,
+            "team_requirements": [],
+            "raw_response": response
+        }
+
+    def _generate_fallback_decision(self, task: str, error: str) -> Dict:
+        """生成fallback决策"""
+        return {
+            "decision": "需要更多信息",
+            "confidence": 0.6,
+            "reasoning": f"API调用失败: {error}",
+            "action_items": ["检查API配置", "验证API Key"],
+            "risks": ["API连接不稳定"],
+            "recommendations": ["使用模拟模式"],
+            "budget_request": 0,
+            "timeline_days": 1,
+            "team_requirements": [],
+            "mode": "fallback"
+        }
+
+
+def create_agent_client(config: AgentConfig, cache: LLMResponseCache = None) -> AgentClient:
+    """按 config.provider 创建Agent客户端"""
+    return AgentClient(config, cache)
+
+
+# ============== 供应商路由 ==============
+
+class ProviderRouter:
+    """
+    按Agent选择供应商
+    候选：Agent自身配置 + NEXUS_PROVIDERS 中配置了API Key的其他供应商；
+    跳过熔断中的端点，样本不足的端点优先探测，之后按 latency（p50延迟）或 cost（单价）选择
+    """
+
+    def __init__(self, providers: List[str] = None, policy: str = None, min_samples: int = 5):
+        if providers is None:
+            providers = [p.strip() for p in os.getenv("NEXUS_PROVIDERS", "").split(",") if p.strip()]
+        self.providers = [p for p in providers if p in PROVIDER_ADAPTERS]
+        self.policy = policy or os.getenv("NEXUS_PROVIDER_POLICY", "latency")
+        self.min_samples = min_samples
+        self.stats: Dict[str, int] = {}
+
+    def candidates(self, config: AgentConfig) -> List[AgentConfig]:
+        """同一Agent在各可用供应商下的配置"""
+        result = [config]
+        for name in self.providers:
+            if name == config.provider:
+                continue
+            api_key = PROVIDER_ADAPTERS[name].api_key_from_env()
+            if api_key:
+                result.append(replace(config, provider=name, base_url=None, api_key=api_key))
+        return result
+
+    def select(self, config: AgentConfig, step_kind: str = None) -> AgentConfig:
+        """为本次调用选择供应商配置"""
+        options = self.candidates(config)
+        if len(options) == 1:
+            return config
+
+        resilience = get_resilience()
+        scored = []
+        for option in options:
+            adapter = PROVIDER_ADAPTERS[option.provider]
+            endpoint = f"{adapter.base_url(option)}{adapter.path}"
+            if resilience.breaker(endpoint).is_open():
+                continue
+            p50, count = resilience.latency.percentile(endpoint, step_kind, 0.5)
+            if count < self.min_samples:
+                # 样本不足：优先探测
+                scored.append(((0, count, 0.0), option))
+                continue
+            price = estimate_cost(option.model, 1000, 500)
+            metric = (price, p50) if self.policy == "cost" else (p50, price)
+            scored.append(((1,) + metric, option))
+
+        chosen = min(scored, key=lambda item: item[0])[1] if scored else config
+        self.stats[chosen.provider] = self.stats.get(chosen.provider, 0) + 1
+        return chosen
+
+    def client(self, config: AgentConfig, step_kind: str = None, cache: LLMResponseCache = None) -> AgentClient:
+        """为本次调用创建路由后的Agent客户端"""
+        return create_agent_client(self.select(config, step_kind), cache)
+
+    def get_stats(self) -> Dict:
+        return {"providers": self.providers, "policy": self.policy, "routed": dict(self.stats)}
+
+
+# ============== 长期Agent客户端 ==============
+
+class AgentRoster:
+    """
+    公司系统持有的长期Agent客户端
+    启动时为每个Agent的每个候选供应商创建一次客户端并持有session，按端点预连接；
+    运行期间每次调用只做路由选择并复用已有客户端，不再创建客户端或进出session；
+    结束时统一释放（连接由进程级连接池在 close_pool() 时关闭）
+    """
+
+    def __init__(self, configs: Dict[str, AgentConfig] = None, router: ProviderRouter = None,
+                 cache: LLMResponseCache = None, models=None):
+        """
+        Args:
+            configs: {agent_id: Agent配置}
+            router: 供应商路由，默认进程级路由
+            cache: 响应缓存
+            models: 模型路由表（model_routing.ModelRoutingTable），按档位调整 model / max_tokens / temperature
+        """
+        self.configs: Dict[str, AgentConfig] = dict(configs or {})
+        self.router = router or get_provider_router()
+        self.cache = cache
+        self.models = models
+        self.started = False
+        self._clients: Dict[Tuple[str, str, Optional[str]], AgentClient] = {}
+        self.stats = {
+            "clients": 0,
+            "late_opened": 0,
+            "preconnected": 0,
+            "preconnect_failed": 0,
+            "startup_ms": 0.0,
+            "calls": 0
+        }
+
+    def register(self, config: AgentConfig):
+        """登记Agent配置（启动后登记的Agent在首次调用时打开）"""
+        self.configs[config.agent_id] = config
+
+    async def start(self, preconnect: bool = True):
+        """打开全部客户端并预连接（回放模式不访问网络，跳过预连接）"""
+        if self.started:
+            return
+        started = time.monotonic()
+        tiers = list(self.models.tiers) if self.models else [None]
+        for agent_id, config in self.configs.items():
+            for option in self.router.candidates(config):
+                for tier in tiers:
+                    self._open(agent_id, option, tier)
+        self.started = True
+
+        if preconnect and not get_cassette().replaying:
+            await self._preconnect()
+        self.stats["startup_ms"] = round((time.monotonic() - started) * 1000, 1)
+
+    async def _preconnect(self):
+        """每个端点预建与Agent数相同的连接（不超过连接池单host上限），使首轮并行调用无需握手"""
+        endpoints: Dict[Tuple[str, str], List[AgentClient]] = {}
+        for client in self._clients.values():
+            endpoints.setdefault((client.base_url, client.config.api_key or ""), []).append(client)
+
+        limit = get_pool_manager().config.limit_per_host
+        results = await asyncio.gather(*[
+            client.preconnect()
+            for clients in endpoints.values()
+            for client in clients[:limit]
+        ])
+        self.stats["preconnected"] += sum(1 for ok in results if ok)
+        self.stats["preconnect_failed"] += sum(1 for ok in results if not ok)
+
+    def _open(self, agent_id: str, config: AgentConfig, tier: Optional[str] = None) -> AgentClient:
+        routed = self.models.apply(config, tier) if self.models and tier else config
+        client = create_agent_client(routed, self.cache).open()
+        self._clients[(agent_id, config.provider, tier)] = client
+        self.stats["clients"] += 1
+        return client
+
+    def client(self, agent_id: str, step_kind: str = None, tier: str = None) -> AgentClient:
+        """为本次调用路由并返回长期客户端（必须在事件循环中调用）；tier 为模型路由表中的档位"""
+        config = self.configs[agent_id]
+        option = self.router.select(config, step_kind)
+        client = self._clients.get((agent_id, option.provider, tier))
+        if client is None:
+            client = self._open(agent_id, option, tier)
+            self.stats["late_opened"] += 1
+        self.stats["calls"] += 1
+        return client
+
+    async def close(self):
+        """释放全部客户端"""
+        for client in self._clients.values():
+            client.close()
+        self._clients.clear()
+        self.started = False
+
+    def get_stats(self) -> Dict:
+        return {**self.stats, "open_clients": len(self._clients)}
+
+
+# ============== 全局单例 ==============
+
+_router: Optional[ProviderRouter] = None
+
+
+def get_provider_router() -> ProviderRouter:
+    """获取进程级供应商路由（NEXUS_PROVIDERS=anthropic,openai 启用多供应商）"""
+    global _router
+    if _router is None:
+        _router = ProviderRouter()
+    return _router
@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Cassette - LLM调用录制/回放
+录制模式下把每次LLM请求/响应追加写入JSONL磁带文件；回放模式下按请求Key直接返回录制的响应，
+不访问网络、不等待，用于可重复的性能回归和编排层重新剖析
+
+    NEXUS_CASSETTE=record NEXUS_CASSETTE_PATH=data/cassettes/run.jsonl python3 closed_loop_company.py
+    NEXUS_CASSETTE=replay NEXUS_CASSETTE_PATH=data/cassettes/run.jsonl python3 closed_loop_company.py
+
+回放匹配顺序：请求Key精确匹配 → 同一Agent、同一步骤类型按录制顺序取下一条
+（上下文含时间戳或随机数据时请求Key会变化，按顺序匹配可保证流程仍然走完）
+"""
+
+import os
+import json
+import asyncio
+from collections import defaultdict, deque
+from typing import Any, Deque, Dict, Optional, Tuple
+from dataclasses import dataclass, field, asdict
+
+from llm_cache import LLMResponseCache
+
+
+class CassetteMissError(Exception):
+    """回放模式下找不到录制的响应"""
+
+    def __init__(self, agent_id: str, step_kind: Optional[str]):
+        self.agent_id = agent_id
+        self.step_kind = step_kind
+        super().__init__(f"Cassette miss: {agent_id}/{step_kind or '-'}")
+
+
+@dataclass
+class CassetteConfig:
+    """磁带配置"""
+    mode: str = "off"    # off / record / replay
+    path: str = "data/cassettes/run.jsonl"
+
+    @classmethod
+    def from_env(cls) -> "CassetteConfig":
+        """从环境变量读取配置"""
+        config = cls()
+        config.mode = os.getenv("NEXUS_CASSETTE", config.mode).lower()
+        config.path = os.getenv("NEXUS_CASSETTE_PATH", config.path)
+        return config
+
+
+@dataclass
+class CassetteEntry:
+    """一条录制的调用"""
+    key: str
+    agent_id: str
+    step_kind: Optional[str]
+    response: str
+    usage: Dict[str, int] = field(default_factory=dict)
+    prompt_cache: Dict[str, int] = field(default_factory=dict)
+
+
+class Cassette:
+    """LLM调用磁带"""
+
+    def __init__(self, config: CassetteConfig = None):
+        self.config = config or CassetteConfig.from_env()
+        self._by_key: Dict[str, Deque[CassetteEntry]] = defaultdict(deque)
+        self._by_sequence: Dict[Tuple[str, Optional[str]], Deque[CassetteEntry]] = defaultdict(deque)
+        self._used: set = set()
+        self._file = None
+        self.stats = {"recorded": 0, "loaded": 0, "exact_hits": 0, "sequence_hits": 0, "misses": 0}
+
+        if self.replaying:
+            self._load(self.config.path)
+        elif self.recording:
+            directory = os.path.dirname(self.config.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._file = open(self.config.path, "w", encoding="utf-8")
+
+    @property
+    def recording(self) -> bool:
+        return self.config.mode == "record"
+
+    @property
+    def replaying(self) -> bool:
+        return self.config.mode == "replay"
+
+    @staticmethod
+    def make_key(agent_id: str, payload: Dict[str, Any]) -> str:
+        """请求Key：Agent + 请求体（不含URL，录制与回放可指向不同服务）"""
+        return LLMResponseCache.make_key({"agent_id": agent_id, **payload})
+
+    def _load(self, path: str):
+        """加载磁带并建立 Key / (Agent, 步骤类型) 两级索引"""
+        if not os.path.exists(path):
+            print(f"⚠️ 磁带文件不存在: {path}")
+            return
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                entry = CassetteEntry(**json.loads(line))
+                self._by_key[entry.key].append(entry)
+                self._by_sequence[(entry.agent_id, entry.step_kind)].append(entry)
+                self.stats["loaded"] += 1
+
+    def record(self, key: str, agent_id: str, step_kind: Optional[str], response: str,
+               usage: Dict[str, int] = None, prompt_cache: Dict[str, int] = None):
+        """录制一次调用（仅录制模式生效）"""
+        if not self._file:
+            return
+        entry = CassetteEntry(key, agent_id, step_kind, response, dict(usage or {}), dict(prompt_cache or {}))
+        self._file.write(json.dumps(asdict(entry), ensure_ascii=False, separators=(",", ":")) + "\n")
+        self._file.flush()
+        self.stats["recorded"] += 1
+
+    def replay(self, key: str, agent_id: str, step_kind: Optional[str]) -> CassetteEntry:
+        """取出录制的响应，每条录制只回放一次"""
+        entry = self._next_unused(self._by_key.get(key))
+        if entry:
+            self.stats["exact_hits"] += 1
+            return entry
+        entry = self._next_unused(self._by_sequence.get((agent_id, step_kind)))
+        if entry:
+            self.stats["sequence_hits"] += 1
+            return entry
+        self.stats["misses"] += 1
+        raise CassetteMissError(agent_id, step_kind)
+
+    def _next_unused(self, entries: Optional[Deque[CassetteEntry]]) -> Optional[CassetteEntry]:
+        while entries:
+            entry = entries.popleft()
+            if id(entry) not in self._used:
+                self._used.add(id(entry))
+                return entry
+        return None
+
+    def close(self):
+        if self._file:
+            self._file.close()
+            self._file = None
+
+    def get_stats(self) -> Dict:
+        """磁带统计"""
+        return {"mode": self.config.mode, "path": self.config.path, **self.stats}
+
+
+async def pace(seconds: float):
+    """流程中的节奏等待，回放模式下跳过"""
+    if get_cassette().replaying:
+        return
+    await asyncio.sleep(seconds)
+
+
+# ============== 全局单例 ==============
+
+_cassette: Optional[Cassette] = None
+
+
+def get_cassette() -> Cassette:
+    """获取进程级磁带（NEXUS_CASSETTE=record/replay 启用）"""
+    global _cassette
+    if _cassette is None:
+        _cassette = Cassette()
+    return _cassette
@@ -9,13 +9,26 @@ import os
 import asyncio
 import json
 import random
-from datetime import datetime, timedelta
+from datetime import datetime
 from typing import Dict, List, Optional, Any
 from dataclasses import dataclass, field
 from enum import Enum
 
 from advanced_company_v3 import AdvancedCompanySystem, Project, ProjectPhase, Agent, AgentState
-from kimi_coding_runner import KimiCodingRunner, KimiCodingConfig
+from kimi_coding_runner import KimiCodingConfig
+from agent_client import AgentRoster, get_provider_router
+from http_pool import close_pool
+from llm_cache import get_response_cache
+from single_flight import get_single_flight
+from cassette import get_cassette, pace
+from model_routing import ModelRoutingTable, tier_models_from_env
+from mission_executor import get_mission_executor
+from quota import QuotaGates
+from event_bus import EventBus
+from trigger_engine import TriggerEngine
+from state_store import StateStore, StateTable, from_record
+from state_log import StateLog
+from deadline_timer import DeadlineTimer, DeadlineExceeded
 
 
 class ProposalStatus(Enum):
@@ -34,6 +47,7 @@ class StepStatus(Enum):
     RUNNING = "running"
     SUCCEEDED = "succeeded"
     FAILED = "failed"
+    CANCELLED = "cancelled"  # 前置步骤失败，未执行
 
 
 @dataclass
@@ -63,6 +77,7 @@ class MissionStep:
     started_at: Optional[datetime] = None
     completed_at: Optional[datetime] = None
     error: Optional[str] = None
+    depends_on: List[str] = field(default_factory=list)  # 前置步骤ID
 
 
 @dataclass
@@ -86,7 +101,6 @@ class AgentEvent:
     tags: List[str]
     payload: Dict
     created_at: datetime
-    processed: bool = False
 
 
 @dataclass
@@ -110,17 +124,60 @@ class ClosedLoopCompanySystem(AdvancedCompanySystem):
     def __init__(self, company_name: str = "Nexus AI"):
         super().__init__(company_name)
         
-        # 核心状态存储（替代Supabase）
-        self.proposals: Dict[str, Proposal] = {}
-        self.missions: Dict[str, Mission] = {}
-        self.steps: Dict[str, MissionStep] = {}
-        self.events: List[AgentEvent] = []
-        self.policies: Dict[str, Any] = self._init_policies()
+        # 核心状态存储（替代Supabase，NEXUS_STATE_DB 设置时持久化到SQLite）
+        self.store = StateStore()
+        self.proposals: StateTable = self.store.table(
+            "proposals", lambda r: from_record(Proposal, r),
+            is_live=lambda p: p.status in (ProposalStatus.PENDING, ProposalStatus.APPROVED, ProposalStatus.EXECUTING)
+        )
+        self.steps: StateTable = self.store.table(
+            "steps", lambda r: from_record(MissionStep, r),
+            is_live=lambda s: s.status in (StepStatus.QUEUED, StepStatus.RUNNING)
+        )
+        self.missions: StateTable = self.store.table(
+            "missions", lambda r: from_record(Mission, r, {"steps": lambda ids: [self.steps[i] for i in ids if i in self.steps]}),
+            is_live=lambda m: m.status == "running"
+        )
+        # 恢复上次运行未结束的记录，历史记录按需加载
+        self.proposals.load_live(status=["pending", "approved", "executing"])
+        self.steps.load_live(status=["queued", "running"])
+        self.missions.load_live(status="running")
+        
+        # 事件溯源状态日志（NEXUS_STATE_LOG 设置时启用）：从最新快照 + 其后的记录恢复，不重跑模拟
+        self.days_completed = 0
+        self.state_log = StateLog()
+        self.state_log.tables = {"proposals": self.proposals, "missions": self.missions, "steps": self.steps}
+        self.state_log.capture = self._capture_state
+        if self.state_log.recover(self._restore_state, self._apply_state_record):
+            print(f"♻️  状态已恢复: 第 {self.days_completed} 天 | 重放 {self.state_log.stats['replayed']} 条记录")
+        self._logged_financials = dict(self.financials)
+        self.store.observe(self.state_log.record)
+        self.event_bus = EventBus()
+        self.event_bus.subscribe("event_log", self._log_event)
+        self.policies: Dict[str, Any] = self.store.load_policies(
+            self._init_policies(), keys=("auto_approve", "daily_quotas", "cap_gates", "step_timeouts")
+        )
+        self.model_routes = ModelRoutingTable.from_policy(self.policies["model_routing"])
+        self.quotas = QuotaGates(self.policies["cap_gates"])
         self.triggers: List[TriggerRule] = self._init_triggers()
+        self.trigger_engine = TriggerEngine(actions={
+            "create_proposal": self._action_create_proposal,
+            # 任务统一经提案入口创建（自动审批后执行）
+            "create_mission": self._action_create_proposal,
+        })
+        self.trigger_engine.register_all(self.triggers)
+        self.trigger_engine.attach(self.event_bus)
+        # 步骤超时监控：开始执行时登记截止时间，上次运行遗留的 RUNNING 步骤按原开始时间登记
+        self.deadlines = DeadlineTimer()
+        for step in list(self.steps.memory.values()):
+            if step.status == StepStatus.RUNNING:
+                self.deadlines.schedule(step.id, self._step_deadline(step), lambda step=step: self._recover_stale_step(step))
         
         # Agent API配置
         self.agent_apis: Dict[str, KimiCodingConfig] = {}
         self._init_agent_apis()
+        # 长期Agent客户端（随闭环模拟启动时打开并预连接）
+        self.roster = AgentRoster(self.agent_apis, models=self.model_routes)
         
         # 统计
         self.loop_stats = {
@@ -152,7 +209,33 @@ class ClosedLoopCompanySystem(AdvancedCompanySystem):
                 "market_scan": {"limit": 10, "window": "daily"},
                 "project_approval": {"limit": 3, "window": "daily"},
                 "tweet_post": {"limit": 8, "window": "daily"}
-            }
+            },
+            # 步骤超时（秒），超时的步骤按失败处理并发出 step_stale 事件
+            "step_timeouts": {
+                "default": 1800,
+                "strategic_decision": 3600
+            },
+            "model_routing": self._init_model_routing()
+        }
+    
+    def _init_model_routing(self) -> Dict:
+        """模型路由表：例行步骤走快速小模型，阻塞决策走大模型，小模型低置信度时升级"""
+        models = tier_models_from_env()
+        return {
+            "tiers": {
+                "fast": {"model": models["fast"], "max_tokens": 1200, "temperature": 0.3},
+                "standard": {"model": models["standard"], "max_tokens": 2500, "temperature": 0.5},
+                "large": {"model": models["large"], "max_tokens": 4000, "temperature": 0.7},
+            },
+            # 按顺序匹配，priority 为调度优先级类别（按 step_kind 映射，见 scheduler）
+            "rules": [
+                {"priority": "CRITICAL", "tier": "large"},
+                {"agent": "ceo", "tier": "large"},
+                {"priority": "LOW", "tier": "fast"},
+                {"step_kind": ["product_review"], "tier": "fast"},
+            ],
+            "default_tier": "standard",
+            "escalation": {"enabled": True, "confidence_below": 0.6, "to": "large"}
         }
     
     def _init_triggers(self) -> List[TriggerRule]:
@@ -231,37 +314,34 @@ class ClosedLoopCompanySystem(AdvancedCompanySystem):
         """
         proposal_id = f"prop_{datetime.now().strftime('%Y%m%d%H%M%S')}_{random.randint(1000,9999)}"
         
-        # 1. Cap Gates检查
-        gate_results = {}
-        for step_kind in step_kinds:
-            gate_result = self._check_cap_gate(step_kind)
-            gate_results[step_kind] = gate_result
+        # 1. Cap Gates检查（通过时为各步骤预留名额）
+        admitted, gate_results = self.quotas.admit(step_kinds)
+        if not admitted:
+            step_kind, gate_result = list(gate_results.items())[-1]
+            # 拒绝提案
+            proposal = Proposal(
+                id=proposal_id,
+                title=title,
+                description=description,
+                proposed_by=proposed_by,
+                status=ProposalStatus.REJECTED,
+                created_at=datetime.now(),
+                rejected_reason=gate_result["reason"],
+                cap_gates=gate_results
+            )
+            self.proposals[proposal_id] = proposal
+            self.loop_stats["proposals_rejected"] += 1
             
-            if not gate_result["ok"]:
-                # 拒绝提案
-                proposal = Proposal(
-                    id=proposal_id,
-                    title=title,
-                    description=description,
-                    proposed_by=proposed_by,
-                    status=ProposalStatus.REJECTED,
-                    created_at=datetime.now(),
-                    rejected_reason=gate_result["reason"],
-                    cap_gates=gate_results
-                )
-                self.proposals[proposal_id] = proposal
-                self.loop_stats["proposals_rejected"] += 1
-                
-                # 发出事件
-                self._emit_event(
-                    agent_id=proposed_by,
-                    event_type="proposal_rejected",
-                    tags=["proposal", "rejected", step_kind],
-                    payload={"proposal_id": proposal_id, "reason": gate_result["reason"]}
-                )
-                
-                print(f"   ❌ Proposal rejected: {gate_result['reason']}")
-                return proposal
+            # 发出事件
+            self._emit_event(
+                agent_id=proposed_by,
+                event_type="proposal_rejected",
+                tags=["proposal", "rejected", step_kind],
+                payload={"proposal_id": proposal_id, "reason": gate_result["reason"]}
+            )
+            
+            print(f"   ❌ Proposal rejected: {gate_result['reason']}")
+            return proposal
         
         # 2. 创建提案
         proposal = Proposal(
@@ -281,41 +361,18 @@ class ClosedLoopCompanySystem(AdvancedCompanySystem):
         # 3. 自动审批检查
         await self._evaluate_auto_approve(proposal, step_kinds, context)
         
+        # 未获批的提案不执行步骤，归还预留名额
+        if not proposal.mission_id:
+            self.quotas.release(step_kinds)
+        
         return proposal
     
     def _check_cap_gate(self, step_kind: str) -> Dict:
         """
         Cap Gates检查
-        在提案阶段就拒绝，不生成队列任务
+        在提案阶段就拒绝，不生成队列任务（窗口计数 + 已预留名额，O(1)）
         """
-        gate_config = self.policies["cap_gates"].get(step_kind)
-        if not gate_config:
-            return {"ok": True}
-        
-        limit = gate_config["limit"]
-        window = gate_config["window"]
-        
-        # 计算窗口内的数量
-        if window == "daily":
-            window_start = datetime.now() - timedelta(days=1)
-        else:
-            window_start = datetime.now() - timedelta(hours=1)
-        
-        # 统计该类型步骤的数量
-        count = sum(
-            1 for step in self.steps.values()
-            if step.step_kind == step_kind 
-            and step.started_at 
-            and step.started_at > window_start
-        )
-        
-        if count >= limit:
-            return {
-                "ok": False,
-                "reason": f"{step_kind} quota reached ({count}/{limit} in {window})"
-            }
-        
-        return {"ok": True, "current": count, "limit": limit}
+        return self.quotas.check(step_kind)
     
     async def _evaluate_auto_approve(self, proposal: Proposal, step_kinds: List[str], context: Dict):
         """自动审批评估"""
@@ -351,12 +408,15 @@ class ClosedLoopCompanySystem(AdvancedCompanySystem):
         
         steps = []
         for i, step_kind in enumerate(step_kinds):
+            # 只依赖本任务中排在前面的步骤，保证无环
+            prerequisites = self._get_step_dependencies(step_kind)
             step = MissionStep(
                 id=f"step_{mission_id}_{i}",
                 mission_id=mission_id,
                 step_kind=step_kind,
                 status=StepStatus.QUEUED,
-                assigned_to=self._get_step_agent(step_kind)
+                assigned_to=self._get_step_agent(step_kind),
+                depends_on=[s.id for s in steps if s.step_kind in prerequisites]
             )
             steps.append(step)
             self.steps[step.id] = step
@@ -371,6 +431,7 @@ class ClosedLoopCompanySystem(AdvancedCompanySystem):
         self.missions[mission_id] = mission
         proposal.mission_id = mission_id
         proposal.status = ProposalStatus.EXECUTING
+        self.proposals.save(proposal)
         
         print(f"   🚀 Mission created: {len(steps)} steps")
         
@@ -397,54 +458,118 @@ class ClosedLoopCompanySystem(AdvancedCompanySystem):
         }
         return mapping.get(step_kind, "ceo")
     
+    def _get_step_dependencies(self, step_kind: str) -> List[str]:
+        """步骤的前置步骤类型（同一任务中存在时才生效），其余步骤互相独立、并行执行"""
+        mapping = {
+            "strategic_decision": ["market_scan", "tech_eval", "financial_check", "product_review", "ops_eval"],
+        }
+        return mapping.get(step_kind, [])
+    
     async def _execute_mission(self, mission: Mission):
-        """执行任务"""
-        for step in mission.steps:
-            if step.status != StepStatus.QUEUED:
-                continue
-            
-            # 标记为运行中
-            step.status = StepStatus.RUNNING
-            step.started_at = datetime.now()
-            
-            print(f"   ⚙️ Executing: {step.step_kind} → {step.assigned_to}")
-            
-            # 调用Agent执行
-            result = await self._execute_step(step)
-            
-            if result["success"]:
-                step.status = StepStatus.SUCCEEDED
-                step.result = result
-                print(f"   ✅ Succeeded")
-            else:
-                step.status = StepStatus.FAILED
-                step.error = result.get("error")
-                print(f"   ❌ Failed: {result.get('error')}")
-                
-                # 触发失败诊断
-                await self._trigger_mission_failed(mission, step)
-            
-            step.completed_at = datetime.now()
+        """执行任务（依赖已满足的步骤并行执行，失败步骤的后续步骤直接取消）"""
+        await get_mission_executor().run(
+            mission.steps,
+            run_step=self._run_mission_step,
+            on_cancelled=self._cancel_step,
+            completed={s.id: s.status == StepStatus.SUCCEEDED for s in mission.steps if s.status != StepStatus.QUEUED}
+        )
         
         # 检查任务完成
         await self._finalize_mission(mission)
     
+    async def _run_mission_step(self, step: MissionStep) -> bool:
+        """执行一个步骤并记录状态"""
+        # 标记为运行中，计入配额窗口
+        step.status = StepStatus.RUNNING
+        step.started_at = datetime.now()
+        self.quotas.consume(step.step_kind, step.started_at.timestamp())
+        self.steps.save(step)
+        
+        print(f"   ⚙️ Executing: {step.step_kind} → {step.assigned_to}")
+        
+        # 调用Agent执行（超过截止时间时取消）
+        try:
+            result = await self.deadlines.guard(step.id, self._execute_step(step), self._step_deadline(step))
+        except DeadlineExceeded:
+            result = {"success": False, "error": self._stale_error(step)}
+            self._emit_stale_event(step)
+        
+        if result["success"]:
+            step.status = StepStatus.SUCCEEDED
+            step.result = result
+            print(f"   ✅ Succeeded: {step.step_kind}")
+        else:
+            step.status = StepStatus.FAILED
+            step.error = result.get("error")
+            print(f"   ❌ Failed: {step.step_kind}: {result.get('error')}")
+        
+        step.completed_at = datetime.now()
+        self.steps.save(step)
+        return result["success"]
+    
+    def _step_deadline(self, step: MissionStep) -> float:
+        """步骤截止时间（开始时间 + 该步骤类型的超时）"""
+        timeouts = self.policies["step_timeouts"]
+        started_at = step.started_at or datetime.now()
+        return started_at.timestamp() + timeouts.get(step.step_kind, timeouts["default"])
+    
+    def _stale_error(self, step: MissionStep) -> str:
+        timeouts = self.policies["step_timeouts"]
+        return f"Stale: no progress for {timeouts.get(step.step_kind, timeouts['default'])}s"
+    
+    def _emit_stale_event(self, step: MissionStep):
+        self._emit_event(
+            agent_id="system",
+            event_type="step_stale",
+            tags=["step", "stale", step.step_kind],
+            payload={"step_id": step.id, "mission_id": step.mission_id, "step_kind": step.step_kind}
+        )
+    
+    async def _recover_stale_step(self, step: MissionStep):
+        """上次运行遗留的步骤超时：没有执行中的调用可取消，直接标记失败并结束任务"""
+        if step.status != StepStatus.RUNNING:
+            return
+        step.status = StepStatus.FAILED
+        step.error = self._stale_error(step)
+        step.completed_at = datetime.now()
+        self.steps.save(step)
+        print(f"   ⚠️ Recovered stale step: {step.id}")
+        self._emit_stale_event(step)
+        mission = self.missions.get(step.mission_id)
+        if mission and mission.status == "running":
+            await self._finalize_mission(mission)
+    
+    def _cancel_step(self, step: MissionStep, failed: Optional[MissionStep]):
+        """前置步骤失败，取消步骤"""
+        step.status = StepStatus.CANCELLED
+        step.error = f"依赖步骤失败: {failed.step_kind}" if failed else "依赖无法满足"
+        step.completed_at = datetime.now()
+        self.steps.save(step)
+        self.quotas.release(step.step_kind)
+        print(f"   ⏭️ Cancelled: {step.step_kind}")
+    
     async def _execute_step(self, step: MissionStep) -> Dict:
         """执行单个步骤"""
         config = self.agent_apis.get(step.assigned_to)
         
         if not config:
             # 模拟执行
-            await asyncio.sleep(0.5)
+            await pace(0.5)
             return {"success": True, "mode": "simulated"}
         
+        async def call(tier: str) -> Dict:
+            runner = self.roster.client(step.assigned_to, step.step_kind, tier)
+            # step_id 不参与缓存Key，相同步骤类型的请求可命中响应缓存
+            return await runner.think(
+                task=f"执行{step.step_kind}任务",
+                context={"step_id": step.id, "step_kind": step.step_kind},
+                cache_exclude=["step_id"]
+            )
+        
         try:
-            async with KimiCodingRunner(config) as runner:
-                result = await runner.think(
-                    task=f"执行{step.step_kind}任务",
-                    context={"step_id": step.id}
-                )
-                return {"success": True, "result": result}
+            tier = self.model_routes.resolve(step.step_kind, step.assigned_to)
+            result = await self.model_routes.think(call, tier, config)
+            return {"success": True, "result": result}
         except Exception as e:
             return {"success": False, "error": str(e)}
     
@@ -452,7 +577,7 @@ class ClosedLoopCompanySystem(AdvancedCompanySystem):
         """完成任务"""
         # 检查所有步骤状态
         all_succeeded = all(s.status == StepStatus.SUCCEEDED for s in mission.steps)
-        any_failed = any(s.status == StepStatus.FAILED for s in mission.steps)
+        any_failed = any(s.status in (StepStatus.FAILED, StepStatus.CANCELLED) for s in mission.steps)
         
         if any_failed:
             mission.status = "failed"
@@ -463,20 +588,25 @@ class ClosedLoopCompanySystem(AdvancedCompanySystem):
             return  # 还有步骤未完成
         
         mission.completed_at = datetime.now()
+        self.missions.save(mission)
         
         # 更新提案状态
         proposal = self.proposals.get(mission.proposal_id)
         if proposal:
             proposal.status = ProposalStatus.COMPLETED if all_succeeded else ProposalStatus.FAILED
+            self.proposals.save(proposal)
         
         print(f"   📋 Mission {mission.status}")
         
-        # 发出事件
+        # 发出事件（失败诊断由 mission.failed 触发器处理）
         self._emit_event(
             agent_id="system",
             event_type=f"mission_{mission.status}",
             tags=["mission", mission.status],
-            payload={"mission_id": mission.id}
+            payload={
+                "mission_id": mission.id,
+                "failed_steps": [s.id for s in mission.steps if s.status == StepStatus.FAILED]
+            }
         )
     
     # ============== Event System ==============
@@ -491,39 +621,69 @@ class ClosedLoopCompanySystem(AdvancedCompanySystem):
             payload=payload,
             created_at=datetime.now()
         )
-        self.events.append(event)
+        self.event_bus.publish(event)
+        self.store.append_event(event)
         self.loop_stats["events_emitted"] += 1
     
+    async def _log_event(self, event: AgentEvent):
+        """事件日志订阅者（订阅全部事件）"""
+        print(f"   📨 {event.event_type}")
+    
     # ============== Triggers ==============
     
-    async def _trigger_mission_failed(self, mission: Mission, failed_step: MissionStep):
-        """触发任务失败处理"""
-        trigger = next((t for t in self.triggers if t.id == "trigger_mission_failed"), None)
-        if not trigger:
-            return
-        
-        # 检查冷却
-        if trigger.last_triggered:
-            cooldown_end = trigger.last_triggered + timedelta(minutes=trigger.cooldown_minutes)
-            if datetime.now() < cooldown_end:
-                return
+    async def _action_create_proposal(self, rule: TriggerRule, event: AgentEvent, step_kind: str):
+        """触发器动作：创建提案（条件匹配、冷却和概率由触发器引擎判断）"""
+        self.loop_stats["triggers_fired"] += 1
         
-        # 检查概率
-        if random.random() > trigger.probability:
+        mission = self.missions.get(event.payload.get("mission_id"))
+        failed_steps = [self.steps[s] for s in event.payload.get("failed_steps", []) if s in self.steps]
+        if mission and failed_steps:
+            # 创建诊断提案
+            await self.create_proposal(
+                title=f"诊断失败任务: {mission.title}",
+                description=f"步骤 {failed_steps[0].step_kind} 失败，需要诊断",
+                proposed_by="system",
+                step_kinds=[step_kind],
+                context={"failed_mission": mission.id, "failed_step": failed_steps[0].id}
+            )
             return
         
-        trigger.last_triggered = datetime.now()
-        self.loop_stats["triggers_fired"] += 1
-        
-        # 创建诊断提案
         await self.create_proposal(
-            title=f"诊断失败任务: {mission.title}",
-            description=f"步骤 {failed_step.step_kind} 失败，需要诊断",
+            title=f"{rule.name}: {event.event_type}",
+            description=f"由事件 {event.id} 触发",
             proposed_by="system",
-            step_kinds=["diagnose"],
-            context={"failed_mission": mission.id, "failed_step": failed_step.id}
+            step_kinds=[step_kind],
+            context={"event_id": event.id, **event.payload}
         )
     
+    # ============== State Log ==============
+    
+    def _capture_state(self) -> Dict:
+        """快照中表以外的状态"""
+        return {"financials": self.financials, "days_completed": self.days_completed}
+    
+    def _restore_state(self, state: Dict):
+        """恢复快照中表以外的状态"""
+        self.financials.update(state.get("financials", {}))
+        self.days_completed = state.get("days_completed", 0)
+    
+    def _apply_state_record(self, op: str, data: Dict):
+        """重放表以外的状态记录"""
+        if op == "financial_delta":
+            for key, delta in data.items():
+                self.financials[key] = self.financials.get(key, 0) + delta
+        elif op == "day_completed":
+            self.days_completed = data["day"]
+    
+    def _complete_day(self, day: int):
+        """记录当天的财务变动和完成的一天"""
+        delta = StateLog.financial_delta(self._logged_financials, self.financials)
+        if delta:
+            self.state_log.append("financial_delta", delta)
+        self._logged_financials = dict(self.financials)
+        self.days_completed = day
+        self.state_log.append("day_completed", {"day": day})
+    
     # ============== Main Loop ==============
     
     async def run_closed_loop(self, days: int = 3):
@@ -533,29 +693,48 @@ class ClosedLoopCompanySystem(AdvancedCompanySystem):
         print(f"   Loop: Propose → Approve → Execute → Event → React")
         print(f"{'='*70}")
         
-        for day in range(1, days + 1):
-            self.metrics["day"] = day
-            
-            print(f"\n📅 Day {day}")
-            print("-" * 50)
-            
-            # 1. CMO扫描市场（创建提案）
-            await self._day_market_scan()
-            
-            # 2. 评估机会（创建提案）
-            await self._day_evaluate_opportunities()
-            
-            # 3. CEO决策（自动审批/执行）
-            await self._day_strategic_decisions()
-            
-            # 4. 处理事件和触发器
-            await self._day_process_events()
-            
-            # 5. 自愈检查
-            await self._day_self_healing()
-            
-            print(f"\n✅ Day {day} 完成")
-            await asyncio.sleep(0.5)
+        if self.roster.configs:
+            await self.roster.start()
+            stats = self.roster.get_stats()
+            print(f"🔌 Agent客户端: {stats['clients']}个 | 预连接 {stats['preconnected']}条 "
+                  f"(失败 {stats['preconnect_failed']}) | 耗时 {stats['startup_ms']:.0f}ms")
+        
+        self.event_bus.start()
+        self.deadlines.start()
+        self.store.start()
+        try:
+            first_day = self.days_completed + 1
+            for day in range(first_day, first_day + days):
+                self.metrics["day"] = day
+                
+                print(f"\n📅 Day {day}")
+                print("-" * 50)
+                
+                # 1. CMO扫描市场（创建提案）
+                await self._day_market_scan()
+                
+                # 2. 评估机会（创建提案）
+                await self._day_evaluate_opportunities()
+                
+                # 3. CEO决策（自动审批/执行）
+                await self._day_strategic_decisions()
+                
+                # 4. 处理事件和触发器
+                await self._day_process_events()
+                
+                # 5. 自愈检查
+                await self._day_self_healing()
+                
+                self._complete_day(day)
+                print(f"\n✅ Day {day} 完成")
+                await pace(0.5)
+        finally:
+            await self.deadlines.close()
+            await self.event_bus.close()
+            self.state_log.close()
+            self.quotas.close()
+            await self.store.close()
+            await self.roster.close()
         
         self._print_closed_loop_summary()
     
@@ -610,27 +789,18 @@ class ClosedLoopCompanySystem(AdvancedCompanySystem):
         """处理事件"""
         print("\n📡 处理事件...")
         
-        unprocessed = [e for e in self.events if not e.processed]
-        for event in unprocessed[:5]:
-            event.processed = True
-            print(f"   📨 {event.event_type}")
+        # 事件发出时已投递给订阅者，这里只等待积压事件确认
+        await self.event_bus.drain()
+        stats = self.event_bus.get_stats()
+        print(f"   已发出 {stats['published']} | 积压 {stats['backlog']} | 死信 {stats['dead_letters']}")
     
     async def _day_self_healing(self):
         """自愈检查"""
         print("\n🏥 自愈检查...")
         
-        # 检查卡住的任务
-        stale_threshold = datetime.now() - timedelta(minutes=30)
-        stale_steps = [
-            s for s in self.steps.values()
-            if s.status == StepStatus.RUNNING
-            and s.started_at and s.started_at < stale_threshold
-        ]
-        
-        for step in stale_steps:
-            step.status = StepStatus.FAILED
-            step.error = "Stale: no progress for 30 minutes"
-            print(f"   ⚠️ Recovered stale step: {step.id}")
+        # 卡住的步骤在截止时间到达时已由定时器处理，这里只汇报
+        stats = self.deadlines.get_stats()
+        print(f"   监控中 {stats['pending']} | 累计超时 {stats['fired']}")
     
     def _print_closed_loop_summary(self):
         """打印闭环总结"""
@@ -643,13 +813,71 @@ class ClosedLoopCompanySystem(AdvancedCompanySystem):
             print(f"   {key}: {value}")
         
         print(f"\n📁 状态:")
-        print(f"   Proposals: {len(self.proposals)} (Pending: {len([p for p in self.proposals.values() if p.status == ProposalStatus.PENDING])})")
-        print(f"   Missions: {len(self.missions)} (Completed: {len([m for m in self.missions.values() if m.status == 'succeeded'])})")
-        print(f"   Steps: {len(self.steps)}")
-        print(f"   Events: {len(self.events)}")
+        print(f"   Proposals: {self.proposals.count()} (Pending: {self.proposals.count(status=ProposalStatus.PENDING)})")
+        print(f"   Missions: {self.missions.count()} (Completed: {self.missions.count(status='succeeded')})")
+        print(f"   Steps: {self.steps.count()}")
+        print(f"   Events: {len(self.event_bus)} (保留 {len(self.event_bus.history)})")
         
         print(f"\n💰 财务:")
         print(f"   现金流: ¥{self.financials['cash_flow']:,.0f}")
+        
+        cache = get_response_cache()
+        if cache:
+            stats = cache.get_stats()
+            print(f"\n🗄️  LLM缓存:")
+            print(f"   命中: {stats['hits']} / 未命中: {stats['misses']} (命中率 {stats['hit_rate']*100:.0f}%)")
+        
+        flight = get_single_flight().get_stats()
+        if flight["coalesced"]:
+            print(f"\n🔗 请求合并: {flight['coalesced']}/{flight['calls']} 次调用共享了飞行中的请求")
+        
+        tape = get_cassette().get_stats()
+        if tape["mode"] != "off":
+            print(f"\n📼 磁带({tape['mode']}): 录制 {tape['recorded']} | 精确回放 {tape['exact_hits']} | "
+                  f"顺序回放 {tape['sequence_hits']} | 未命中 {tape['misses']}")
+        
+        routing = get_provider_router().get_stats()
+        if routing["providers"]:
+            routed = " | ".join(f"{name} {count}次" for name, count in routing["routed"].items())
+            print(f"\n🔀 供应商路由({routing['policy']}): {routed or '无调用'}")
+        
+        models = self.model_routes.get_stats()
+        if models["calls"]:
+            tiers = " | ".join(f"{tier} {count}次" for tier, count in models["calls"].items())
+            print(f"\n🎚️ 模型档位: {tiers} | 低置信度升级 {sum(models['escalations'].values())}次")
+        
+        quota_usage = [
+            f"{step_kind} {used}/{limit}({window})"
+            for step_kind, windows in self.quotas.usage().items()
+            for window, (used, _, limit) in windows.items() if used
+        ]
+        if quota_usage:
+            print(f"\n🚪 配额: {' | '.join(quota_usage)}")
+        
+        triggers = self.trigger_engine.get_stats()
+        if triggers["events"]:
+            print(f"\n⚡ 触发器: {triggers['rules']}条规则 | 评估 {triggers['evaluated']} | 触发 {triggers['fired']} | "
+                  f"冷却跳过 {triggers['cooldown']} | 概率跳过 {triggers['probability']}")
+        
+        stored = self.store.get_stats()
+        if stored["persistent"]:
+            print(f"\n💾 状态存储: 写入 {stored['rows_written']}行 + {stored['events_written']}事件 | "
+                  f"{stored['flushes']}批 ({stored['flush_ms']:.0f}ms) | 惰性加载 {stored['lazy_loads']} | 淘汰 {stored['evicted']}")
+        
+        logged = self.state_log.get_stats()
+        if logged["enabled"]:
+            print(f"\n🧾 状态日志: seq {logged['seq']} | 快照 {logged['snapshots']}次 | 重放 {logged['replayed']}条 "
+                  f"({logged['recovery_ms']:.0f}ms) | 压缩分段 {logged['compacted_segments']} | 磁盘 {logged['disk_bytes'] / 1024:.0f}KB")
+        
+        deadlines = self.deadlines.get_stats()
+        if deadlines["fired"]:
+            print(f"\n⏱️ 步骤超时: {deadlines['fired']}次 | 最大触发延迟 {deadlines['max_lag_ms']:.0f}ms")
+        
+        executor = get_mission_executor().get_stats()
+        if executor["steps_run"]:
+            print(f"\n🧩 任务步骤: 执行 {executor['steps_run']} | 失败 {executor['steps_failed']} | "
+                  f"取消 {executor['steps_cancelled']} | 峰值并行 {executor['peak_parallel']} | "
+                  f"并行度 {executor['parallelism']}x")
 
 
 # ============== Entry Point ==============
@@ -662,7 +890,10 @@ async def main():
     print("╚══════════════════════════════════════════════════════════════╝")
     
     company = ClosedLoopCompanySystem("Nexus AI Closed Loop")
-    await company.run_closed_loop(days=3)
+    try:
+        await company.run_closed_loop(days=3)
+    finally:
+        await close_pool()
     
     print("\n" + "="*70)
     print("✅ 闭环模拟完成!")
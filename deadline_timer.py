@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Deadline Timer - 截止时间小顶堆
+步骤开始时登记截止时间、结束时取消，单个协程睡到最近的截止时间，到期立即执行回调，
+不再每天扫描全部步骤寻找超时的 RUNNING 步骤。取消为惰性删除（O(1)），
+堆中失效条目过多时整体重建
+
+    timer = DeadlineTimer()
+    timer.start()                                            # 在事件循环中启动
+    timer.schedule(step.id, deadline_ts, on_stale)           # 回调可为普通函数或协程函数
+    timer.cancel(step.id)
+    result = await timer.guard(step.id, coro, deadline_ts)   # 到期取消 coro 并抛出 DeadlineExceeded
+    await timer.close()
+"""
+
+import time
+import heapq
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional
+
+
+class DeadlineExceeded(TimeoutError):
+    """guard() 执行的协程超过截止时间"""
+
+
+class DeadlineTimer:
+    """截止时间定时器（时间为 time.time() 时间戳，重启恢复的步骤可按原开始时间登记）"""
+
+    def __init__(self):
+        self._heap: List[List[Any]] = []      # [截止时间, 序号, key, 回调]，取消时 key/回调置 None
+        self._entries: Dict[Hashable, List[Any]] = {}
+        self._seq = 0
+        self._wakeup: Optional[asyncio.Event] = None
+        self._worker: Optional[asyncio.Task] = None
+        self.stats = {
+            "scheduled": 0,
+            "cancelled": 0,
+            "fired": 0,
+            "failed": 0,
+            "peak_pending": 0,
+            "max_lag_ms": 0.0
+        }
+
+    def __len__(self) -> int:
+        """登记中的截止时间数"""
+        return len(self._entries)
+
+    # ============== 登记 / 取消 ==============
+
+    def schedule(self, key: Hashable, deadline: float, callback: Callable[[], Any]):
+        """登记截止时间（同一 key 重复登记时替换原截止时间）"""
+        self.cancel(key, count=False)
+        self._seq += 1
+        entry = [deadline, self._seq, key, callback]
+        self._entries[key] = entry
+        heapq.heappush(self._heap, entry)
+        self.stats["scheduled"] += 1
+        self.stats["peak_pending"] = max(self.stats["peak_pending"], len(self._entries))
+        # 新的截止时间最早时唤醒定时协程重新计算睡眠时间
+        if self._wakeup and self._heap[0] is entry:
+            self._wakeup.set()
+
+    def cancel(self, key: Hashable, count: bool = True) -> bool:
+        """取消截止时间，返回是否存在"""
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return False
+        entry[2] = entry[3] = None
+        if count:
+            self.stats["cancelled"] += 1
+        if len(self._heap) > 64 and len(self._heap) > 2 * len(self._entries):
+            self._heap = [e for e in self._heap if e[2] is not None]
+            heapq.heapify(self._heap)
+        return True
+
+    def deadline(self, key: Hashable) -> Optional[float]:
+        entry = self._entries.get(key)
+        return entry[0] if entry else None
+
+    async def guard(self, key: Hashable, awaitable: Awaitable, deadline: float) -> Any:
+        """执行 awaitable，截止时间到达时取消并抛出 DeadlineExceeded；结束后自动取消登记"""
+        task = asyncio.ensure_future(awaitable)
+        expired = []
+
+        def expire():
+            expired.append(True)
+            task.cancel()
+
+        self.schedule(key, deadline, expire)
+        try:
+            return await task
+        except asyncio.CancelledError:
+            if expired:
+                raise DeadlineExceeded(f"{key} 超过截止时间")
+            raise
+        finally:
+            self.cancel(key)
+
+    # ============== 定时协程 ==============
+
+    def start(self):
+        """在当前事件循环中启动定时协程（启动前登记的截止时间照常生效，已过期的立即触发）"""
+        if self._worker is None:
+            self._wakeup = asyncio.Event()
+            self._worker = asyncio.ensure_future(self._run())
+
+    async def _run(self):
+        while True:
+            self._wakeup.clear()
+            await self._fire_due()
+            timeout = max(0.0, self._heap[0][0] - time.time()) if self._heap else None
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _fire_due(self):
+        """按截止时间顺序执行所有已到期的回调（回调应尽快返回）"""
+        while self._heap:
+            now = time.time()
+            deadline, _, key, callback = self._heap[0]
+            if key is not None and deadline > now:
+                return
+            heapq.heappop(self._heap)
+            if key is None:
+                continue
+            del self._entries[key]
+            self.stats["fired"] += 1
+            self.stats["max_lag_ms"] = max(self.stats["max_lag_ms"], (now - deadline) * 1000)
+            try:
+                result = callback()
+                if asyncio.iscoroutine(result):
+                    await result
+            except Exception as e:
+                self.stats["failed"] += 1
+                print(f"   ⚠️ Deadline callback {key} failed: {e}")
+
+    async def close(self):
+        """停止定时协程（未到期的截止时间保留，不触发）"""
+        if self._worker is None:
+            return
+        self._worker.cancel()
+        await asyncio.gather(self._worker, return_exceptions=True)
+        self._worker = None
+        self._wakeup = None
+
+    # ============== Stats ==============
+
+    def get_stats(self) -> Dict:
+        """定时器统计"""
+        return {
+            **self.stats,
+            "pending": len(self._entries),
+            "next_in_seconds": round(min(e[0] for e in self._entries.values()) - time.time(), 1) if self._entries else None
+        }
@@ -0,0 +1,286 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Decision History - 有界决策/消息历史
+内存中只保留最近 capacity 条（环形缓冲），更早的记录按批追加写入压缩分段文件：
+    data/history/<name>.00001.jsonl.gz   （每批一个gzip成员，追加写入，超过大小上限换新分段）
+按Agent、时间范围、决策类型查询时同时读取磁盘和内存两层，长期运行时内存占用保持平稳
+
+    NEXUS_HISTORY_CAPACITY=1000 NEXUS_HISTORY_DIR=data/history python3 closed_loop_company.py
+    未设置 NEXUS_HISTORY_DIR 时不落盘（超出容量的记录直接丢弃）
+重启后按相同名称创建的历史会登记已有分段，query() 仍能检索到之前落盘的记录
+"""
+
+import os
+import re
+import gzip
+import json
+from collections import Counter, deque
+from datetime import datetime
+from typing import Any, Deque, Dict, Iterator, List, Optional, Set, Union
+from dataclasses import dataclass, field
+
+
+@dataclass
+class HistoryConfig:
+    """历史记录配置"""
+    capacity: int = 1000                        # 内存中保留的条数
+    spill_dir: Optional[str] = None             # 落盘目录，None/空表示不落盘
+    spill_batch: int = 200                      # 每次溢出写入的条数（一个gzip成员）
+    segment_bytes: int = 16 * 1024 * 1024       # 单个分段文件大小上限
+
+    @classmethod
+    def from_env(cls) -> "HistoryConfig":
+        """从环境变量读取配置"""
+        config = cls()
+        config.capacity = int(os.getenv("NEXUS_HISTORY_CAPACITY", config.capacity))
+        config.spill_dir = os.getenv("NEXUS_HISTORY_DIR") or config.spill_dir
+        config.spill_batch = int(os.getenv("NEXUS_HISTORY_SPILL_BATCH", config.spill_batch))
+        config.segment_bytes = int(float(os.getenv("NEXUS_HISTORY_SEGMENT_MB", "16")) * 1024 * 1024)
+        return config
+
+
+@dataclass
+class Block:
+    """分段中的一个gzip成员（一次溢出的一批记录）及其摘要，查询时据此跳过无关批次"""
+    offset: int
+    length: int
+    first_ts: Optional[str] = None
+    last_ts: Optional[str] = None
+    agents: Set[str] = field(default_factory=set)
+    kinds: Set[str] = field(default_factory=set)
+
+    def may_contain(self, agent: Optional[str], kind: Optional[str],
+                    since: Optional[str], until: Optional[str]) -> bool:
+        if agent is not None and agent not in self.agents:
+            return False
+        if kind is not None and kind not in self.kinds:
+            return False
+        if since is not None and self.last_ts is not None and self.last_ts < since:
+            return False
+        if until is not None and self.first_ts is not None and self.first_ts > until:
+            return False
+        return True
+
+
+@dataclass
+class Segment:
+    """一个压缩分段文件；本进程写入的分段带批次索引，历史进程留下的分段查询时整体扫描"""
+    path: str
+    size: int = 0
+    blocks: Optional[List[Block]] = field(default_factory=list)
+
+
+_names_in_use: Set[str] = set()
+
+
+def _unique_name(name: str) -> str:
+    """同一进程内的同名历史（如同一Agent的多个供应商客户端）使用不同文件"""
+    base = re.sub(r"[^\w.-]", "_", name) or "history"
+    candidate, n = base, 1
+    while candidate in _names_in_use:
+        n += 1
+        candidate = f"{base}-{n}"
+    _names_in_use.add(candidate)
+    return candidate
+
+
+def _timestamp(value: Union[str, datetime, None]) -> Optional[str]:
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+class DecisionHistory:
+    """
+    有界历史记录
+    兼容原来的 List[Dict] 用法：append / len / 迭代 / 下标与切片（迭代与下标只覆盖内存中的近期记录，
+    len 为累计条数）；跨两层的检索使用 query()，按类型计数使用 counts()
+    """
+
+    def __init__(self, name: str, agent_key: Optional[str] = "agent_id", type_key: Optional[str] = "type",
+                 time_key: str = "timestamp", config: HistoryConfig = None):
+        """
+        Args:
+            name: 历史名称（分段文件名前缀，同一进程内重名时自动加后缀）
+            agent_key / type_key / time_key: 记录中表示Agent、类型、时间(ISO字符串)的字段
+            config: 历史记录配置，默认读取 NEXUS_HISTORY_*
+        """
+        self.config = config or HistoryConfig.from_env()
+        self.name = name
+        self._file_prefix: Optional[str] = None   # 仅落盘的实例占用名称
+        self.agent_key = agent_key
+        self.type_key = type_key
+        self.time_key = time_key
+        self._memory: Deque[Dict] = deque()
+        self._segments: List[Segment] = []
+        self._kind_counts: Counter = Counter()
+        self.spilled = 0
+        self.dropped = 0
+        if self.config.spill_dir:
+            self._register_segments()
+
+    # ============== 写入 ==============
+
+    def append(self, entry: Dict):
+        """追加一条记录，超出容量时溢出最早的一批"""
+        self._memory.append(entry)
+        if self.type_key:
+            self._kind_counts[str(entry.get(self.type_key))] += 1
+        if len(self._memory) > self.config.capacity:
+            batch = max(1, min(self.config.spill_batch, len(self._memory) - self.config.capacity // 2))
+            self._spill([self._memory.popleft() for _ in range(batch)])
+
+    def _spill(self, entries: List[Dict]):
+        """一批记录压缩为一个gzip成员追加到当前分段，并登记批次索引"""
+        if not self.config.spill_dir:
+            self.dropped += len(entries)
+            return
+        segment = self._current_segment()
+        payload = gzip.compress("".join(
+            json.dumps(e, ensure_ascii=False, separators=(",", ":"), default=str) + "\n" for e in entries
+        ).encode("utf-8"))
+        with open(segment.path, "ab") as f:
+            f.write(payload)
+
+        block = Block(segment.size, len(payload))
+        for e in entries:
+            ts = e.get(self.time_key)
+            if ts is not None:
+                block.first_ts = ts if block.first_ts is None else min(block.first_ts, ts)
+                block.last_ts = ts if block.last_ts is None else max(block.last_ts, ts)
+            if self.agent_key and e.get(self.agent_key) is not None:
+                block.agents.add(str(e[self.agent_key]))
+            if self.type_key and e.get(self.type_key) is not None:
+                block.kinds.add(str(e[self.type_key]))
+        segment.blocks.append(block)
+        segment.size += len(payload)
+        self.spilled += len(entries)
+
+    def _register_segments(self):
+        """登记历史进程留下的分段（无批次索引，查询时整体扫描）"""
+        self._file_prefix = _unique_name(self.name)
+        if not os.path.isdir(self.config.spill_dir):
+            return
+        pattern = re.compile(rf"^{re.escape(self._file_prefix)}\.(\d+)\.jsonl\.gz$")
+        existing = sorted(
+            (int(m.group(1)), f) for f in os.listdir(self.config.spill_dir) if (m := pattern.match(f))
+        )
+        self._segments = [
+            Segment(os.path.join(self.config.spill_dir, f), blocks=None) for _, f in existing
+        ]
+
+    def _current_segment(self) -> Segment:
+        """当前可写分段；本进程总是从新分段开始写，不追加到历史进程留下的分段"""
+        if self._file_prefix is None:
+            self._register_segments()
+        os.makedirs(self.config.spill_dir, exist_ok=True)
+        segment = self._segments[-1] if self._segments else None
+        if segment is None or segment.blocks is None or segment.size >= self.config.segment_bytes:
+            return self._new_segment()
+        return segment
+
+    def _new_segment(self) -> Segment:
+        number = len(self._segments) + 1
+        path = os.path.join(self.config.spill_dir, f"{self._file_prefix}.{number:05d}.jsonl.gz")
+        while os.path.exists(path):
+            number += 1
+            path = os.path.join(self.config.spill_dir, f"{self._file_prefix}.{number:05d}.jsonl.gz")
+        segment = Segment(path)
+        self._segments.append(segment)
+        return segment
+
+    # ============== 读取 ==============
+
+    def __len__(self) -> int:
+        return len(self._memory) + self.spilled + self.dropped
+
+    def __iter__(self) -> Iterator[Dict]:
+        return iter(self._memory)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return list(self._memory)[index]
+        return self._memory[index]
+
+    def __bool__(self) -> bool:
+        return bool(self._memory) or self.spilled > 0
+
+    def recent(self, n: int) -> List[Dict]:
+        """最近 n 条（仅内存）"""
+        if n <= 0:
+            return []
+        return list(self._memory)[-n:]
+
+    def query(self, agent: Optional[str] = None, kind: Optional[str] = None,
+              since: Union[str, datetime, None] = None, until: Union[str, datetime, None] = None,
+              limit: Optional[int] = None) -> List[Dict]:
+        """
+        按Agent、决策类型、时间范围检索（磁盘与内存两层，按时间先后返回）
+
+        Args:
+            agent: agent_key 字段值
+            kind: type_key 字段值
+            since / until: 时间范围（含端点，datetime 或 ISO 字符串）
+            limit: 只返回最近的 limit 条
+        """
+        since, until = _timestamp(since), _timestamp(until)
+        matched = list(self._scan_disk(agent, kind, since, until))
+        matched.extend(e for e in self._memory if self._match(e, agent, kind, since, until))
+        if limit is not None:
+            matched = matched[-limit:] if limit > 0 else []
+        return matched
+
+    def _scan_disk(self, agent, kind, since, until) -> Iterator[Dict]:
+        for segment in self._segments:
+            if not os.path.exists(segment.path):
+                continue
+            if segment.blocks is None:
+                with gzip.open(segment.path, "rt", encoding="utf-8") as f:
+                    lines = list(f)
+                yield from self._match_lines(lines, agent, kind, since, until)
+                continue
+            blocks = [b for b in segment.blocks if b.may_contain(agent, kind, since, until)]
+            if not blocks:
+                continue
+            with open(segment.path, "rb") as f:
+                for block in blocks:
+                    f.seek(block.offset)
+                    lines = gzip.decompress(f.read(block.length)).decode("utf-8").splitlines()
+                    yield from self._match_lines(lines, agent, kind, since, until)
+
+    def _match_lines(self, lines: List[str], agent, kind, since, until) -> Iterator[Dict]:
+        for line in lines:
+            if not line.strip():
+                continue
+            entry = json.loads(line)
+            if self._match(entry, agent, kind, since, until):
+                yield entry
+
+    def _match(self, entry: Dict, agent, kind, since, until) -> bool:
+        if agent is not None and (not self.agent_key or str(entry.get(self.agent_key)) != agent):
+            return False
+        if kind is not None and (not self.type_key or str(entry.get(self.type_key)) != kind):
+            return False
+        ts = entry.get(self.time_key)
+        if since is not None and (ts is None or ts < since):
+            return False
+        if until is not None and (ts is None or ts > until):
+            return False
+        return True
+
+    def counts(self) -> Dict[str, int]:
+        """按 type_key 的累计条数（包含已溢出和已丢弃的记录）"""
+        return dict(self._kind_counts)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """历史统计"""
+        return {
+            "name": self._file_prefix or self.name,
+            "in_memory": len(self._memory),
+            "spilled": self.spilled,
+            "dropped": self.dropped,
+            "segments": len(self._segments),
+            "disk_bytes": sum(
+                s.size if s.blocks is not None else os.path.getsize(s.path)
+                for s in self._segments if os.path.exists(s.path)
+            )
+        }
@@ -0,0 +1,443 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Decision Parser - Agent决策提取
+单遍扫描定位包含 "decision" 的JSON对象（无论在代码块还是正文中，都没有时取第一个对象），
+容错修复常见的LLM JSON错误，并规范化 confidence / budget_request / timeline_days
+"""
+
+import re
+import sys
+import json
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+
+# 决策中应为列表的字段
+LIST_FIELDS = ("action_items", "risks", "recommendations", "team_requirements")
+
+_SMART_QUOTES = str.maketrans({"“": '"', "”": '"', "„": '"', "‘": "'", "’": "'"})
+_STRING = re.compile(r'"(?:\\.|[^"\\])*"')
+_TRAILING_COMMA = re.compile(r",\s*([}\]])")
+_LINE_COMMENT = re.compile(r"//[^\n]*")
+_UNQUOTED_KEY = re.compile(r'([{,]\s*)([^\W\d]\w*)(\s*:)')
+_PY_LITERALS = re.compile(r'\b(True|False|None)\b')
+_NUMBER = re.compile(r"-?\d+(?:\.\d+)?")
+
+
+# ============== 扫描 ==============
+
+def scan_json_object(text: str, start: int = 0) -> Tuple[Optional[int], Optional[int]]:
+    """
+    单遍扫描，返回第一个平衡JSON对象的 (起点, 终点+1)
+    只找到起点而未闭合（输出被截断）时返回 (起点, None)；没有 "{" 时返回 (None, None)
+    字符串内的括号和转义引号不参与计数
+    """
+    begin = text.find("{", start)
+    if begin < 0:
+        return None, None
+
+    depth = 0
+    in_string = False
+    quote = ""
+    escaped = False
+    for i in range(begin, len(text)):
+        ch = text[i]
+        if in_string:
+            if escaped:
+                escaped = False
+            elif ch == "\\":
+                escaped = True
+            elif ch == quote:
+                in_string = False
+        elif ch == '"' or (ch == "'" and depth > 0 and _is_quote_start(text, i)):
+            in_string, quote = True, ch
+        elif ch in "{[":
+            depth += 1
+        elif ch in "}]":
+            depth -= 1
+            if depth == 0:
+                return begin, i + 1
+    return begin, None
+
+
+def _is_quote_start(text: str, i: int) -> bool:
+    """单引号是否像字符串起点（前一个非空白字符为 { [ , :），避免把英文缩写当作引号"""
+    j = i - 1
+    while j >= 0 and text[j] in " \t\r\n":
+        j -= 1
+    return j >= 0 and text[j] in "{[,:"
+
+
+def decision_block_complete(text: str) -> bool:
+    """流式读取时判断决策JSON对象是否已闭合（跳过正文中碰巧平衡的花括号）"""
+    position = 0
+    while True:
+        begin, end = scan_json_object(text, position)
+        if begin is None or end is None:
+            return False
+        try:
+            data = json.loads(repair_json(text[begin:end]))
+        except json.JSONDecodeError:
+            data = None
+        if isinstance(data, dict) and "decision" in data:
+            return True
+        position = end
+
+
+# ============== 修复 ==============
+
+def repair_json(candidate: str) -> str:
+    """修复常见LLM JSON错误：智能引号、注释、尾逗号、单引号、未加引号的键、Python字面量、截断"""
+    fixed = candidate.translate(_SMART_QUOTES)
+    fixed = _replace_single_quotes(fixed)
+    fixed = _close_truncated(fixed)
+    return _outside_strings(fixed, _fix_structure)
+
+
+def _fix_structure(segment: str) -> str:
+    """只作用于字符串之外的结构部分（尾逗号与其后的右括号总在同一片段内）"""
+    segment = _LINE_COMMENT.sub("", segment)
+    segment = _UNQUOTED_KEY.sub(r'\1"\2"\3', segment)
+    segment = _PY_LITERALS.sub(lambda m: {"True": "true", "False": "false", "None": "null"}[m.group(1)], segment)
+    return _TRAILING_COMMA.sub(r"\1", segment)
+
+
+def _outside_strings(text: str, fn) -> str:
+    """对双引号字符串之外的片段应用 fn"""
+    parts: List[str] = []
+    position = 0
+    for match in _STRING.finditer(text):
+        parts.append(fn(text[position:match.start()]))
+        parts.append(match.group())
+        position = match.end()
+    parts.append(fn(text[position:]))
+    return "".join(parts)
+
+
+def _replace_single_quotes(text: str) -> str:
+    """把单引号字符串改写为双引号字符串（双引号字符串内容保持不变）"""
+    if "'" not in text:
+        return text
+    out: List[str] = []
+    in_string = False
+    quote = ""
+    escaped = False
+    for i, ch in enumerate(text):
+        if in_string:
+            if escaped:
+                escaped = False
+                out.append(ch)
+            elif ch == "\\":
+                escaped = True
+                out.append(ch)
+            elif ch == quote:
+                in_string = False
+                out.append('"')
+            elif ch == '"' and quote == "'":
+                out.append('\\"')
+            else:
+                out.append(ch)
+        elif ch == '"' or (ch == "'" and _is_quote_start(text, i)):
+            in_string, quote = True, ch
+            out.append('"')
+        else:
+            out.append(ch)
+    return "".join(out)
+
+
+def _close_truncated(text: str) -> str:
+    """为被截断的输出补齐未闭合的字符串和括号"""
+    stack: List[str] = []
+    in_string = False
+    escaped = False
+    for ch in text:
+        if in_string:
+            if escaped:
+                escaped = False
+            elif ch == "\\":
+                escaped = True
+            elif ch == '"':
+                in_string = False
+        elif ch == '"':
+            in_string = True
+        elif ch in "{[":
+            stack.append("}" if ch == "{" else "]")
+        elif ch in "}]" and stack:
+            stack.pop()
+    if not in_string and not stack:
+        return text
+    body = text + ('"' if in_string else "")
+    # 截断在对象的键之后（如 , "risks" 或 , "risks": ）时去掉悬空的键
+    if stack and stack[-1] == "}":
+        body = re.sub(r',\s*"[^"]*"\s*:?\s*$', "", body)
+    body = re.sub(r",\s*$", "", body)
+    return body + "".join(reversed(stack))
+
+
+# ============== 规范化 ==============
+
+def coerce_confidence(value: Any, default: float = 0.5) -> float:
+    """0.85 / "0.85" / "85%" / 85 → 0.85，并限制在 [0, 1]（1.5 之类不像百分数的值截断为 1.0）"""
+    if isinstance(value, bool) or value is None:
+        return default
+    if isinstance(value, str):
+        match = _NUMBER.search(value.replace(",", ""))
+        if not match:
+            return default
+        number = float(match.group())
+        if "%" in value or _looks_like_percent(number):
+            number /= 100
+    elif isinstance(value, (int, float)):
+        number = float(value)
+        if _looks_like_percent(number):
+            number /= 100
+    else:
+        return default
+    return min(1.0, max(0.0, number))
+
+
+def _looks_like_percent(number: float) -> bool:
+    """未带 % 的数值是否表示百分数（1 < x ≤ 100 的整数，如 85）"""
+    return 1 < number <= 100 and number == int(number)
+
+
+def coerce_amount(value: Any, default: int = 0) -> int:
+    """500000 / "¥500,000" / "50万" / "1.2亿" / "500k" → 整数金额"""
+    if isinstance(value, bool) or value is None:
+        return default
+    if isinstance(value, (int, float)):
+        return int(value)
+    if not isinstance(value, str):
+        return default
+    text = value.replace(",", "").replace("，", "").strip()
+    match = _NUMBER.search(text)
+    if not match:
+        return default
+    number = float(match.group())
+    rest = text[match.end():].strip().lower()
+    if rest.startswith("亿"):
+        number *= 100000000
+    elif rest.startswith("万"):
+        number *= 10000
+    elif rest.startswith("k"):
+        number *= 1000
+    elif rest.startswith("m"):
+        number *= 1000000
+    return int(number)
+
+
+def coerce_days(value: Any, default: int = 0) -> int:
+    """30 / "30天" / "2周" / "3个月" / "1年" → 天数"""
+    if isinstance(value, bool) or value is None:
+        return default
+    if isinstance(value, (int, float)):
+        return int(value)
+    if not isinstance(value, str):
+        return default
+    match = _NUMBER.search(value)
+    if not match:
+        return default
+    number = float(match.group())
+    unit = value[match.end():].strip().lower()
+    if unit.startswith(("周", "week")):
+        number *= 7
+    elif unit.startswith(("个月", "月", "month")):
+        number *= 30
+    elif unit.startswith(("年", "year")):
+        number *= 365
+    return int(number)
+
+
+def coerce_decision(data: Dict) -> Dict:
+    """补齐必要字段并规范化数值/列表字段"""
+    decision = dict(data)
+    if not isinstance(decision.get("decision"), str) or not decision.get("decision"):
+        decision["decision"] = str(decision.get("decision") or "未知")
+    decision["confidence"] = coerce_confidence(decision.get("confidence"))
+    if "reasoning" not in decision:
+        decision["reasoning"] = ""
+    if "budget_request" in decision:
+        decision["budget_request"] = coerce_amount(decision["budget_request"])
+    if "timeline_days" in decision:
+        decision["timeline_days"] = coerce_days(decision["timeline_days"])
+    for field in LIST_FIELDS:
+        if field in decision and not isinstance(decision[field], list):
+            value = decision[field]
+            decision[field] = [value] if value not in (None, "") else []
+    return decision
+
+
+# ============== 解析器 ==============
+
+class DecisionParser:
+    """决策提取器"""
+
+    def __init__(self):
+        self.stats = {"parsed": 0, "repaired": 0, "failed": 0}
+
+    def extract(self, text: str) -> Tuple[Optional[Dict], str]:
+        """
+        从模型输出中提取决策
+
+        Returns:
+            (规范化后的决策或None, 状态 "ok" / "repaired" / "failed")
+        """
+        data, status = self._extract_raw(text or "")
+        self.stats[{"ok": "parsed", "repaired": "repaired", "failed": "failed"}[status]] += 1
+        if data is None:
+            return None, status
+        return coerce_decision(data), status
+
+    def _extract_raw(self, text: str) -> Tuple[Optional[Dict], str]:
+        """返回第一个包含 "decision" 的对象（与 decision_block_complete 一致），都没有时返回第一个可解析的对象"""
+        position = 0
+        first_candidate: Optional[str] = None
+        fallback: Optional[Tuple[Dict, str]] = None
+        while True:
+            begin, end = scan_json_object(text, position)
+            if begin is None:
+                break
+            candidate = text[begin:end] if end is not None else text[begin:]
+            if first_candidate is None:
+                first_candidate = candidate
+            parsed = None
+            if end is not None:
+                try:
+                    data = json.loads(candidate)
+                    if isinstance(data, dict):
+                        parsed = (data, "ok")
+                except json.JSONDecodeError:
+                    pass
+            if parsed is None:
+                data = self._try_repair(candidate)
+                if data is not None:
+                    parsed = (data, "repaired")
+            if parsed is not None:
+                if "decision" in parsed[0]:
+                    return parsed
+                fallback = fallback or parsed
+            if end is None:
+                break
+            position = begin + 1
+        if fallback is not None:
+            return fallback
+
+        # 没有花括号：整段可能是缺少外层括号的键值对
+        if first_candidate is None and ":" in text:
+            data = self._try_repair("{" + _strip_fences(text) + "}")
+            if data is not None:
+                return data, "repaired"
+        return None, "failed"
+
+    @staticmethod
+    def _try_repair(candidate: str) -> Optional[Dict]:
+        try:
+            data = json.loads(repair_json(candidate))
+        except json.JSONDecodeError:
+            return None
+        return data if isinstance(data, dict) else None
+
+    def get_stats(self) -> Dict:
+        """解析统计"""
+        total = sum(self.stats.values())
+        return {**self.stats, "success_rate": (total - self.stats["failed"]) / total if total else 0.0}
+
+
+def _strip_fences(text: str) -> str:
+    return re.sub(r"```[a-zA-Z]*", "", text).strip()
+
+
+# ============== 全局单例 ==============
+
+_parser: Optional[DecisionParser] = None
+
+
+def get_decision_parser() -> DecisionParser:
+    """获取进程级决策提取器"""
+    global _parser
+    if _parser is None:
+        _parser = DecisionParser()
+    return _parser
+
+
+def parse_decision(text: str) -> Tuple[Optional[Dict], str]:
+    """便捷函数：使用全局提取器解析"""
+    return get_decision_parser().extract(text)
+
+
+# ============== 基准测试 ==============
+
+# 典型的模型输出样本（正常 / 正文夹杂 / 常见格式错误 / 截断）
+SAMPLE_RESPONSES = [
+    '```json\n{"decision": "批准", "confidence": 0.85, "reasoning": "市场空间大", "budget_request": 500000, "timeline_days": 30}\n```',
+    '经过分析，我的决策如下：\n```json\n{"decision": "批准", "confidence": "85%", "reasoning": "可行", "risks": ["竞争激烈"]}\n```\n以上。',
+    '我的结论是 {"decision": "拒绝", "confidence": 0.4, "reasoning": "成本过高"} 请参考。',
+    '```json\n{"decision": "批准", "confidence": 0.8, "reasoning": "ok", "risks": ["a", "b",],}\n```',
+    "```json\n{'decision': '需要更多信息', 'confidence': 0.6, 'reasoning': '数据不足'}\n```",
+    '```json\n{decision: "批准", confidence: 0.9, reasoning: "强烈推荐", budget_request: "50万", timeline_days: "2周"}\n```',
+    '```json\n{“decision”: “批准”, “confidence”: 0.7, “reasoning”: “中等风险”}\n```',
+    '```json\n{\n  // 总体判断\n  "decision": "批准",\n  "confidence": 0.75,\n  "reasoning": "团队可以交付",\n  "approved": True\n}\n```',
+    '```json\n{"decision": "批准", "confidence": 0.82, "reasoning": "预算 {约50万} 可控", "action_items": ["组建团队", "启动MVP"',
+    '```\n{"decision": "批准", "confidence": 0.9, "reasoning": "包含 ``` 代码块的说明"}\n```',
+    'decision: "批准",\nconfidence: 0.7,\nreasoning: "无外层括号"',
+    '抱歉，我无法给出JSON格式的决策，需要更多信息。',
+]
+
+
+def legacy_parse(response: str) -> Optional[Dict]:
+    """原 split + json.loads 解析方式（用于对比）"""
+    try:
+        if "```json" in response:
+            json_str = response.split("```json")[1].split("```")[0].strip()
+        elif "```" in response:
+            json_str = response.split("```")[1].strip()
+        else:
+            json_str = response
+        data = json.loads(json_str)
+        return data if isinstance(data, dict) else None
+    except (json.JSONDecodeError, IndexError):
+        return None
+
+
+def run_benchmark(corpus: List[str], rounds: int = 200):
+    """对比原解析方式与新提取器的成功率和耗时"""
+    parser = DecisionParser()
+
+    started = time.perf_counter()
+    for _ in range(rounds):
+        legacy_ok = sum(1 for text in corpus if legacy_parse(text) is not None)
+    legacy_ms = (time.perf_counter() - started) * 1000 / (rounds * len(corpus))
+
+    started = time.perf_counter()
+    for _ in range(rounds):
+        new_ok = sum(1 for text in corpus if parser.extract(text)[0] is not None)
+    new_ms = (time.perf_counter() - started) * 1000 / (rounds * len(corpus))
+
+    print(f"样本数: {len(corpus)}")
+    print(f"原解析:   成功 {legacy_ok}/{len(corpus)} | 平均 {legacy_ms:.3f} ms")
+    print(f"新提取器: 成功 {new_ok}/{len(corpus)} | 平均 {new_ms:.3f} ms")
+    print(f"每个样本的状态:")
+    for text in corpus:
+        _, status = DecisionParser().extract(text)
+        print(f"   [{status:8}] {text[:50]!r}")
+
+
+def load_corpus(path: str) -> List[str]:
+    """读取录制的响应（JSONL，每行含 raw_response 或 response 字段）"""
+    corpus = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            record = json.loads(line)
+            text = record.get("raw_response") or record.get("response") if isinstance(record, dict) else record
+            if isinstance(text, str):
+                corpus.append(text)
+    return corpus
+
+
+if __name__ == "__main__":
+    # 用法: python3 decision_parser.py [recorded_responses.jsonl]
+    run_benchmark(load_corpus(sys.argv[1]) if len(sys.argv) > 1 else SAMPLE_RESPONSES)
@@ -0,0 +1,248 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Event Bus - 按事件类型/标签索引的异步事件总线
+每个订阅者一个 asyncio 队列和一个消费协程，事件发出后立即投递给匹配的订阅者，
+不再每天扫描全部事件；处理函数正常返回即确认(ack)，抛出异常则重新投递，
+超过最大投递次数进入死信。总线只保留最近 retention 条事件
+
+    bus = EventBus()
+    bus.subscribe("diagnosis", on_mission_failed, event_types=["mission_failed"])
+    bus.subscribe("monitor", log_event)                  # 不指定类型和标签即订阅全部
+    bus.start()                                          # 在事件循环中启动消费协程
+    bus.publish(event)                                   # 同步调用，可在任意位置发出
+    await bus.drain()                                    # 等待已发出事件全部确认
+    await bus.close()
+
+    NEXUS_EVENT_RETENTION=10000 NEXUS_EVENT_MAX_DELIVERIES=3
+"""
+
+import os
+import asyncio
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Iterable, List, Optional, Set
+from dataclasses import dataclass, field
+
+
+@dataclass
+class BusConfig:
+    """事件总线配置"""
+    retention: int = 10000      # 保留的最近事件条数
+    max_deliveries: int = 3     # 单个订阅者对同一事件的最大投递次数
+    dead_letters: int = 1000    # 保留的死信条数
+
+    @classmethod
+    def from_env(cls) -> "BusConfig":
+        """从环境变量读取配置"""
+        return cls(
+            retention=int(os.getenv("NEXUS_EVENT_RETENTION", "10000")),
+            max_deliveries=int(os.getenv("NEXUS_EVENT_MAX_DELIVERIES", "3")),
+            dead_letters=int(os.getenv("NEXUS_EVENT_DEAD_LETTERS", "1000"))
+        )
+
+
+@dataclass
+class Delivery:
+    """一次投递（事件 + 已投递次数）"""
+    event: Any
+    attempts: int = 0
+
+
+@dataclass
+class Subscription:
+    """订阅者：event_types 与 tags 均为空时订阅全部事件，同时指定时两者都需命中"""
+    name: str
+    handler: Callable[[Any], Awaitable[None]]
+    event_types: Optional[Set[str]] = None
+    tags: Optional[Set[str]] = None
+    queue: "asyncio.Queue[Delivery]" = field(default_factory=asyncio.Queue)
+    pending: int = 0    # 尚未确认（含重新排队）的投递数
+    stats: Dict[str, int] = field(default_factory=lambda: {
+        "delivered": 0,
+        "acked": 0,
+        "redelivered": 0,
+        "dead_lettered": 0
+    })
+
+    def matches(self, event) -> bool:
+        if self.event_types is not None and event.event_type not in self.event_types:
+            return False
+        if self.tags is not None and self.tags.isdisjoint(event.tags or ()):
+            return False
+        return True
+
+
+class EventBus:
+    """异步事件总线（事件需有 event_type 与 tags 属性）"""
+
+    def __init__(self, config: BusConfig = None):
+        self.config = config or BusConfig.from_env()
+        self.subscriptions: Dict[str, Subscription] = {}
+        self.history: Deque[Any] = deque(maxlen=self.config.retention)
+        self.dead_letters: Deque[Dict] = deque(maxlen=self.config.dead_letters)
+        self._by_type: Dict[str, List[Subscription]] = {}
+        self._by_tag: Dict[str, List[Subscription]] = {}
+        self._wildcard: List[Subscription] = []
+        self._workers: Dict[str, asyncio.Task] = {}
+        self.published = 0
+        self.unrouted = 0
+
+    def __len__(self) -> int:
+        """累计发出的事件数"""
+        return self.published
+
+    # ============== 订阅 ==============
+
+    def subscribe(self, name: str, handler: Callable[[Any], Awaitable[None]],
+                  event_types: Iterable[str] = None, tags: Iterable[str] = None) -> Subscription:
+        """
+        注册订阅者
+
+        Args:
+            name: 订阅者名称（唯一）
+            handler: 处理函数 async handler(event)，正常返回即确认
+            event_types: 订阅的事件类型
+            tags: 订阅的标签（事件带有任一标签即命中）
+        """
+        if name in self.subscriptions:
+            raise ValueError(f"订阅者已存在: {name}")
+        subscription = Subscription(
+            name=name,
+            handler=handler,
+            event_types=set(event_types) if event_types else None,
+            tags=set(tags) if tags else None
+        )
+        self.subscriptions[name] = subscription
+        self._index(subscription)
+
+        if self._workers:
+            self._start_worker(subscription)
+        return subscription
+
+    def resubscribe(self, name: str, event_types: Iterable[str] = None, tags: Iterable[str] = None) -> Subscription:
+        """修改订阅者的事件类型/标签过滤（队列与统计保留，之后发出的事件按新条件投递）"""
+        subscription = self.subscriptions[name]
+        self._unindex(subscription)
+        subscription.event_types = set(event_types) if event_types else None
+        subscription.tags = set(tags) if tags else None
+        self._index(subscription)
+        return subscription
+
+    def _index(self, subscription: Subscription):
+        # 按最具选择性的条件建立索引，其余条件在投递时校验
+        if subscription.event_types is not None:
+            for event_type in subscription.event_types:
+                self._by_type.setdefault(event_type, []).append(subscription)
+        elif subscription.tags is not None:
+            for tag in subscription.tags:
+                self._by_tag.setdefault(tag, []).append(subscription)
+        else:
+            self._wildcard.append(subscription)
+
+    def _unindex(self, subscription: Subscription):
+        for index in (self._by_type, self._by_tag):
+            for subscribers in index.values():
+                if subscription in subscribers:
+                    subscribers.remove(subscription)
+        if subscription in self._wildcard:
+            self._wildcard.remove(subscription)
+
+    # ============== 发布 ==============
+
+    def publish(self, event) -> int:
+        """发出事件，投递到所有匹配订阅者的队列，返回命中的订阅者数"""
+        self.history.append(event)
+        self.published += 1
+
+        targets: Dict[str, Subscription] = {}
+        for subscription in self._by_type.get(event.event_type, ()):
+            targets[subscription.name] = subscription
+        for tag in event.tags or ():
+            for subscription in self._by_tag.get(tag, ()):
+                targets[subscription.name] = subscription
+        for subscription in self._wildcard:
+            targets[subscription.name] = subscription
+
+        routed = 0
+        for subscription in targets.values():
+            if subscription.matches(event):
+                subscription.pending += 1
+                subscription.queue.put_nowait(Delivery(event))
+                routed += 1
+        if not routed:
+            self.unrouted += 1
+        return routed
+
+    # ============== 消费 ==============
+
+    def start(self):
+        """在当前事件循环中启动所有订阅者的消费协程（启动前发出的事件会在启动后投递）"""
+        for subscription in self.subscriptions.values():
+            if subscription.name not in self._workers:
+                self._start_worker(subscription)
+
+    def _start_worker(self, subscription: Subscription):
+        self._workers[subscription.name] = asyncio.ensure_future(self._consume(subscription))
+
+    async def _consume(self, subscription: Subscription):
+        while True:
+            delivery = await subscription.queue.get()
+            delivery.attempts += 1
+            subscription.stats["delivered"] += 1
+            try:
+                await subscription.handler(delivery.event)
+            except asyncio.CancelledError:
+                subscription.pending -= 1
+                subscription.queue.task_done()
+                raise
+            except Exception as e:
+                if delivery.attempts < self.config.max_deliveries:
+                    # 至少一次：重新排队，稍后再次投递
+                    subscription.stats["redelivered"] += 1
+                    subscription.pending += 1
+                    subscription.queue.put_nowait(delivery)
+                else:
+                    subscription.stats["dead_lettered"] += 1
+                    self.dead_letters.append({
+                        "subscriber": subscription.name,
+                        "event": delivery.event,
+                        "attempts": delivery.attempts,
+                        "error": str(e)
+                    })
+            else:
+                subscription.stats["acked"] += 1
+            subscription.pending -= 1
+            subscription.queue.task_done()
+
+    async def drain(self):
+        """等待已发出的事件全部被确认或进入死信（处理中发出的新事件也会等待）"""
+        if not self._workers:
+            return
+        while self.backlog():
+            await asyncio.gather(*(s.queue.join() for s in self.subscriptions.values()))
+
+    async def close(self):
+        """处理完积压事件后停止消费协程"""
+        await self.drain()
+        workers = list(self._workers.values())
+        self._workers.clear()
+        for worker in workers:
+            worker.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+
+    # ============== Stats ==============
+
+    def backlog(self) -> int:
+        """尚未确认的投递数"""
+        return sum(s.pending for s in self.subscriptions.values())
+
+    def get_stats(self) -> Dict:
+        """总线统计"""
+        return {
+            "published": self.published,
+            "retained": len(self.history),
+            "unrouted": self.unrouted,
+            "backlog": self.backlog(),
+            "dead_letters": len(self.dead_letters),
+            "subscribers": {name: dict(s.stats) for name, s in self.subscriptions.items()}
+        }
@@ -9,14 +9,27 @@
 import os
 import asyncio
 import random
-from datetime import datetime, timedelta
+from datetime import datetime
 from typing import Dict, List, Optional, Any
 from dataclasses import dataclass, field
 from enum import Enum
 
 # 导入基础组件
 from advanced_company_v3 import AdvancedCompanySystem, Project, ProjectPhase
-from kimi_coding_runner import KimiCodingRunner, KimiCodingConfig
+from kimi_coding_runner import KimiCodingConfig
+from agent_client import AgentRoster
+from http_pool import close_pool
+from llm_cache import get_response_cache
+from single_flight import get_single_flight
+from telemetry import get_telemetry
+from scheduler import get_scheduler
+from model_routing import ModelRoutingTable, tier_models_from_env
+from mission_executor import get_mission_executor
+from quota import QuotaGates
+from event_bus import EventBus
+from state_store import StateStore, StateTable, from_record
+from state_log import StateLog
+from deadline_timer import DeadlineTimer, DeadlineExceeded
 
 
 class ProposalStatus(Enum):
@@ -35,6 +48,7 @@ class StepStatus(Enum):
     RUNNING = "running"
     SUCCEEDED = "succeeded"
     FAILED = "failed"
+    CANCELLED = "cancelled"  # 前置步骤失败，未执行
 
 
 @dataclass
@@ -63,6 +77,7 @@ class MissionStep:
     started_at: Optional[datetime] = None
     completed_at: Optional[datetime] = None
     error: Optional[str] = None
+    depends_on: List[str] = field(default_factory=list)  # 前置步骤ID
 
 
 @dataclass
@@ -86,7 +101,6 @@ class AgentEvent:
     tags: List[str]
     payload: Dict
     created_at: datetime
-    processed: bool = False
 
 
 class FullCompanySystem(AdvancedCompanySystem):
@@ -98,18 +112,56 @@ class FullCompanySystem(AdvancedCompanySystem):
     def __init__(self, company_name: str = "Nexus AI"):
         super().__init__(company_name)
         
-        # 核心状态存储
-        self.proposals: Dict[str, Proposal] = {}
-        self.missions: Dict[str, Mission] = {}
-        self.steps: Dict[str, MissionStep] = {}
-        self.events: List[AgentEvent] = []
+        # 核心状态存储（NEXUS_STATE_DB 设置时持久化到SQLite）
+        self.store = StateStore()
+        self.proposals: StateTable = self.store.table(
+            "proposals", lambda r: from_record(Proposal, r),
+            is_live=lambda p: p.status in (ProposalStatus.PENDING, ProposalStatus.APPROVED, ProposalStatus.EXECUTING)
+        )
+        self.steps: StateTable = self.store.table(
+            "steps", lambda r: from_record(MissionStep, r),
+            is_live=lambda s: s.status in (StepStatus.QUEUED, StepStatus.RUNNING)
+        )
+        self.missions: StateTable = self.store.table(
+            "missions", lambda r: from_record(Mission, r, {"steps": lambda ids: [self.steps[i] for i in ids if i in self.steps]}),
+            is_live=lambda m: m.status == "running"
+        )
+        # 恢复上次运行未结束的记录，历史记录按需加载
+        self.proposals.load_live(status=["pending", "approved", "executing"])
+        self.steps.load_live(status=["queued", "running"])
+        self.missions.load_live(status="running")
+        
+        # 事件溯源状态日志（NEXUS_STATE_LOG 设置时启用）：从最新快照 + 其后的记录恢复，不重跑模拟
+        self.days_completed = 0
+        self.state_log = StateLog()
+        self.state_log.tables = {"proposals": self.proposals, "missions": self.missions, "steps": self.steps}
+        self.state_log.capture = self._capture_state
+        if self.state_log.recover(self._restore_state, self._apply_state_record):
+            print(f"♻️  状态已恢复: 第 {self.days_completed} 天 | 重放 {self.state_log.stats['replayed']} 条记录")
+        self._logged_financials = dict(self.financials)
+        self.store.observe(self.state_log.record)
+        self.event_bus = EventBus()
+        self.event_bus.subscribe("event_log", self._log_event)
+        self.events_by_type: Dict[str, int] = {}
+        self._events_reported = 0
         
         # 策略配置
-        self.policies = self._init_policies()
+        self.policies = self.store.load_policies(self._init_policies(), keys=("auto_approve", "cap_gates", "step_timeouts"))
+        self.model_routes = ModelRoutingTable.from_policy(self.policies["model_routing"])
+        self.quotas = QuotaGates(self.policies["cap_gates"])
+        
+        # 步骤超时监控：开始执行时登记截止时间，上次运行遗留的 RUNNING 步骤按原开始时间登记
+        self.deadlines = DeadlineTimer()
+        self._stale_reported = 0
+        for step in list(self.steps.memory.values()):
+            if step.status == StepStatus.RUNNING:
+                self.deadlines.schedule(step.id, self._step_deadline(step), lambda step=step: self._recover_stale_step(step))
         
         # Agent API配置
         self.agent_apis: Dict[str, KimiCodingConfig] = {}
         self._init_agent_apis()
+        # 长期Agent客户端（随完整模拟启动时打开并预连接）
+        self.roster = AgentRoster(self.agent_apis, models=self.model_routes)
         
         # 统计
         self.loop_stats = {
@@ -140,7 +192,34 @@ class FullCompanySystem(AdvancedCompanySystem):
                 "backend_setup": {"limit": 2, "window": "daily"},
                 "customer_support": {"limit": 10, "window": "daily"},
                 "team_recruitment": {"limit": 3, "window": "daily"},
-            }
+            },
+            # 步骤超时（秒），超时的步骤按失败处理并发出 step_stale 事件
+            "step_timeouts": {
+                "default": 1800,
+                "backend_setup": 3600,
+                "final_approval": 3600
+            },
+            "model_routing": self._init_model_routing()
+        }
+    
+    def _init_model_routing(self) -> Dict:
+        """模型路由表：例行步骤走快速小模型，阻塞决策走大模型，小模型低置信度时升级"""
+        models = tier_models_from_env()
+        return {
+            "tiers": {
+                "fast": {"model": models["fast"], "max_tokens": 1200, "temperature": 0.3},
+                "standard": {"model": models["standard"], "max_tokens": 2500, "temperature": 0.5},
+                "large": {"model": models["large"], "max_tokens": 4000, "temperature": 0.7},
+            },
+            # 按顺序匹配，priority 为调度优先级类别（按 step_kind 映射，见 scheduler）
+            "rules": [
+                {"priority": "CRITICAL", "tier": "large"},
+                {"agent": "ceo", "tier": "large"},
+                {"priority": "LOW", "tier": "fast"},
+                {"step_kind": ["skill_assessment", "team_planning", "recruitment"], "tier": "fast"},
+            ],
+            "default_tier": "standard",
+            "escalation": {"enabled": True, "confidence_below": 0.6, "to": "large"}
         }
     
     def _init_agent_apis(self):
@@ -187,26 +266,26 @@ class FullCompanySystem(AdvancedCompanySystem):
         """创建提案（统一入口）"""
         proposal_id = f"prop_{datetime.now().strftime('%Y%m%d%H%M%S')}_{random.randint(1000,9999)}"
         
-        # Cap Gates检查
-        for step_kind in step_kinds:
-            gate_result = self._check_cap_gate(step_kind)
-            if not gate_result["ok"]:
-                proposal = Proposal(
-                    id=proposal_id,
-                    title=title,
-                    description=description,
-                    proposed_by=proposed_by,
-                    status=ProposalStatus.REJECTED,
-                    created_at=datetime.now(),
-                    rejected_reason=gate_result["reason"]
-                )
-                self.proposals[proposal_id] = proposal
-                self.loop_stats["proposals_rejected"] += 1
-                self._emit_event(proposed_by, "proposal_rejected", 
-                                ["proposal", "rejected"],
-                                {"proposal_id": proposal_id, "reason": gate_result["reason"]})
-                print(f"   ❌ Rejected: {gate_result['reason']}")
-                return proposal
+        # Cap Gates检查（通过时为各步骤预留名额）
+        admitted, gate_results = self.quotas.admit(step_kinds)
+        if not admitted:
+            gate_result = list(gate_results.values())[-1]
+            proposal = Proposal(
+                id=proposal_id,
+                title=title,
+                description=description,
+                proposed_by=proposed_by,
+                status=ProposalStatus.REJECTED,
+                created_at=datetime.now(),
+                rejected_reason=gate_result["reason"]
+            )
+            self.proposals[proposal_id] = proposal
+            self.loop_stats["proposals_rejected"] += 1
+            self._emit_event(proposed_by, "proposal_rejected", 
+                            ["proposal", "rejected"],
+                            {"proposal_id": proposal_id, "reason": gate_result["reason"]})
+            print(f"   ❌ Rejected: {gate_result['reason']}")
+            return proposal
         
         # 创建提案
         proposal = Proposal(
@@ -225,27 +304,15 @@ class FullCompanySystem(AdvancedCompanySystem):
         # 自动审批
         await self._evaluate_auto_approve(proposal, step_kinds, context)
         
+        # 未获批的提案不执行步骤，归还预留名额
+        if not proposal.mission_id:
+            self.quotas.release(step_kinds)
+        
         return proposal
     
     def _check_cap_gate(self, step_kind: str) -> Dict:
-        """Cap Gates检查"""
-        gate_config = self.policies["cap_gates"].get(step_kind)
-        if not gate_config:
-            return {"ok": True}
-        
-        limit = gate_config["limit"]
-        window_start = datetime.now() - timedelta(days=1 if gate_config["window"] == "daily" else 1)
-        
-        count = sum(
-            1 for step in self.steps.values()
-            if step.step_kind == step_kind 
-            and step.started_at and step.started_at > window_start
-        )
-        
-        if count >= limit:
-            return {"ok": False, "reason": f"{step_kind} quota full ({count}/{limit})"}
-        
-        return {"ok": True}
+        """Cap Gates检查（窗口计数 + 已预留名额，O(1)）"""
+        return self.quotas.check(step_kind)
     
     async def _evaluate_auto_approve(self, proposal: Proposal, step_kinds: List[str], context: Dict):
         """自动审批评估"""
@@ -274,12 +341,15 @@ class FullCompanySystem(AdvancedCompanySystem):
         
         steps = []
         for i, step_kind in enumerate(step_kinds):
+            # 只依赖本任务中排在前面的步骤，保证无环
+            prerequisites = self._get_step_dependencies(step_kind)
             step = MissionStep(
                 id=f"step_{mission_id}_{i}",
                 mission_id=mission_id,
                 step_kind=step_kind,
                 status=StepStatus.QUEUED,
-                assigned_to=self._get_step_agent(step_kind)
+                assigned_to=self._get_step_agent(step_kind),
+                depends_on=[s.id for s in steps if s.step_kind in prerequisites]
             )
             steps.append(step)
             self.steps[step.id] = step
@@ -294,6 +364,7 @@ class FullCompanySystem(AdvancedCompanySystem):
         self.missions[mission_id] = mission
         proposal.mission_id = mission_id
         proposal.status = ProposalStatus.EXECUTING
+        self.proposals.save(proposal)
         
         print(f"   🚀 Mission: {len(steps)} steps")
         
@@ -342,34 +413,116 @@ class FullCompanySystem(AdvancedCompanySystem):
         }
         return mapping.get(step_kind, "ceo")
     
-    async def _execute_mission(self, mission: Mission):
-        """执行任务"""
-        for step in mission.steps:
-            if step.status != StepStatus.QUEUED:
-                continue
+    def _get_step_dependencies(self, step_kind: str) -> List[str]:
+        """步骤的前置步骤类型（同一任务中存在时才生效），其余步骤互相独立、并行执行"""
+        mapping = {
+            # 营销：分析 → 策略 → 获客
+            "marketing_strategy": ["market_analysis"],
+            "customer_acquisition": ["marketing_strategy"],
             
-            step.status = StepStatus.RUNNING
-            step.started_at = datetime.now()
+            # 客户维护
+            "customer_retention": ["customer_support"],
+            
+            # 设计
+            "ui_design": ["ux_design"],
             
-            print(f"   ⚙️  {step.step_kind:20} → {step.assigned_to.upper()}")
+            # 收费：成本 → 定价 → 收入模型
+            "pricing_analysis": ["cost_estimation"],
+            "revenue_model": ["pricing_analysis"],
             
-            result = await self._execute_step(step)
+            # 后端：架构 → API/基础设施 → 安全审查
+            "api_design": ["backend_architecture"],
+            "infrastructure": ["backend_architecture"],
+            "security_review": ["api_design", "infrastructure"],
             
-            if result["success"]:
-                step.status = StepStatus.SUCCEEDED
-                step.result = result
-                print(f"   ✅ Succeeded")
-                self.loop_stats["agent_calls"][step.assigned_to] += 1
-            else:
-                step.status = StepStatus.FAILED
-                step.error = result.get("error")
-                print(f"   ❌ Failed: {result.get('error', 'Unknown')}")
-                await self._handle_step_failure(mission, step)
+            # 团队：评估 → 规划 → 招聘
+            "team_planning": ["skill_assessment"],
+            "recruitment": ["team_planning"],
             
-            step.completed_at = datetime.now()
+            # 决策与诊断
+            "final_approval": ["strategic_decision"],
+            "recovery_plan": ["diagnosis"],
+        }
+        return mapping.get(step_kind, [])
+    
+    async def _execute_mission(self, mission: Mission):
+        """执行任务（依赖已满足的步骤并行执行，失败步骤的后续步骤直接取消）"""
+        await get_mission_executor().run(
+            mission.steps,
+            run_step=self._run_mission_step,
+            on_failed=lambda step: self._handle_step_failure(mission, step),
+            on_cancelled=self._cancel_step,
+            completed={s.id: s.status == StepStatus.SUCCEEDED for s in mission.steps if s.status != StepStatus.QUEUED}
+        )
         
         await self._finalize_mission(mission)
     
+    async def _run_mission_step(self, step: MissionStep) -> bool:
+        """执行一个步骤并记录状态"""
+        step.status = StepStatus.RUNNING
+        step.started_at = datetime.now()
+        self.quotas.consume(step.step_kind, step.started_at.timestamp())
+        self.steps.save(step)
+        
+        print(f"   ⚙️  {step.step_kind:20} → {step.assigned_to.upper()}")
+        
+        try:
+            result = await self.deadlines.guard(step.id, self._execute_step(step), self._step_deadline(step))
+        except DeadlineExceeded:
+            result = {"success": False, "error": self._stale_error(step)}
+            self._emit_stale_event(step)
+        
+        if result["success"]:
+            step.status = StepStatus.SUCCEEDED
+            step.result = result
+            print(f"   ✅ Succeeded: {step.step_kind}")
+            self.loop_stats["agent_calls"][step.assigned_to] += 1
+        else:
+            step.status = StepStatus.FAILED
+            step.error = result.get("error")
+            print(f"   ❌ Failed: {step.step_kind}: {result.get('error', 'Unknown')}")
+        
+        step.completed_at = datetime.now()
+        self.steps.save(step)
+        return result["success"]
+    
+    def _step_deadline(self, step: MissionStep) -> float:
+        """步骤截止时间（开始时间 + 该步骤类型的超时）"""
+        timeouts = self.policies["step_timeouts"]
+        started_at = step.started_at or datetime.now()
+        return started_at.timestamp() + timeouts.get(step.step_kind, timeouts["default"])
+    
+    def _stale_error(self, step: MissionStep) -> str:
+        timeouts = self.policies["step_timeouts"]
+        return f"Stale: timeout after {timeouts.get(step.step_kind, timeouts['default'])}s"
+    
+    def _emit_stale_event(self, step: MissionStep):
+        self._emit_event("system", "step_stale",
+                        ["step", "stale", step.step_kind],
+                        {"step_id": step.id, "mission_id": step.mission_id, "step_kind": step.step_kind})
+    
+    async def _recover_stale_step(self, step: MissionStep):
+        """上次运行遗留的步骤超时：没有执行中的调用可取消，直接标记失败并结束任务"""
+        if step.status != StepStatus.RUNNING:
+            return
+        step.status = StepStatus.FAILED
+        step.error = self._stale_error(step)
+        step.completed_at = datetime.now()
+        self.steps.save(step)
+        self._emit_stale_event(step)
+        mission = self.missions.get(step.mission_id)
+        if mission and mission.status == "running":
+            await self._finalize_mission(mission)
+    
+    def _cancel_step(self, step: MissionStep, failed: Optional[MissionStep]):
+        """前置步骤失败，取消步骤"""
+        step.status = StepStatus.CANCELLED
+        step.error = f"依赖步骤失败: {failed.step_kind}" if failed else "依赖无法满足"
+        step.completed_at = datetime.now()
+        self.steps.save(step)
+        self.quotas.release(step.step_kind)
+        print(f"   ⏭️  Cancelled: {step.step_kind}")
+    
     async def _execute_step(self, step: MissionStep) -> Dict:
         """执行单个步骤"""
         config = self.agent_apis.get(step.assigned_to)
@@ -378,13 +531,19 @@ class FullCompanySystem(AdvancedCompanySystem):
             await asyncio.sleep(0.3)
             return {"success": True, "mode": "simulated", "agent": step.assigned_to}
         
+        async def call(tier: str) -> Dict:
+            runner = self.roster.client(step.assigned_to, step.step_kind, tier)
+            # step_id 不参与缓存Key，相同步骤类型的请求可命中响应缓存
+            return await runner.think(
+                task=f"执行{step.step_kind}任务",
+                context={"step_id": step.id, "step_kind": step.step_kind},
+                cache_exclude=["step_id"]
+            )
+        
         try:
-            async with KimiCodingRunner(config) as runner:
-                result = await runner.think(
-                    task=f"执行{step.step_kind}任务",
-                    context={"step_id": step.id, "step_kind": step.step_kind}
-                )
-                return {"success": True, "result": result, "agent": step.assigned_to}
+            tier = self.model_routes.resolve(step.step_kind, step.assigned_to)
+            result = await self.model_routes.think(call, tier, config)
+            return {"success": True, "result": result, "agent": step.assigned_to}
         except Exception as e:
             return {"success": False, "error": str(e), "agent": step.assigned_to}
     
@@ -403,7 +562,7 @@ class FullCompanySystem(AdvancedCompanySystem):
     async def _finalize_mission(self, mission: Mission):
         """完成任务"""
         all_succeeded = all(s.status == StepStatus.SUCCEEDED for s in mission.steps)
-        any_failed = any(s.status == StepStatus.FAILED for s in mission.steps)
+        any_failed = any(s.status in (StepStatus.FAILED, StepStatus.CANCELLED) for s in mission.steps)
         
         if any_failed:
             mission.status = "failed"
@@ -415,10 +574,12 @@ class FullCompanySystem(AdvancedCompanySystem):
             return
         
         mission.completed_at = datetime.now()
+        self.missions.save(mission)
         
         proposal = self.proposals.get(mission.proposal_id)
         if proposal:
             proposal.status = ProposalStatus.COMPLETED if all_succeeded else ProposalStatus.FAILED
+            self.proposals.save(proposal)
         
         print(f"   📋 Mission {mission.status.upper()}")
         
@@ -436,9 +597,42 @@ class FullCompanySystem(AdvancedCompanySystem):
             payload=payload,
             created_at=datetime.now()
         )
-        self.events.append(event)
+        self.event_bus.publish(event)
+        self.store.append_event(event)
         self.loop_stats["events_emitted"] += 1
     
+    async def _log_event(self, event: AgentEvent):
+        """事件日志订阅者（订阅全部事件）"""
+        self.events_by_type[event.event_type] = self.events_by_type.get(event.event_type, 0) + 1
+    
+    # ============== State Log ==============
+    
+    def _capture_state(self) -> Dict:
+        """快照中表以外的状态"""
+        return {"financials": self.financials, "days_completed": self.days_completed}
+    
+    def _restore_state(self, state: Dict):
+        """恢复快照中表以外的状态"""
+        self.financials.update(state.get("financials", {}))
+        self.days_completed = state.get("days_completed", 0)
+    
+    def _apply_state_record(self, op: str, data: Dict):
+        """重放表以外的状态记录"""
+        if op == "financial_delta":
+            for key, delta in data.items():
+                self.financials[key] = self.financials.get(key, 0) + delta
+        elif op == "day_completed":
+            self.days_completed = data["day"]
+    
+    def _complete_day(self, day: int):
+        """记录当天的财务变动和完成的一天"""
+        delta = StateLog.financial_delta(self._logged_financials, self.financials)
+        if delta:
+            self.state_log.append("financial_delta", delta)
+        self._logged_financials = dict(self.financials)
+        self.days_completed = day
+        self.state_log.append("day_completed", {"day": day})
+    
     # ============== 复杂项目场景 ==============
     
     async def run_full_simulation(self, days: int = 3):
@@ -450,40 +644,59 @@ class FullCompanySystem(AdvancedCompanySystem):
         print("   包含: 营销 + 客户维护 + 设计 + 收费 + 后端 + 团队")
         print()
         
-        for day in range(1, days + 1):
-            self.metrics["day"] = day
-            
-            print(f"\n📅 Day {day}")
-            print("-" * 70)
-            
-            # 1. CMO市场分析
-            await self._phase_marketing(day)
-            
-            # 2. CPO设计阶段
-            await self._phase_design(day)
-            
-            # 3. CTO后端架构
-            await self._phase_backend(day)
-            
-            # 4. CFO收费模型
-            await self._phase_pricing(day)
-            
-            # 5. COO客户维护
-            await self._phase_customer_support(day)
-            
-            # 6. CHRO团队组建
-            await self._phase_team_building(day)
-            
-            # 7. CEO最终决策
-            await self._phase_strategic_decision(day)
-            
-            # 8. 处理事件
-            await self._process_events()
-            
-            # 9. 自愈检查
-            await self._self_healing()
-            
-            print(f"\n✅ Day {day} 完成")
+        if self.roster.configs:
+            await self.roster.start()
+            stats = self.roster.get_stats()
+            print(f"🔌 Agent客户端: {stats['clients']}个 | 预连接 {stats['preconnected']}条 "
+                  f"(失败 {stats['preconnect_failed']}) | 耗时 {stats['startup_ms']:.0f}ms")
+        
+        self.event_bus.start()
+        self.deadlines.start()
+        self.store.start()
+        try:
+            first_day = self.days_completed + 1
+            for day in range(first_day, first_day + days):
+                self.metrics["day"] = day
+                
+                print(f"\n📅 Day {day}")
+                print("-" * 70)
+                
+                # 1. CMO市场分析
+                await self._phase_marketing(day)
+                
+                # 2. CPO设计阶段
+                await self._phase_design(day)
+                
+                # 3. CTO后端架构
+                await self._phase_backend(day)
+                
+                # 4. CFO收费模型
+                await self._phase_pricing(day)
+                
+                # 5. COO客户维护
+                await self._phase_customer_support(day)
+                
+                # 6. CHRO团队组建
+                await self._phase_team_building(day)
+                
+                # 7. CEO最终决策
+                await self._phase_strategic_decision(day)
+                
+                # 8. 处理事件
+                await self._process_events()
+                
+                # 9. 自愈检查
+                await self._self_healing()
+                
+                self._complete_day(day)
+                print(f"\n✅ Day {day} 完成")
+        finally:
+            await self.deadlines.close()
+            await self.event_bus.close()
+            self.state_log.close()
+            self.quotas.close()
+            await self.store.close()
+            await self.roster.close()
         
         self._print_full_summary()
     
@@ -574,26 +787,19 @@ class FullCompanySystem(AdvancedCompanySystem):
     
     async def _process_events(self):
         """处理事件"""
-        unprocessed = [e for e in self.events if not e.processed]
-        if unprocessed:
-            print(f"\n📡 Processing {len(unprocessed)} events...")
-            for event in unprocessed[:10]:
-                event.processed = True
+        # 事件发出时已投递给订阅者，这里只等待积压事件确认
+        await self.event_bus.drain()
+        processed = self.event_bus.get_stats()["subscribers"]["event_log"]["acked"]
+        if processed > self._events_reported:
+            print(f"\n📡 Processed {processed - self._events_reported} events")
+            self._events_reported = processed
     
     async def _self_healing(self):
-        """自愈检查"""
-        stale_threshold = datetime.now() - timedelta(minutes=30)
-        stale_steps = [
-            s for s in self.steps.values()
-            if s.status == StepStatus.RUNNING
-            and s.started_at and s.started_at < stale_threshold
-        ]
-        
-        if stale_steps:
-            print(f"\n🏥 Recovered {len(stale_steps)} stale steps")
-            for step in stale_steps:
-                step.status = StepStatus.FAILED
-                step.error = "Stale: timeout"
+        """自愈检查（卡住的步骤在截止时间到达时已由定时器处理，这里只汇报）"""
+        fired = self.deadlines.stats["fired"]
+        if fired > self._stale_reported:
+            print(f"\n🏥 Recovered {fired - self._stale_reported} stale steps")
+            self._stale_reported = fired
     
     def _print_full_summary(self):
         """打印完整总结"""
@@ -612,14 +818,78 @@ class FullCompanySystem(AdvancedCompanySystem):
             print(f"   {status} {agent.upper():6} : {count}次")
         
         print(f"\n📁 系统状态:")
-        print(f"   Proposals: {len(self.proposals)}")
-        print(f"   Missions: {len(self.missions)} (Succeeded: {len([m for m in self.missions.values() if m.status == 'succeeded'])})")
-        print(f"   Steps: {len(self.steps)}")
-        print(f"   Events: {len(self.events)}")
+        print(f"   Proposals: {self.proposals.count()}")
+        print(f"   Missions: {self.missions.count()} (Succeeded: {self.missions.count(status='succeeded')})")
+        print(f"   Steps: {self.steps.count()}")
+        print(f"   Events: {len(self.event_bus)} (保留 {len(self.event_bus.history)})")
+        if self.events_by_type:
+            print(f"   按类型: " + " | ".join(f"{t} {n}" for t, n in self.events_by_type.items()))
         
         print(f"\n💰 财务:")
         print(f"   现金流: ¥{self.financials['cash_flow']:,.0f}")
         
+        cache = get_response_cache()
+        if cache:
+            stats = cache.get_stats()
+            print(f"\n🗄️  LLM缓存:")
+            print(f"   命中: {stats['hits']} / 未命中: {stats['misses']} (命中率 {stats['hit_rate']*100:.0f}%)")
+        
+        flight = get_single_flight().get_stats()
+        if flight["coalesced"]:
+            print(f"\n🔗 请求合并: {flight['coalesced']}/{flight['calls']} 次调用共享了飞行中的请求")
+        
+        telemetry = get_telemetry()
+        if telemetry.totals.calls:
+            totals = telemetry.totals.to_dict()
+            print(f"\n📡 LLM调用遥测:")
+            print(f"   调用 {totals['calls']}次 | 错误 {totals['errors']} | 重试 {totals['retries']} | "
+                  f"tokens {totals['input_tokens']:,}/{totals['output_tokens']:,} | 成本 ¥{totals['cost']:.4f}")
+            for title, dimension in (("按Agent", "agent_id"), ("按步骤类型", "step_kind"), ("按模型", "model")):
+                print(f"   {title}:")
+                for name, agg in sorted(telemetry.by(dimension).items(), key=lambda kv: -kv[1]["cost"]):
+                    latency = agg["latency_ms"]
+                    print(f"     {name:20} {agg['calls']:3}次 | p50 {latency['p50']:.0f}ms p95 {latency['p95']:.0f}ms | "
+                          f"tokens {agg['input_tokens'] + agg['output_tokens']:,} | ¥{agg['cost']:.4f}")
+            
+            print(f"   调度排队(按优先级):")
+            for name, cls in get_scheduler().get_stats()["by_class"].items():
+                if cls["admitted"]:
+                    wait = cls["wait_ms"]
+                    print(f"     {name:20} {cls['admitted']:3}次 | 等待 p50 {wait['p50']:.0f}ms p95 {wait['p95']:.0f}ms | "
+                          f"老化提升 {cls['promoted']} | 超截止 {cls['deadline_missed']}")
+            
+            models = self.model_routes.get_stats()
+            tiers = " | ".join(f"{tier} {count}次" for tier, count in models["calls"].items())
+            print(f"   模型档位: {tiers} | 低置信度升级 {sum(models['escalations'].values())}次")
+        
+        quota_usage = [
+            f"{step_kind} {used}/{limit}({window})"
+            for step_kind, windows in self.quotas.usage().items()
+            for window, (used, _, limit) in windows.items() if used
+        ]
+        if quota_usage:
+            print(f"   配额: {' | '.join(quota_usage)}")
+        
+        stored = self.store.get_stats()
+        if stored["persistent"]:
+            print(f"   状态存储: 写入 {stored['rows_written']}行 + {stored['events_written']}事件 | "
+                  f"{stored['flushes']}批 ({stored['flush_ms']:.0f}ms) | 惰性加载 {stored['lazy_loads']} | 淘汰 {stored['evicted']}")
+        
+        logged = self.state_log.get_stats()
+        if logged["enabled"]:
+            print(f"   状态日志: seq {logged['seq']} | 快照 {logged['snapshots']}次 | 重放 {logged['replayed']}条 "
+                  f"({logged['recovery_ms']:.0f}ms) | 压缩分段 {logged['compacted_segments']} | 磁盘 {logged['disk_bytes'] / 1024:.0f}KB")
+        
+        deadlines = self.deadlines.get_stats()
+        if deadlines["fired"]:
+            print(f"   步骤超时: {deadlines['fired']}次 | 最大触发延迟 {deadlines['max_lag_ms']:.0f}ms")
+        
+        executor = get_mission_executor().get_stats()
+        if executor["steps_run"]:
+            print(f"   任务步骤: 执行 {executor['steps_run']} | 失败 {executor['steps_failed']} | "
+                  f"取消 {executor['steps_cancelled']} | 峰值并行 {executor['peak_parallel']} | "
+                  f"并行度 {executor['parallelism']}x")
+        
         # 激活率
         active_agents = sum(1 for c in self.loop_stats["agent_calls"].values() if c > 0)
         print(f"\n📈 Agent激活率: {active_agents}/7 ({active_agents/7*100:.0f}%)")
@@ -634,7 +904,10 @@ async def main():
     print("╚══════════════════════════════════════════════════════════════╝")
     
     company = FullCompanySystem("Nexus AI Full Stack")
-    await company.run_full_simulation(days=2)
+    try:
+        await company.run_full_simulation(days=2)
+    finally:
+        await close_pool()
     
     print("\n" + "="*70)
     print("✅ 完整版模拟完成!")
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+HTTP Connection Pool - 进程级HTTP连接池
+按 base_url / API Key 复用 aiohttp.ClientSession，保持keep-alive连接，
+避免每次Agent调用都重新建立TCP+TLS握手
+"""
+
+import asyncio
+import os
+import aiohttp
+from typing import Dict, Optional, Tuple
+from dataclasses import dataclass
+
+
+@dataclass
+class PoolConfig:
+    """连接池配置"""
+    limit: int = 100               # 全局最大连接数
+    limit_per_host: int = 10       # 单个host最大连接数
+    ttl_dns_cache: int = 300       # DNS缓存时间(秒)
+    keepalive_timeout: float = 30.0  # 空闲连接保活时间(秒)
+
+    @classmethod
+    def from_env(cls) -> "PoolConfig":
+        """从环境变量读取配置"""
+        return cls(
+            limit=int(os.getenv("NEXUS_HTTP_POOL_LIMIT", "100")),
+            limit_per_host=int(os.getenv("NEXUS_HTTP_POOL_LIMIT_PER_HOST", "10")),
+            ttl_dns_cache=int(os.getenv("NEXUS_HTTP_DNS_TTL", "300")),
+            keepalive_timeout=float(os.getenv("NEXUS_HTTP_KEEPALIVE", "30"))
+        )
+
+
+class HTTPPoolManager:
+    """
+    进程级连接池管理器
+    每个 (事件循环, base_url, API Key) 对应一个长期存活的 ClientSession，
+    Runner 只借用 session，不负责关闭
+    """
+
+    def __init__(self, config: PoolConfig = None):
+        self.config = config or PoolConfig.from_env()
+        self._sessions: Dict[Tuple[int, str, str], Tuple[asyncio.AbstractEventLoop, aiohttp.ClientSession]] = {}
+        self.stats = {
+            "sessions_created": 0,
+            "sessions_reused": 0
+        }
+
+    def get_session(self, base_url: str, api_key: str, headers: Dict[str, str] = None) -> aiohttp.ClientSession:
+        """
+        借用连接池中的 session（必须在事件循环中调用）
+
+        Args:
+            base_url: API地址
+            api_key: API Key（不同Key使用独立连接池）
+            headers: 首次创建 session 时使用的默认请求头
+        """
+        loop = asyncio.get_running_loop()
+        self._purge_closed_loops()
+
+        key = (id(loop), base_url.rstrip("/"), api_key or "")
+        entry = self._sessions.get(key)
+        if entry and not entry[1].closed:
+            self.stats["sessions_reused"] += 1
+            return entry[1]
+
+        connector = aiohttp.TCPConnector(
+            limit=self.config.limit,
+            limit_per_host=self.config.limit_per_host,
+            ttl_dns_cache=self.config.ttl_dns_cache,
+            use_dns_cache=True,
+            keepalive_timeout=self.config.keepalive_timeout
+        )
+        session = aiohttp.ClientSession(connector=connector, headers=headers)
+        self._sessions[key] = (loop, session)
+        self.stats["sessions_created"] += 1
+        return session
+
+    def _purge_closed_loops(self):
+        """清理已关闭事件循环遗留的 session（asyncio.run 多次调用的场景）"""
+        stale = [k for k, (loop, _) in self._sessions.items() if loop.is_closed()]
+        for k in stale:
+            del self._sessions[k]
+
+    async def close(self):
+        """关闭当前事件循环下的所有 session"""
+        loop = asyncio.get_running_loop()
+        for key, (owner, session) in list(self._sessions.items()):
+            if owner is loop:
+                if not session.closed:
+                    await session.close()
+                del self._sessions[key]
+
+    def get_stats(self) -> Dict:
+        """连接池统计"""
+        return {
+            **self.stats,
+            "open_sessions": sum(1 for _, s in self._sessions.values() if not s.closed)
+        }
+
+
+# ============== 全局单例 ==============
+
+_pool_manager: Optional[HTTPPoolManager] = None
+
+
+def get_pool_manager() -> HTTPPoolManager:
+    """获取进程级连接池"""
+    global _pool_manager
+    if _pool_manager is None:
+        _pool_manager = HTTPPoolManager()
+    return _pool_manager
+
+
+async def close_pool():
+    """关闭连接池（程序退出前调用）"""
+    if _pool_manager is not None:
+        await _pool_manager.close()
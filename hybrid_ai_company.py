@@ -16,12 +16,16 @@ from dataclasses import dataclass
 
 # 尝试导入Kimi模块，如果失败则使用模拟模式
 try:
-    from kimi_agent_runner import KimiAgentRunner, KimiAgentFactory
+    from kimi_agent_runner import KimiAgentConfig, KimiAgentFactory
+    from agent_client import AgentClient, AgentRoster
+    from http_pool import close_pool
     KIMI_AVAILABLE = True
 except ImportError:
     KIMI_AVAILABLE = False
 
 from advanced_company_v3 import AdvancedCompanySystem, Project, ProjectPhase
+from quorum import gather_quorum
+from decision_history import DecisionHistory
 
 
 @dataclass
@@ -37,19 +41,22 @@ class HybridAgent:
     混合Agent - 支持真实AI和模拟AI
     """
     
-    def __init__(self, agent_id: str, name: str, role: str, mode: AIMode):
+    def __init__(self, agent_id: str, name: str, role: str, mode: AIMode,
+                 roster: Optional["AgentRoster"] = None):
         self.agent_id = agent_id
         self.name = name
         self.role = role
         self.mode = mode
         self.avatar = self._get_avatar()
         
-        # 真实AI配置
-        self.kimi_runner: Optional[KimiAgentRunner] = None
+        # 真实AI配置（客户端由公司系统的 AgentRoster 长期持有，每次思考只做供应商路由）
+        self.roster = roster
+        self.kimi_config: Optional["KimiAgentConfig"] = None
+        self.kimi_runner: Optional["AgentClient"] = None
         self._init_real_ai()
         
-        # 决策历史
-        self.decisions: List[Dict] = []
+        # 决策历史（内存有界，超出部分落盘）
+        self.decisions = DecisionHistory(f"hybrid-{agent_id}", type_key="mode")
     
     def _get_avatar(self) -> str:
         """获取角色头像"""
@@ -86,20 +93,26 @@ class HybridAgent:
             factory_method = factory_methods.get(self.agent_id, KimiAgentFactory.create_ceo_agent)
             config = factory_method(self.mode.api_key)
             
-            # 创建runner但不启动session（在think方法中启动）
-            self.kimi_runner = KimiAgentRunner(config)
+            # 登记到长期客户端（随公司系统启动时打开并预连接）
+            if self.roster is None:
+                self.roster = AgentRoster()
+            self.roster.register(config)
+            self.kimi_config = config
             
         except Exception as e:
             print(f"⚠️ {self.name} AI初始化失败: {e}")
+            self.kimi_config = None
             self.kimi_runner = None
     
     async def think(self, task: str, context: Dict = None) -> Dict:
         """
         Agent思考并做出决策
         
-        根据模式选择真实AI或模拟AI
+        根据模式选择真实AI或模拟AI（路由跳过熔断中的供应商，全部熔断时走模拟AI）
         """
-        if self.mode.use_real_ai and self.kimi_runner:
+        if self.mode.use_real_ai and self.kimi_config:
+            self.kimi_runner = self.roster.client(self.agent_id, (context or {}).get("step_kind"))
+        if self.mode.use_real_ai and self.kimi_runner and not self.kimi_runner.circuit_open():
             return await self._real_ai_think(task, context)
         else:
             return await self._simulated_think(task, context)
@@ -107,19 +120,19 @@ class HybridAgent:
     async def _real_ai_think(self, task: str, context: Dict) -> Dict:
         """使用真实AI思考"""
         try:
-            async with self.kimi_runner:
-                result = await self.kimi_runner.think(task, context)
-                
-                # 记录决策
-                self.decisions.append({
-                    "timestamp": datetime.now().isoformat(),
-                    "task": task,
-                    "result": result,
-                    "mode": "real_ai"
-                })
-                
-                return result
-                
+            result = await self.kimi_runner.think(task, context)
+            
+            # 记录决策
+            self.decisions.append({
+                "timestamp": datetime.now().isoformat(),
+                "agent_id": self.agent_id,
+                "task": task,
+                "result": result,
+                "mode": "real_ai"
+            })
+            
+            return result
+            
         except Exception as e:
             print(f"⚠️ {self.name} 真实AI调用失败: {e}")
             print(f"   切换到模拟模式...")
@@ -136,6 +149,7 @@ class HybridAgent:
         # 记录决策
         self.decisions.append({
             "timestamp": datetime.now().isoformat(),
+            "agent_id": self.agent_id,
             "task": task,
             "result": decision,
             "mode": "simulated"
@@ -255,6 +269,9 @@ class HybridAICompanySystem(AdvancedCompanySystem):
         # AI模式
         self.mode = mode or AIMode(use_real_ai=False)
         
+        # 长期Agent客户端（真实AI模式下随模拟启动/关闭）
+        self.roster: Optional["AgentRoster"] = AgentRoster() if self.mode.use_real_ai and KIMI_AVAILABLE else None
+        
         # 创建混合Agent团队
         self.hybrid_agents: Dict[str, HybridAgent] = {}
         self._init_hybrid_agents()
@@ -282,7 +299,7 @@ class HybridAICompanySystem(AdvancedCompanySystem):
         ]
         
         for agent_id, name, role in agent_configs:
-            self.hybrid_agents[agent_id] = HybridAgent(agent_id, name, role, self.mode)
+            self.hybrid_agents[agent_id] = HybridAgent(agent_id, name, role, self.mode, self.roster)
         
         print(f"   已初始化 {len(self.hybrid_agents)} 个混合Agent")
     
@@ -292,30 +309,44 @@ class HybridAICompanySystem(AdvancedCompanySystem):
         print(f"🚀 启动混合AI模拟 - {days} 天")
         print(f"{'='*70}")
         
-        for day in range(1, days + 1):
-            self.metrics["day"] = day
-            
-            print(f"\n📅 Day {day}")
-            print("-" * 50)
-            
-            # 1. 混合AI CMO扫描市场
-            opportunities = await self._hybrid_cmo_scan()
-            
-            # 2. 评估机会
-            for opp in opportunities[:2]:
-                await self._hybrid_evaluate_opportunity(opp)
-            
-            # 3. 管理项目
-            await self._hybrid_manage_projects()
-            
-            # 4. 生成报告
-            await self._hybrid_daily_report()
-            
-            print(f"\n✅ Day {day} 完成")
-            await asyncio.sleep(0.5)
+        await self._start_agents()
+        try:
+            for day in range(1, days + 1):
+                self.metrics["day"] = day
+                
+                print(f"\n📅 Day {day}")
+                print("-" * 50)
+                
+                # 1. 混合AI CMO扫描市场
+                opportunities = await self._hybrid_cmo_scan()
+                
+                # 2. 评估机会
+                for opp in opportunities[:2]:
+                    await self._hybrid_evaluate_opportunity(opp)
+                
+                # 3. 管理项目
+                await self._hybrid_manage_projects()
+                
+                # 4. 生成报告
+                await self._hybrid_daily_report()
+                
+                print(f"\n✅ Day {day} 完成")
+                await asyncio.sleep(0.5)
+        finally:
+            if self.roster:
+                await self.roster.close()
         
         self._print_hybrid_summary()
     
+    async def _start_agents(self):
+        """打开长期Agent客户端并预连接（仅真实AI模式）"""
+        if not self.roster:
+            return
+        await self.roster.start()
+        stats = self.roster.get_stats()
+        print(f"🔌 Agent客户端: {stats['clients']}个 | 预连接 {stats['preconnected']}条 "
+              f"(失败 {stats['preconnect_failed']}) | 耗时 {stats['startup_ms']:.0f}ms")
+    
     async def _hybrid_cmo_scan(self) -> List[Dict]:
         """混合AI CMO市场扫描"""
         print("\n📊 CMO分析市场...")
@@ -375,13 +406,13 @@ class HybridAICompanySystem(AdvancedCompanySystem):
             return result
         
         print("   ⏳ 并行评估...")
-        results = await asyncio.gather(
-            evaluate("cto", "技术"),
-            evaluate("cfo", "财务"),
-            evaluate("cpo", "产品")
-        )
-        
-        cto_result, cfo_result, cpo_result = results
+        gathered = await gather_quorum({
+            "cto": evaluate("cto", "技术"),
+            "cfo": evaluate("cfo", "财务"),
+            "cpo": evaluate("cpo", "产品")
+        })
+        if gathered.missing:
+            print(f"   ⏱️ 未等待: {', '.join(gathered.missing)} ({gathered.reason})")
         
         # CEO决策
         print("\n👔 CEO决策...")
@@ -391,9 +422,11 @@ class HybridAICompanySystem(AdvancedCompanySystem):
             task="基于各部门评估，做出投资决策",
             context={
                 "opportunity": opportunity,
-                "evaluations": {"cto": cto_result, "cfo": cfo_result, "cpo": cpo_result}
+                "evaluations": gathered.results,
+                "missing_evaluations": gathered.missing
             }
         )
+        final_result["inputs"] = gathered.inputs()
         
         self.ai_stats["total_decisions"] += 1
         
@@ -514,7 +547,11 @@ async def main():
     company = HybridAICompanySystem("Nexus AI Hybrid", mode)
     
     # 运行模拟
-    await company.run_hybrid_simulation(days=3)
+    try:
+        await company.run_hybrid_simulation(days=3)
+    finally:
+        if KIMI_AVAILABLE:
+            await close_pool()
     
     print("\n" + "="*70)
     print("✅ 模拟完成!")
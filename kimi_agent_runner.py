@@ -2,194 +2,28 @@
 # -*- coding: utf-8 -*-
 """
 Kimi AI Agent Integration - Kimi AI Agent集成模块
-使用真实的 kimi-coding/k2p5 模型实现Agent自主决策
+使用真实的 kimi-coding/k2p5 模型实现Agent自主决策（Moonshot OpenAI兼容接口，调用逻辑见 agent_client.AgentClient）
 """
 
-import json
-import asyncio
-import aiohttp
-from typing import Dict, List, Optional, Any, Callable
-from dataclasses import dataclass
-from datetime import datetime
 import os
+from typing import Optional
+from dataclasses import dataclass
+
+from agent_client import AgentClient, AgentConfig
+
 
 @dataclass
-class KimiAgentConfig:
-    """Kimi Agent配置"""
-    agent_id: str
-    name: str
-    role: str
-    system_prompt: str
-    api_key: str
-    model: str = "kimi-coding/k2p5"
+class KimiAgentConfig(AgentConfig):
+    """Kimi Agent配置（base_url 默认读取 KIMI_BASE_URL，未设置时使用官方地址）"""
+    base_url: Optional[str] = None
+    provider: str = "openai"
     thinking: str = "medium"  # low, medium, high
-    temperature: float = 0.7
-    max_tokens: int = 4000
 
-class KimiAgentRunner:
+
+class KimiAgentRunner(AgentClient):
     """Kimi AI Agent运行器 - 调用真实的Kimi K2.5模型"""
     
-    API_BASE_URL = "https://api.moonshot.cn/v1"
-    
-    def __init__(self, config: KimiAgentConfig):
-        self.config = config
-        self.session: Optional[aiohttp.ClientSession] = None
-        self.conversation_history: List[Dict] = []
-        self.decision_log: List[Dict] = []
-        
-    async def __aenter__(self):
-        """异步上下文管理器入口"""
-        self.session = aiohttp.ClientSession(
-            headers={
-                "Authorization": f"Bearer {self.config.api_key}",
-                "Content-Type": "application/json"
-            }
-        )
-        return self
-    
-    async def __aexit__(self, exc_type, exc_val, exc_tb):
-        """异步上下文管理器出口"""
-        if self.session:
-            await self.session.close()
-    
-    async def think(self, task: str, context: Dict = None) -> Dict[str, Any]:
-        """
-        Agent思考并做出决策
-        
-        Args:
-            task: 任务描述
-            context: 上下文信息（公司状态、市场数据等）
-            
-        Returns:
-            决策结果字典
-        """
-        # 构建提示词
-        prompt = self._build_prompt(task, context)
-        
-        # 调用Kimi API
-        response = await self._call_kimi_api(prompt)
-        
-        # 解析决策
-        decision = self._parse_decision(response)
-        
-        # 记录决策
-        self.decision_log.append({
-            "timestamp": datetime.now().isoformat(),
-            "task": task,
-            "decision": decision,
-            "raw_response": response
-        })
-        
-        return decision
-    
-    def _build_prompt(self, task: str, context: Dict = None) -> str:
-        """构建提示词"""
-        base_prompt = f"""{self.config.system_prompt}
-
-## 当前任务
-{task}
-
-## 角色信息
-- 姓名: {self.config.name}
-- 职位: {self.config.role}
-- Agent ID: {self.config.agent_id}
-
-## 决策格式
-请使用以下JSON格式返回你的决策：
-```json
-{{
-    "decision": "你的决策（批准/拒绝/需要更多信息）",
-    "confidence": 0.85,
-    "reasoning": "详细的推理过程",
-    "action_items": ["具体行动项1", "行动项2"],
-    "risks": ["风险1", "风险2"],
-    "recommendations": ["建议1", "建议2"],
-    "budget_request": 0,
-    "timeline_days": 30,
-    "team_requirements": ["需要的团队成员"]
-}}
-```
-
-请确保你的决策符合你的角色职责和专业领域。"""
-
-        if context:
-            base_prompt += f"\n\n## 上下文信息\n{json.dumps(context, ensure_ascii=False, indent=2)}"
-        
-        return base_prompt
-    
-    async def _call_kimi_api(self, prompt: str) -> str:
-        """调用Kimi API"""
-        if not self.session:
-            raise RuntimeError("Agent not initialized. Use 'async with' context manager.")
-        
-        url = f"{self.API_BASE_URL}/chat/completions"
-        
-        payload = {
-            "model": self.config.model,
-            "messages": [
-                {"role": "system", "content": self.config.system_prompt},
-                {"role": "user", "content": prompt}
-            ],
-            "temperature": self.config.temperature,
-            "max_tokens": self.config.max_tokens,
-            "stream": False
-        }
-        
-        try:
-            async with self.session.post(url, json=payload) as response:
-                if response.status == 200:
-                    data = await response.json()
-                    return data["choices"][0]["message"]["content"]
-                else:
-                    error_text = await response.text()
-                    raise Exception(f"Kimi API Error: {response.status} - {error_text}")
-        except Exception as e:
-            print(f"❌ API调用失败: {e}")
-            # 返回模拟响应作为fallback
-            return self._generate_fallback_response(prompt)
-    
-    def _parse_decision(self, response: str) -> Dict:
-        """解析AI响应为结构化决策"""
-        try:
-            # 尝试提取JSON
-            if "```json" in response:
-                json_str = response.split("```json")[1].split("```")[0].strip()
-            elif "```" in response:
-                json_str = response.split("```")[1].strip()
-            else:
-                json_str = response
-            
-            decision = json.loads(json_str)
-            return decision
-        except json.JSONDecodeError:
-            # 如果解析失败，返回文本决策
-            return {
-                "decision": "需要讨论",
-                "confidence": 0.5,
-                "reasoning": response[:500],
-                "action_items": [],
-                "risks": [],
-                "recommendations": ["请重新格式化决策"],
-                "budget_request": 0,
-                "timeline_days": 0,
-                "team_requirements": []
-            }
-    
-    def _generate_fallback_response(self, prompt: str) -> str:
-        """生成fallback响应（当API调用失败时）"""
-        return """```json
-{
-    "decision": "需要更多信息",
-    "confidence": 0.6,
-    "reasoning": "API暂时不可用，需要等待恢复后重新评估",
-    "action_items": ["等待系统恢复", "收集更多数据"],
-    "risks": ["API连接不稳定"],
-    "recommendations": ["稍后重试"],
-    "budget_request": 0,
-    "timeline_days": 1,
-    "team_requirements": ["技术团队"]
-}
-```"""
+    provider = "openai"
 
 
 class KimiAgentFactory:
@@ -2,198 +2,31 @@
 # -*- coding: utf-8 -*-
 """
 Kimi Coding API (Anthropic Compatible) Runner
-支持 Anthropic API 格式的 Kimi Coding 接入
+支持 Anthropic API 格式的 Kimi Coding 接入（调用逻辑见 agent_client.AgentClient）
 """
 
-import json
 import asyncio
-import aiohttp
 import os
-from typing import Dict, List, Optional, Any
+from typing import Dict
 from dataclasses import dataclass
-from datetime import datetime
+
+from agent_client import AgentClient, AgentConfig
 
 
 @dataclass
-class KimiCodingConfig:
+class KimiCodingConfig(AgentConfig):
     """Kimi Coding 配置 - Anthropic兼容格式"""
-    agent_id: str
-    name: str
-    role: str
-    system_prompt: str
-    api_key: str
     base_url: str = "https://api.kimi.com/coding"
-    model: str = "kimi-coding/k2p5"
-    temperature: float = 0.7
-    max_tokens: int = 4000
-    timeout: int = 60
+    provider: str = "anthropic"
 
 
-class KimiCodingRunner:
+class KimiCodingRunner(AgentClient):
     """
     Kimi Coding Agent运行器
     使用 Anthropic API 兼容格式
     """
     
-    def __init__(self, config: KimiCodingConfig):
-        self.config = config
-        self.session: Optional[aiohttp.ClientSession] = None
-        self.decision_log: List[Dict] = []
-        
-    async def __aenter__(self):
-        """异步上下文管理器入口"""
-        timeout = aiohttp.ClientTimeout(total=self.config.timeout)
-        self.session = aiohttp.ClientSession(
-            timeout=timeout,
-            headers={
-                "x-api-key": self.config.api_key,
-                "Content-Type": "application/json",
-                "anthropic-version": "2023-06-01"
-            }
-        )
-        return self
-    
-    async def __aexit__(self, exc_type, exc_val, exc_tb):
-        """异步上下文管理器出口"""
-        if self.session:
-            await self.session.close()
-            self.session = None
-    
-    async def think(self, task: str, context: Dict = None) -> Dict[str, Any]:
-        """Agent思考并做出决策"""
-        prompt = self._build_prompt(task, context)
-        
-        try:
-            response = await self._call_anthropic_api(prompt)
-            decision = self._parse_response(response)
-            
-            # 记录决策
-            self.decision_log.append({
-                "timestamp": datetime.now().isoformat(),
-                "task": task,
-                "decision": decision,
-                "mode": "real_ai",
-                "model": self.config.model,
-                "api_type": "anthropic_compatible"
-            })
-            
-            return decision
-            
-        except Exception as e:
-            print(f"⚠️ API调用失败: {e}")
-            return self._generate_fallback_decision(task, str(e))
-    
-    def _build_prompt(self, task: str, context: Dict = None) -> str:
-        """构建提示词"""
-        prompt = f"""{self.config.system_prompt}
-
-## 当前任务
-{task}
-
-## 角色信息
-- 姓名: {self.config.name}
-- 职位: {self.config.role}
-
-## 决策格式
-请使用以下JSON格式返回你的决策：
-```json
-{{
-    "decision": "你的决策（批准/拒绝/需要更多信息）",
-    "confidence": 0.85,
-    "reasoning": "详细的推理过程",
-    "action_items": ["具体行动项1", "行动项2"],
-    "risks": ["风险1", "风险2"],
-    "recommendations": ["建议1", "建议2"],
-    "budget_request": 0,
-    "timeline_days": 30,
-    "team_requirements": ["需要的团队成员"]
-}}
-```
-
-请确保你的决策符合你的角色职责和专业领域。"""
-
-        if context:
-            context_str = json.dumps(context, ensure_ascii=False, indent=2)
-            prompt += f"\n\n## 上下文信息\n{context_str}"
-        
-        return prompt
-    
-    async def _call_anthropic_api(self, prompt: str) -> str:
-        """调用Anthropic兼容API"""
-        if not self.session:
-            raise RuntimeError("Agent not initialized")
-        
-        url = f"{self.config.base_url}/v1/messages"
-        
-        # Anthropic格式
-        payload = {
-            "model": self.config.model,
-            "max_tokens": self.config.max_tokens,
-            "temperature": self.config.temperature,
-            "system": self.config.system_prompt,
-            "messages": [
-                {"role": "user", "content": prompt}
-            ]
-        }
-        
-        async with self.session.post(url, json=payload) as response:
-            if response.status == 200:
-                data = await response.json()
-                # Anthropic返回格式
-                return data["content"][0]["text"]
-            else:
-                error_text = await response.text()
-                raise Exception(f"API Error {response.status}: {error_text}")
-    
-    def _parse_response(self, response: str) -> Dict:
-        """解析API响应"""
-        try:
-            # 尝试提取JSON
-            if "```json" in response:
-                json_str = response.split("```json")[1].split("```")[0].strip()
-            elif "```" in response:
-                json_str = response.split("```")[1].strip()
-            else:
-                json_str = response
-            
-            decision = json.loads(json_str)
-            
-            # 确保必要字段
-            required = ["decision", "confidence", "reasoning"]
-            for field in required:
-                if field not in decision:
-                    decision[field] = "未知" if field == "decision" else 0.5
-            
-            return decision
-            
-        except json.JSONDecodeError:
-            return {
-                "decision": "需要讨论",
-                "confidence": 0.5,
-                "reasoning": response[:500] if response else "无法解析",
-                "action_items": [],
-                "risks": [],
-                "recommendations": ["重新格式化"],
-                "budget_request": 0,
-                "timeline_days": 0,
-                "team_requirements": [],
-                "raw_response": response
-            }
-    
-    def _generate_fallback_decision(self, task: str, error: str) -> Dict:
-        """生成fallback决策"""
-        return {
-            "decision": "需要更多信息",
-            "confidence": 0.6,
-            "reasoning": f"API调用失败: {error}",
-            "action_items": ["检查API配置", "验证API Key"],
-            "risks": ["API连接不稳定"],
-            "recommendations": ["使用模拟模式"],
-            "budget_request": 0,
-            "timeline_days": 1,
-            "team_requirements": [],
-            "mode": "fallback"
-        }
+    provider = "anthropic"
 
 
 class KimiCodingFactory:
@@ -205,7 +38,9 @@ class KimiCodingFactory:
         return {
             "api_key": os.getenv("ANTHROPIC_API_KEY") or os.getenv("KIMI_API_KEY"),
             "base_url": os.getenv("ANTHROPIC_BASE_URL", "https://api.kimi.com/coding"),
-            "model": os.getenv("KIMI_MODEL", "kimi-coding/k2p5")
+            "model": os.getenv("KIMI_MODEL", "kimi-coding/k2p5"),
+            "stream": os.getenv("KIMI_STREAM", "0").lower() in ("1", "true", "yes"),
+            "prompt_cache": os.getenv("KIMI_PROMPT_CACHE", "1").lower() not in ("0", "false", "no")
         }
     
     @staticmethod
@@ -233,7 +68,9 @@ class KimiCodingFactory:
 请用专业、战略性的思维来分析和决策。""",
             api_key=api_key or base["api_key"],
             base_url=base["base_url"],
-            model=base["model"]
+            model=base["model"],
+            stream=base["stream"],
+            prompt_cache=base["prompt_cache"]
         )
     
     @staticmethod
@@ -255,7 +92,9 @@ class KimiCodingFactory:
 请提供详细的市场分析和营销建议。""",
             api_key=api_key or base["api_key"],
             base_url=base["base_url"],
-            model=base["model"]
+            model=base["model"],
+            stream=base["stream"],
+            prompt_cache=base["prompt_cache"]
         )
     
     @staticmethod
@@ -278,7 +117,9 @@ class KimiCodingFactory:
 请从技术角度提供专业评估和建议。""",
             api_key=api_key or base["api_key"],
             base_url=base["base_url"],
-            model=base["model"]
+            model=base["model"],
+            stream=base["stream"],
+            prompt_cache=base["prompt_cache"]
         )
 
 
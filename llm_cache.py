@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+LLM Response Cache - LLM响应缓存
+按规范化请求内容的哈希寻址，内存LRU + SQLite磁盘两级缓存，
+按 step_kind 设置TTL，重启后磁盘缓存依然有效
+"""
+
+import os
+import json
+import time
+import sqlite3
+import hashlib
+from collections import OrderedDict
+from typing import Dict, Optional, Any
+from dataclasses import dataclass, field
+
+
+# 各步骤类型的缓存时间(秒)，0表示不缓存
+DEFAULT_STEP_KIND_TTL = {
+    "market_scan": 6 * 3600,
+    "market_analysis": 6 * 3600,
+    "marketing_strategy": 6 * 3600,
+    "customer_support": 24 * 3600,
+    "customer_retention": 24 * 3600,
+    "strategic_decision": 0,
+    "final_approval": 0,
+}
+
+
+@dataclass
+class CacheConfig:
+    """缓存配置"""
+    enabled: bool = False
+    max_entries: int = 512                  # 内存LRU容量
+    default_ttl: int = 3600                 # 默认TTL(秒)
+    step_kind_ttl: Dict[str, int] = field(default_factory=lambda: dict(DEFAULT_STEP_KIND_TTL))
+    db_path: Optional[str] = None           # SQLite路径，None表示仅内存
+
+    @classmethod
+    def from_env(cls) -> "CacheConfig":
+        """从环境变量读取配置"""
+        return cls(
+            enabled=os.getenv("NEXUS_LLM_CACHE", "0").lower() in ("1", "true", "yes"),
+            max_entries=int(os.getenv("NEXUS_LLM_CACHE_SIZE", "512")),
+            default_ttl=int(os.getenv("NEXUS_LLM_CACHE_TTL", "3600")),
+            db_path=os.getenv("NEXUS_LLM_CACHE_DB") or None
+        )
+
+
+class LLMResponseCache:
+    """
+    内容寻址的LLM响应缓存
+    缓存原始响应文本而非解析后的决策，解析逻辑变化不会使缓存失效
+    """
+
+    def __init__(self, config: CacheConfig = None):
+        self.config = config or CacheConfig(enabled=True)
+        self._memory: "OrderedDict[str, tuple]" = OrderedDict()  # key -> (response, expires_at)
+        self._db: Optional[sqlite3.Connection] = None
+        self.stats = {
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "stores": 0,
+            "evictions": 0,
+            "expired": 0,
+            "bypassed": 0
+        }
+
+        if self.config.db_path:
+            self._init_db(self.config.db_path)
+
+    def _init_db(self, db_path: str):
+        """初始化磁盘缓存"""
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._db = sqlite3.connect(db_path)
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS llm_cache (
+                key TEXT PRIMARY KEY,
+                response TEXT NOT NULL,
+                step_kind TEXT,
+                created_at REAL NOT NULL,
+                expires_at REAL NOT NULL
+            )
+        """)
+        self._db.execute("CREATE INDEX IF NOT EXISTS idx_llm_cache_expires ON llm_cache(expires_at)")
+        self._db.execute("DELETE FROM llm_cache WHERE expires_at < ?", (time.time(),))
+        self._db.commit()
+
+    # ============== Key ==============
+
+    @staticmethod
+    def make_key(payload: Dict[str, Any]) -> str:
+        """
+        计算请求的缓存Key
+        payload 为发往API的请求体，规范化为排序后的紧凑JSON并去除行尾空白
+        """
+        normalized = json.dumps(
+            _strip_whitespace(payload),
+            ensure_ascii=False,
+            sort_keys=True,
+            separators=(",", ":"),
+            default=str
+        )
+        return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+    def ttl_for(self, step_kind: Optional[str]) -> int:
+        """获取步骤类型对应的TTL"""
+        if step_kind and step_kind in self.config.step_kind_ttl:
+            return self.config.step_kind_ttl[step_kind]
+        return self.config.default_ttl
+
+    # ============== Get / Put ==============
+
+    def get(self, key: str, step_kind: Optional[str] = None) -> Optional[str]:
+        """读取缓存（先内存后磁盘），TTL为0的步骤类型直接跳过"""
+        if self.ttl_for(step_kind) <= 0:
+            self.stats["bypassed"] += 1
+            return None
+
+        now = time.time()
+
+        entry = self._memory.get(key)
+        if entry:
+            response, expires_at = entry
+            if expires_at > now:
+                self._memory.move_to_end(key)
+                self.stats["memory_hits"] += 1
+                return response
+            del self._memory[key]
+            self.stats["expired"] += 1
+
+        if self._db:
+            row = self._db.execute(
+                "SELECT response, expires_at FROM llm_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row:
+                response, expires_at = row
+                if expires_at > now:
+                    self._remember(key, response, expires_at)
+                    self.stats["disk_hits"] += 1
+                    return response
+                self._db.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+                self._db.commit()
+                self.stats["expired"] += 1
+
+        self.stats["misses"] += 1
+        return None
+
+    def put(self, key: str, response: str, step_kind: Optional[str] = None):
+        """写入缓存"""
+        ttl = self.ttl_for(step_kind)
+        if ttl <= 0 or not response:
+            return
+
+        now = time.time()
+        expires_at = now + ttl
+        self._remember(key, response, expires_at)
+        self.stats["stores"] += 1
+
+        if self._db:
+            self._db.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, response, step_kind, created_at, expires_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (key, response, step_kind, now, expires_at)
+            )
+            self._db.commit()
+
+    def _remember(self, key: str, response: str, expires_at: float):
+        """写入内存LRU"""
+        self._memory[key] = (response, expires_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.config.max_entries:
+            self._memory.popitem(last=False)
+            self.stats["evictions"] += 1
+
+    def clear(self):
+        """清空缓存"""
+        self._memory.clear()
+        if self._db:
+            self._db.execute("DELETE FROM llm_cache")
+            self._db.commit()
+
+    def close(self):
+        """关闭磁盘缓存"""
+        if self._db:
+            self._db.close()
+            self._db = None
+
+    def get_stats(self) -> Dict:
+        """缓存统计"""
+        hits = self.stats["memory_hits"] + self.stats["disk_hits"]
+        total = hits + self.stats["misses"]
+        return {
+            **self.stats,
+            "hits": hits,
+            "hit_rate": hits / total if total else 0.0,
+            "memory_entries": len(self._memory)
+        }
+
+
+def _strip_whitespace(value: Any) -> Any:
+    """去除字符串行尾空白，递归处理容器"""
+    if isinstance(value, str):
+        return "\n".join(line.rstrip() for line in value.strip().splitlines())
+    if isinstance(value, dict):
+        return {k: _strip_whitespace(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_strip_whitespace(v) for v in value]
+    return value
+
+
+# ============== 全局单例 ==============
+
+_response_cache: Optional[LLMResponseCache] = None
+
+
+def get_response_cache() -> Optional[LLMResponseCache]:
+    """
+    获取进程级响应缓存
+    未通过 NEXUS_LLM_CACHE=1 启用时返回 None
+    """
+    global _response_cache
+    if _response_cache is None:
+        config = CacheConfig.from_env()
+        if not config.enabled:
+            return None
+        _response_cache = LLMResponseCache(config)
+    return _response_cache
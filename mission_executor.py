@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Mission Executor - 按依赖关系并行执行任务步骤
+步骤通过 depends_on 声明前置步骤，依赖全部成功的步骤立即并发执行，
+并发数同时受单个任务上限和全局上限约束；步骤失败时立即取消其所有（传递）依赖步骤。
+失败回调（如创建诊断提案）在释放并发名额之后执行，嵌套任务不会因名额耗尽互相等待
+
+步骤状态与输出由公司系统维护，执行器只负责调度：
+    await get_mission_executor().run(
+        mission.steps,
+        run_step=self._run_mission_step,          # 执行一个步骤，返回是否成功
+        on_failed=...,                            # 步骤失败后的处理
+        on_cancelled=...,                         # 因依赖失败被取消
+        completed={...}                           # 已结束步骤 {step_id: 是否成功}
+    )
+"""
+
+import os
+import time
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set
+from dataclasses import dataclass
+
+
+@dataclass
+class ExecutorConfig:
+    """执行器配置"""
+    max_parallel_per_mission: int = 4   # 单个任务同时执行的步骤数
+    max_parallel_global: int = 8        # 所有任务同时执行的步骤数
+
+    @classmethod
+    def from_env(cls) -> "ExecutorConfig":
+        """从环境变量读取配置"""
+        return cls(
+            max_parallel_per_mission=int(os.getenv("NEXUS_MISSION_PARALLEL", "4")),
+            max_parallel_global=int(os.getenv("NEXUS_MISSION_GLOBAL_PARALLEL", "8"))
+        )
+
+
+class MissionExecutor:
+    """DAG任务执行器"""
+
+    def __init__(self, config: ExecutorConfig = None):
+        self.config = config or ExecutorConfig.from_env()
+        self._global: Dict[int, asyncio.Semaphore] = {}
+        self._running = 0
+        self.stats = {
+            "missions": 0,
+            "steps_run": 0,
+            "steps_failed": 0,
+            "steps_cancelled": 0,
+            "peak_parallel": 0,
+            "makespan_seconds": 0.0,
+            "step_seconds": 0.0
+        }
+
+    def _global_semaphore(self) -> asyncio.Semaphore:
+        # Semaphore 绑定事件循环，按循环隔离
+        key = id(asyncio.get_running_loop())
+        semaphore = self._global.get(key)
+        if semaphore is None:
+            semaphore = self._global[key] = asyncio.Semaphore(max(1, self.config.max_parallel_global))
+        return semaphore
+
+    async def run(self, steps: List[Any], run_step: Callable[[Any], Awaitable[bool]],
+                  on_failed: Callable[[Any], Awaitable[None]] = None,
+                  on_cancelled: Callable[[Any, Any], None] = None,
+                  completed: Dict[str, bool] = None) -> Dict[str, bool]:
+        """
+        执行任务步骤
+
+        Args:
+            steps: 步骤列表（需有 id 与 depends_on）
+            run_step: 执行一个步骤，返回是否成功
+            on_failed: 步骤失败后调用（在并发名额之外执行）
+            on_cancelled: 步骤因依赖失败被取消时调用 (步骤, 失败的前置步骤)
+            completed: 已结束的步骤 {step_id: 是否成功}，这些步骤不再执行
+
+        Returns:
+            {step_id: 是否成功}（被取消的步骤为 False）
+        """
+        outcome: Dict[str, bool] = dict(completed or {})
+        by_id = {step.id: step for step in steps}
+        pending = [step for step in steps if step.id not in outcome]
+        dependents: Dict[str, List[Any]] = {step.id: [] for step in steps}
+        for step in pending:
+            for dep in self._deps(step, by_id):
+                dependents[dep].append(step)
+
+        mission_slots = asyncio.Semaphore(max(1, self.config.max_parallel_per_mission))
+        global_slots = self._global_semaphore()
+        running: Dict[asyncio.Task, Any] = {}
+        followups: Set[asyncio.Task] = set()
+        started = time.monotonic()
+        self.stats["missions"] += 1
+
+        async def execute(step) -> bool:
+            async with mission_slots, global_slots:
+                self._running += 1
+                self.stats["peak_parallel"] = max(self.stats["peak_parallel"], self._running)
+                step_started = time.monotonic()
+                try:
+                    return bool(await run_step(step))
+                finally:
+                    self._running -= 1
+                    self.stats["step_seconds"] += time.monotonic() - step_started
+
+        def cancel_dependents(failed) -> None:
+            queue = [failed]
+            while queue:
+                current = queue.pop()
+                for child in dependents.get(current.id, []):
+                    if child.id in outcome:
+                        continue
+                    outcome[child.id] = False
+                    pending.remove(child)
+                    self.stats["steps_cancelled"] += 1
+                    if on_cancelled:
+                        on_cancelled(child, current)
+                    queue.append(child)
+
+        for step_id, succeeded in list(outcome.items()):
+            if not succeeded and step_id in by_id:
+                cancel_dependents(by_id[step_id])
+
+        while pending or running:
+            for step in [s for s in pending if all(outcome.get(d) for d in self._deps(s, by_id))]:
+                pending.remove(step)
+                running[asyncio.ensure_future(execute(step))] = step
+
+            if not running:
+                # 剩余步骤的依赖无法满足（循环依赖），全部取消
+                for step in list(pending):
+                    outcome[step.id] = False
+                    pending.remove(step)
+                    self.stats["steps_cancelled"] += 1
+                    if on_cancelled:
+                        on_cancelled(step, None)
+                break
+
+            done, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                step = running.pop(task)
+                self.stats["steps_run"] += 1
+                succeeded = not task.cancelled() and task.exception() is None and task.result()
+                outcome[step.id] = succeeded
+                if succeeded:
+                    continue
+                self.stats["steps_failed"] += 1
+                cancel_dependents(step)
+                if on_failed:
+                    followups.add(asyncio.ensure_future(on_failed(step)))
+
+        self.stats["makespan_seconds"] += time.monotonic() - started
+        if followups:
+            await asyncio.gather(*followups)
+        return outcome
+
+    @staticmethod
+    def _deps(step, by_id: Dict[str, Any]) -> List[str]:
+        """有效的前置步骤（忽略不属于本任务的步骤）"""
+        return [dep for dep in (getattr(step, "depends_on", None) or []) if dep in by_id]
+
+    def get_stats(self) -> Dict:
+        """执行统计（parallelism = 步骤耗时之和 / 任务总耗时）"""
+        makespan = self.stats["makespan_seconds"]
+        return {
+            **self.stats,
+            "parallelism": round(self.stats["step_seconds"] / makespan, 2) if makespan else 0.0
+        }
+
+
+# ============== 全局单例 ==============
+
+_executor: Optional[MissionExecutor] = None
+
+
+def get_mission_executor() -> MissionExecutor:
+    """获取进程级任务执行器"""
+    global _executor
+    if _executor is None:
+        _executor = MissionExecutor()
+    return _executor
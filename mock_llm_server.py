@@ -0,0 +1,436 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Mock LLM Server - 本地模拟LLM服务
+实现 Anthropic 兼容的 /v1/messages 和 Moonshot/OpenAI 兼容的 /v1/chat/completions，
+支持可配置的延迟分布、输出吞吐、流式响应、错误/429注入和按角色返回的决策JSON，
+用于离线压测编排层
+
+用法:
+    python3 mock_llm_server.py --port 8900 --latency-ms 800 --error-rate 0.02 --rate-429 0.05
+
+    export ANTHROPIC_BASE_URL=http://127.0.0.1:8900   # KimiCodingRunner
+    export KIMI_BASE_URL=http://127.0.0.1:8900/v1     # KimiAgentRunner
+"""
+
+import os
+import re
+import json
+import math
+import time
+import random
+import asyncio
+import hashlib
+import argparse
+from typing import Dict, List, Optional, Tuple
+from dataclasses import dataclass, asdict
+
+from aiohttp import web
+
+from rate_limiter import estimate_tokens
+
+
+@dataclass
+class MockServerConfig:
+    """模拟服务配置"""
+    host: str = "127.0.0.1"
+    port: int = 8900
+    latency_ms: float = 800.0        # 首token前的平均延迟
+    jitter_ms: float = 200.0         # 延迟离散程度
+    latency_dist: str = "lognormal"  # fixed / uniform / normal / lognormal
+    tokens_per_second: float = 80.0  # 输出吞吐（0表示瞬间返回）
+    error_rate: float = 0.0          # 500错误比例
+    rate_429: float = 0.0            # 429比例
+    retry_after: float = 1.0         # 429时的Retry-After(秒)
+    max_concurrency: int = 0         # 超过该并发直接429（0表示不限）
+    seed: Optional[int] = None
+
+    @classmethod
+    def from_env(cls) -> "MockServerConfig":
+        """从环境变量读取配置（MOCK_LLM_*）"""
+        config = cls()
+        config.port = int(os.getenv("MOCK_LLM_PORT", config.port))
+        config.latency_ms = float(os.getenv("MOCK_LLM_LATENCY_MS", config.latency_ms))
+        config.jitter_ms = float(os.getenv("MOCK_LLM_JITTER_MS", config.jitter_ms))
+        config.latency_dist = os.getenv("MOCK_LLM_LATENCY_DIST", config.latency_dist)
+        config.tokens_per_second = float(os.getenv("MOCK_LLM_TPS", config.tokens_per_second))
+        config.error_rate = float(os.getenv("MOCK_LLM_ERROR_RATE", config.error_rate))
+        config.rate_429 = float(os.getenv("MOCK_LLM_429_RATE", config.rate_429))
+        config.retry_after = float(os.getenv("MOCK_LLM_RETRY_AFTER", config.retry_after))
+        config.max_concurrency = int(os.getenv("MOCK_LLM_MAX_CONCURRENCY", config.max_concurrency))
+        seed = os.getenv("MOCK_LLM_SEED")
+        config.seed = int(seed) if seed else None
+        return config
+
+
+# ============== 角色决策 ==============
+
+ROLE_PATTERN = re.compile(r"\b(CHRO|CEO|CMO|CTO|CFO|CPO|COO)\b")
+
+ROLE_DECISIONS: Dict[str, Dict] = {
+    "ceo": {
+        "decision": "批准",
+        "reasoning": "综合各部门评估，市场窗口明确且团队具备交付能力，风险可控，批准进入下一阶段。",
+        "action_items": ["确定项目负责人", "按里程碑拨付预算", "两周后复盘"],
+        "risks": ["市场竞争加剧", "交付周期延误"],
+        "recommendations": ["分阶段投入", "优先验证核心用户需求"],
+        "budget_request": 500000,
+        "timeline_days": 60,
+        "team_requirements": ["CTO", "CPO", "COO"]
+    },
+    "cmo": {
+        "decision": "批准",
+        "reasoning": "目标市场规模大、年增长率高，竞品在垂直场景覆盖不足，存在差异化切入机会。",
+        "action_items": ["完成用户访谈", "制定上市计划"],
+        "risks": ["获客成本上升"],
+        "recommendations": ["AI Agent工作流自动化", "垂直行业知识助手", "企业级内容生成平台"],
+        "budget_request": 150000,
+        "timeline_days": 30,
+        "team_requirements": ["市场分析师", "内容运营"]
+    },
+    "cto": {
+        "decision": "批准",
+        "reasoning": "技术栈成熟，核心模块可复用现有组件，主要挑战在于多Agent编排的稳定性。",
+        "action_items": ["输出架构设计", "搭建MVP原型"],
+        "risks": ["模型调用成本", "系统稳定性"],
+        "recommendations": ["采用异步编排", "引入缓存与限流"],
+        "budget_request": 300000,
+        "timeline_days": 45,
+        "team_requirements": ["后端工程师", "AI工程师"]
+    },
+    "cfo": {
+        "decision": "需要更多信息",
+        "reasoning": "投资回报期约14个月，现金流可支撑，但需要更明确的收入模型和成本结构。",
+        "action_items": ["补充财务模型", "测算盈亏平衡点"],
+        "risks": ["现金流压力", "收入不及预期"],
+        "recommendations": ["设置预算闸门", "按季度评估ROI"],
+        "budget_request": 0,
+        "timeline_days": 14,
+        "team_requirements": ["财务分析师"]
+    },
+    "cpo": {
+        "decision": "批准",
+        "reasoning": "用户痛点清晰，MVP范围可控，可在六周内交付可用版本验证留存。",
+        "action_items": ["定义MVP功能清单", "设计核心流程"],
+        "risks": ["需求蔓延"],
+        "recommendations": ["聚焦单一核心场景"],
+        "budget_request": 200000,
+        "timeline_days": 42,
+        "team_requirements": ["产品经理", "设计师"]
+    },
+    "coo": {
+        "decision": "批准",
+        "reasoning": "现有运营流程可支撑新项目，需补充交付与客服人手。",
+        "action_items": ["制定执行排期", "建立周报机制"],
+        "risks": ["资源冲突"],
+        "recommendations": ["设立跨部门项目组"],
+        "budget_request": 100000,
+        "timeline_days": 30,
+        "team_requirements": ["项目经理"]
+    },
+    "chro": {
+        "decision": "批准",
+        "reasoning": "团队满意度稳定，可通过内部调配加少量招聘满足项目人力需求。",
+        "action_items": ["发布招聘需求", "安排内部转岗"],
+        "risks": ["关键岗位招聘周期长"],
+        "recommendations": ["优先内部培养"],
+        "budget_request": 80000,
+        "timeline_days": 21,
+        "team_requirements": ["HRBP"]
+    },
+    "observer": {
+        "decision": "批准",
+        "reasoning": "今日运营平稳，各项目按计划推进。",
+        "action_items": ["继续跟踪关键指标"],
+        "risks": [],
+        "recommendations": ["保持当前节奏"],
+        "budget_request": 0,
+        "timeline_days": 1,
+        "team_requirements": []
+    }
+}
+
+
+def detect_role(system_text: str) -> str:
+    """从系统提示词中识别角色"""
+    match = ROLE_PATTERN.search(system_text or "")
+    return match.group(1).lower() if match else "observer"
+
+
+class MockLLMServer:
+    """模拟LLM服务"""
+
+    def __init__(self, config: MockServerConfig = None):
+        self.config = config or MockServerConfig.from_env()
+        self.rng = random.Random(self.config.seed)
+        self._seen_prefixes: set = set()
+        self.in_flight = 0
+        self.stats = {
+            "requests": 0, "streamed": 0, "injected_500": 0, "injected_429": 0,
+            "peak_concurrency": 0, "output_tokens": 0
+        }
+
+    def build_app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post("/v1/messages", self.handle_messages)
+        app.router.add_post("/v1/chat/completions", self.handle_chat_completions)
+        app.router.add_get("/stats", self.handle_stats)
+        return app
+
+    # ============== 注入与延迟 ==============
+
+    def _sample_latency(self) -> float:
+        """按配置的分布采样首token延迟(秒)"""
+        mean, jitter = self.config.latency_ms, self.config.jitter_ms
+        dist = self.config.latency_dist
+        if dist == "fixed" or mean <= 0:
+            value = mean
+        elif dist == "uniform":
+            value = self.rng.uniform(max(0.0, mean - jitter), mean + jitter)
+        elif dist == "normal":
+            value = self.rng.gauss(mean, jitter)
+        else:
+            # 对数正态：长尾，参数使均值为 mean、标准差为 jitter
+            sigma = math.sqrt(math.log(1 + (jitter / mean) ** 2))
+            value = self.rng.lognormvariate(math.log(mean) - sigma * sigma / 2, sigma)
+        return max(0.0, value) / 1000
+
+    def _inject_failure(self) -> Optional[web.Response]:
+        """按比例注入429/500"""
+        limit = self.config.max_concurrency
+        if (limit and self.in_flight > limit) or self.rng.random() < self.config.rate_429:
+            self.stats["injected_429"] += 1
+            return web.json_response(
+                {"type": "error", "error": {"type": "rate_limit_error", "message": "mock rate limited"}},
+                status=429, headers={"Retry-After": str(self.config.retry_after)}
+            )
+        if self.rng.random() < self.config.error_rate:
+            self.stats["injected_500"] += 1
+            return web.json_response(
+                {"type": "error", "error": {"type": "api_error", "message": "mock internal error"}},
+                status=500
+            )
+        return None
+
+    def _output_delay(self, tokens: int) -> float:
+        tps = self.config.tokens_per_second
+        return tokens / tps if tps > 0 else 0.0
+
+    # ============== 内容生成 ==============
+
+    def _decision_text(self, role: str) -> str:
+        decision = dict(ROLE_DECISIONS.get(role, ROLE_DECISIONS["observer"]))
+        decision["confidence"] = round(self.rng.uniform(0.7, 0.92), 2)
+        body = json.dumps(decision, ensure_ascii=False, indent=2)
+        return f"基于我的职责，决策如下：\n```json\n{body}\n```\n以上决策可在后续会议中复核。"
+
+    def _prefix_usage(self, prefix: str, input_tokens: int) -> Tuple[int, int, int]:
+        """模拟前缀缓存：返回 (未缓存输入, cache_read, cache_write)"""
+        if not prefix:
+            return input_tokens, 0, 0
+        key = hashlib.sha256(prefix.encode("utf-8")).hexdigest()
+        prefix_tokens = min(input_tokens, estimate_tokens(prefix))
+        if key in self._seen_prefixes:
+            return input_tokens - prefix_tokens, prefix_tokens, 0
+        self._seen_prefixes.add(key)
+        return input_tokens - prefix_tokens, 0, prefix_tokens
+
+    def _enter(self):
+        self.stats["requests"] += 1
+        self.in_flight += 1
+        self.stats["peak_concurrency"] = max(self.stats["peak_concurrency"], self.in_flight)
+
+    # ============== Anthropic /v1/messages ==============
+
+    async def handle_messages(self, request: web.Request) -> web.StreamResponse:
+        self._enter()
+        try:
+            body = await request.json()
+            failure = self._inject_failure()
+            if failure is not None:
+                return failure
+
+            system = body.get("system") or ""
+            system_text = system if isinstance(system, str) else "".join(b.get("text", "") for b in system)
+            message_text = "".join(_content_text(m.get("content")) for m in body.get("messages", []))
+            text = self._decision_text(detect_role(system_text + message_text))
+            output_tokens = estimate_tokens(text)
+            uncached, cache_read, cache_write = self._prefix_usage(
+                system_text, estimate_tokens(system_text) + estimate_tokens(message_text)
+            )
+            usage = {
+                "input_tokens": uncached,
+                "output_tokens": output_tokens,
+                "cache_read_input_tokens": cache_read,
+                "cache_creation_input_tokens": cache_write
+            }
+            self.stats["output_tokens"] += output_tokens
+            model = body.get("model", "mock")
+
+            await asyncio.sleep(self._sample_latency())
+            if body.get("stream"):
+                return await self._stream_messages(request, model, text, usage)
+
+            await asyncio.sleep(self._output_delay(output_tokens))
+            return web.json_response({
+                "id": f"msg_mock_{self.stats['requests']}",
+                "type": "message",
+                "role": "assistant",
+                "model": model,
+                "content": [{"type": "text", "text": text}],
+                "stop_reason": "end_turn",
+                "usage": usage
+            })
+        finally:
+            self.in_flight -= 1
+
+    async def _stream_messages(self, request: web.Request, model: str, text: str, usage: Dict) -> web.StreamResponse:
+        self.stats["streamed"] += 1
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream", "Cache-Control": "no-cache"})
+        await response.prepare(request)
+
+        async def send(event: str, data: Dict):
+            await response.write(f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n".encode("utf-8"))
+
+        start_usage = {k: v for k, v in usage.items() if k != "output_tokens"}
+        try:
+            await send("message_start", {"type": "message_start", "message": {
+                "id": f"msg_mock_{self.stats['requests']}", "type": "message", "role": "assistant",
+                "model": model, "content": [], "usage": {**start_usage, "output_tokens": 1}
+            }})
+            await send("content_block_start", {"type": "content_block_start", "index": 0,
+                                               "content_block": {"type": "text", "text": ""}})
+            for chunk in _chunks(text, 8):
+                await send("content_block_delta", {"type": "content_block_delta", "index": 0,
+                                                   "delta": {"type": "text_delta", "text": chunk}})
+                await asyncio.sleep(self._output_delay(estimate_tokens(chunk)))
+            await send("content_block_stop", {"type": "content_block_stop", "index": 0})
+            await send("message_delta", {"type": "message_delta", "delta": {"stop_reason": "end_turn"},
+                                         "usage": {"output_tokens": usage["output_tokens"]}})
+            await send("message_stop", {"type": "message_stop"})
+        except (ConnectionResetError, asyncio.CancelledError):
+            # 客户端拿到完整决策后提前断开
+            pass
+        return response
+
+    # ============== OpenAI兼容 /v1/chat/completions ==============
+
+    async def handle_chat_completions(self, request: web.Request) -> web.StreamResponse:
+        self._enter()
+        try:
+            body = await request.json()
+            failure = self._inject_failure()
+            if failure is not None:
+                return failure
+
+            messages = body.get("messages", [])
+            system_text = "".join(_content_text(m.get("content")) for m in messages if m.get("role") == "system")
+            all_text = "".join(_content_text(m.get("content")) for m in messages)
+            text = self._decision_text(detect_role(all_text))
+            output_tokens = estimate_tokens(text)
+            input_tokens = estimate_tokens(all_text)
+            _, cache_read, _ = self._prefix_usage(system_text, input_tokens)
+            usage = {
+                "prompt_tokens": input_tokens,
+                "completion_tokens": output_tokens,
+                "total_tokens": input_tokens + output_tokens,
+                "cached_tokens": cache_read
+            }
+            self.stats["output_tokens"] += output_tokens
+            model = body.get("model", "mock")
+            completion_id = f"chatcmpl-mock-{self.stats['requests']}"
+
+            await asyncio.sleep(self._sample_latency())
+            if body.get("stream"):
+                return await self._stream_chat(request, completion_id, model, text, usage)
+
+            await asyncio.sleep(self._output_delay(output_tokens))
+            return web.json_response({
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": text},
+                             "finish_reason": "stop"}],
+                "usage": usage
+            })
+        finally:
+            self.in_flight -= 1
+
+    async def _stream_chat(self, request: web.Request, completion_id: str, model: str,
+                           text: str, usage: Dict) -> web.StreamResponse:
+        self.stats["streamed"] += 1
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream", "Cache-Control": "no-cache"})
+        await response.prepare(request)
+        try:
+            for chunk in _chunks(text, 8):
+                data = {"id": completion_id, "object": "chat.completion.chunk", "model": model,
+                        "choices": [{"index": 0, "delta": {"content": chunk}, "finish_reason": None}]}
+                await response.write(f"data: {json.dumps(data, ensure_ascii=False)}\n\n".encode("utf-8"))
+                await asyncio.sleep(self._output_delay(estimate_tokens(chunk)))
+            final = {"id": completion_id, "object": "chat.completion.chunk", "model": model,
+                     "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}], "usage": usage}
+            await response.write(f"data: {json.dumps(final, ensure_ascii=False)}\n\ndata: [DONE]\n\n".encode("utf-8"))
+        except (ConnectionResetError, asyncio.CancelledError):
+            pass
+        return response
+
+    async def handle_stats(self, request: web.Request) -> web.Response:
+        return web.json_response({**self.stats, "in_flight": self.in_flight, "config": asdict(self.config)})
+
+
+def _content_text(content) -> str:
+    """消息内容可能是字符串或内容块列表"""
+    if isinstance(content, str):
+        return content
+    if isinstance(content, list):
+        return "".join(block.get("text", "") for block in content if isinstance(block, dict))
+    return ""
+
+
+def _chunks(text: str, size: int) -> List[str]:
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+
+async def start_mock_server(config: MockServerConfig = None) -> Tuple[MockLLMServer, web.AppRunner]:
+    """在当前事件循环中启动模拟服务（供压测脚本内嵌使用），结束时调用 runner.cleanup()"""
+    server = MockLLMServer(config)
+    runner = web.AppRunner(server.build_app())
+    await runner.setup()
+    await web.TCPSite(runner, server.config.host, server.config.port).start()
+    return server, runner
+
+
+def main():
+    defaults = MockServerConfig.from_env()
+    parser = argparse.ArgumentParser(description="本地模拟 Anthropic / Moonshot 兼容LLM服务")
+    parser.add_argument("--host", default=defaults.host)
+    parser.add_argument("--port", type=int, default=defaults.port)
+    parser.add_argument("--latency-ms", type=float, default=defaults.latency_ms, help="首token前平均延迟")
+    parser.add_argument("--jitter-ms", type=float, default=defaults.jitter_ms, help="延迟离散程度")
+    parser.add_argument("--latency-dist", default=defaults.latency_dist,
+                        choices=["fixed", "uniform", "normal", "lognormal"])
+    parser.add_argument("--tps", type=float, default=defaults.tokens_per_second, help="输出token/秒")
+    parser.add_argument("--error-rate", type=float, default=defaults.error_rate, help="500错误比例")
+    parser.add_argument("--rate-429", type=float, default=defaults.rate_429, help="429比例")
+    parser.add_argument("--retry-after", type=float, default=defaults.retry_after)
+    parser.add_argument("--max-concurrency", type=int, default=defaults.max_concurrency)
+    parser.add_argument("--seed", type=int, default=defaults.seed)
+    args = parser.parse_args()
+
+    config = MockServerConfig(
+        host=args.host, port=args.port, latency_ms=args.latency_ms, jitter_ms=args.jitter_ms,
+        latency_dist=args.latency_dist, tokens_per_second=args.tps, error_rate=args.error_rate,
+        rate_429=args.rate_429, retry_after=args.retry_after, max_concurrency=args.max_concurrency,
+        seed=args.seed
+    )
+    server = MockLLMServer(config)
+    print(f"🧪 Mock LLM Server: http://{config.host}:{config.port}")
+    print(f"   /v1/messages (Anthropic) | /v1/chat/completions (Moonshot/OpenAI) | /stats")
+    print(f"   延迟 {config.latency_ms:.0f}±{config.jitter_ms:.0f}ms ({config.latency_dist}) | "
+          f"{config.tokens_per_second:.0f} tok/s | 500 {config.error_rate:.0%} | 429 {config.rate_429:.0%}")
+    web.run_app(server.build_app(), host=config.host, port=config.port, print=None)
+
+
+if __name__ == "__main__":
+    main()
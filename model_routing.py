@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Model Routing - 按步骤类型选择模型档位
+路由表按 step_kind / Agent / 优先级类别（与 scheduler 相同）把每次调用映射到一个档位，
+档位决定 model、max_tokens、temperature；例行步骤走快速小模型，战略决策走大模型。
+小模型决策的 confidence 低于阈值时可升级到更大的档位重新决策
+（升级档位解析出的模型与当前相同时不升级，只换 max_tokens / temperature 不值得再调用一次）
+
+路由表由公司系统在 _init_policies 旁配置，规则按顺序匹配，第一条命中的规则生效:
+    {
+        "tiers": {"fast": {"model": "...", "max_tokens": 1200, "temperature": 0.3}, ...},
+        "rules": [{"priority": "CRITICAL", "tier": "large"}, {"step_kind": ["market_scan"], "tier": "fast"}],
+        "default_tier": "standard",
+        "escalation": {"enabled": True, "confidence_below": 0.6, "to": "large"}
+    }
+"""
+
+import os
+from collections import Counter
+from dataclasses import dataclass, field, replace
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from scheduler import PRIORITY_CLASSES, resolve_priority
+
+# 不升级的决策（上游不可用时的降级决策，换模型也无济于事）
+NO_ESCALATION_MODES = ("fallback", "circuit_open")
+
+
+def tier_models_from_env() -> Dict[str, Optional[str]]:
+    """
+    各档位使用的模型（NEXUS_MODEL_FAST / NEXUS_MODEL_STANDARD / NEXUS_MODEL_LARGE），
+    未设置时沿用Agent自身配置的模型，只调整 max_tokens / temperature
+    """
+    return {
+        "fast": os.getenv("NEXUS_MODEL_FAST") or None,
+        "standard": os.getenv("NEXUS_MODEL_STANDARD") or None,
+        "large": os.getenv("NEXUS_MODEL_LARGE") or None,
+    }
+
+
+@dataclass
+class ModelTier:
+    """模型档位（None 表示沿用Agent配置）"""
+    model: Optional[str] = None
+    max_tokens: Optional[int] = None
+    temperature: Optional[float] = None
+    models: Dict[str, str] = field(default_factory=dict)   # 按供应商指定模型，优先于 model
+
+    def apply(self, config):
+        """返回按档位调整后的Agent配置副本"""
+        changes: Dict[str, Any] = {}
+        model = self.models.get(config.provider, self.model)
+        if model:
+            changes["model"] = model
+        if self.max_tokens is not None:
+            changes["max_tokens"] = self.max_tokens
+        if self.temperature is not None:
+            changes["temperature"] = self.temperature
+        return replace(config, **changes) if changes else config
+
+
+class ModelRoutingTable:
+    """模型路由表"""
+
+    def __init__(self, tiers: Dict[str, ModelTier], rules: List[Dict] = None, default_tier: str = "standard",
+                 escalation: Dict = None):
+        self.tiers = tiers
+        self.rules = rules or []
+        self.default_tier = default_tier
+        escalation = escalation or {}
+        self.escalate_enabled = bool(escalation.get("enabled", False))
+        self.escalate_below = float(escalation.get("confidence_below", 0.6))
+        self.escalate_to = escalation.get("to", "large")
+        self.calls: Counter = Counter()
+        self.escalations: Counter = Counter()
+
+    @classmethod
+    def from_policy(cls, policy: Dict) -> "ModelRoutingTable":
+        """从公司策略中的 model_routing 配置创建"""
+        tiers = {name: ModelTier(**spec) for name, spec in policy.get("tiers", {}).items()}
+        return cls(
+            tiers=tiers,
+            rules=policy.get("rules", []),
+            default_tier=policy.get("default_tier", "standard"),
+            escalation=policy.get("escalation")
+        )
+
+    def resolve(self, step_kind: Optional[str] = None, agent_id: Optional[str] = None, priority: Any = None) -> str:
+        """按规则顺序匹配档位（规则中的 step_kind / agent / priority 均需命中）"""
+        level = PRIORITY_CLASSES[resolve_priority(priority, step_kind)]
+        for rule in self.rules:
+            if not _matches(rule.get("step_kind"), step_kind):
+                continue
+            if not _matches(rule.get("agent"), agent_id):
+                continue
+            if not _matches(rule.get("priority"), level):
+                continue
+            return rule["tier"]
+        return self.default_tier
+
+    def apply(self, config, tier: str):
+        """按档位调整Agent配置"""
+        spec = self.tiers.get(tier)
+        return spec.apply(config) if spec else config
+
+    def model_for(self, tier: str, config=None) -> Optional[str]:
+        """档位实际使用的模型（档位未指定时为Agent配置的模型，未传入配置时为None）"""
+        spec = self.tiers.get(tier)
+        model = spec.models.get(getattr(config, "provider", None), spec.model) if spec else None
+        return model or getattr(config, "model", None)
+
+    def escalation_for(self, tier: str, decision: Dict, config=None) -> Optional[str]:
+        """置信度低于阈值且升级档位换用不同模型时返回升级档位，否则None"""
+        if not self.escalate_enabled or tier == self.escalate_to or self.escalate_to not in self.tiers:
+            return None
+        if self.model_for(tier, config) == self.model_for(self.escalate_to, config):
+            return None
+        if decision.get("mode") in NO_ESCALATION_MODES:
+            return None
+        try:
+            confidence = float(decision.get("confidence", 1.0))
+        except (TypeError, ValueError):
+            return None
+        return self.escalate_to if confidence < self.escalate_below else None
+
+    async def think(self, call: Callable[[str], Awaitable[Dict]], tier: str, config=None) -> Dict:
+        """
+        按档位调用，低置信度时升级重试
+
+        Args:
+            call: 按档位发起一次决策的协程函数 call(tier) -> decision
+            tier: resolve() 得到的初始档位
+            config: Agent配置（用于判断升级档位是否换用不同模型）
+        """
+        self.calls[tier] += 1
+        decision = await call(tier)
+        target = self.escalation_for(tier, decision, config)
+        if target is None:
+            decision.setdefault("model_tier", tier)
+            return decision
+
+        self.calls[target] += 1
+        self.escalations[f"{tier}->{target}"] += 1
+        escalated = await call(target)
+        escalated["model_tier"] = target
+        escalated["escalated_from"] = {"tier": tier, "confidence": decision.get("confidence")}
+        return escalated
+
+    def get_stats(self) -> Dict:
+        """各档位调用次数与升级次数"""
+        total = sum(self.calls.values())
+        escalated = sum(self.escalations.values())
+        return {
+            "calls": dict(self.calls),
+            "escalations": dict(self.escalations),
+            "escalation_rate": escalated / max(1, total - escalated)
+        }
+
+
+def _matches(expected: Any, value: Optional[str]) -> bool:
+    if expected is None:
+        return True
+    if isinstance(expected, (list, tuple, set)):
+        return value in expected
+    return value == expected
@@ -14,6 +14,9 @@ from dataclasses import dataclass
 
 from advanced_company_v3 import AdvancedCompanySystem, Project, ProjectPhase
 from kimi_coding_runner import KimiCodingRunner, KimiCodingConfig
+from http_pool import close_pool
+from rate_limiter import get_rate_limiter
+from resilience import get_resilience
 
 
 @dataclass
@@ -123,12 +126,22 @@ class MultiAPICompanySystem(AdvancedCompanySystem):
         # 创建Kimi配置
         kim_config = self._create_kimi_config(api_config)
         
+        runner = KimiCodingRunner(kim_config)
+        if runner.circuit_open():
+            # 端点熔断期间不发起请求，直接走模拟模式
+            return self._simulated_decision(agent_id, task)
+        
         try:
-            async with KimiCodingRunner(kim_config) as runner:
+            async with runner:
                 result = await runner.think(task, context)
+                if result.get("mode") == "circuit_open":
+                    return self._simulated_decision(agent_id, task)
                 
                 # 更新统计
                 self.api_stats["calls_by_agent"][agent_id] += 1
+                record = runner.last_call_record
+                if record:
+                    self.api_stats["tokens_by_agent"][agent_id] += record.input_tokens + record.output_tokens
                 
                 return result
                 
@@ -137,6 +150,10 @@ class MultiAPICompanySystem(AdvancedCompanySystem):
             self.api_stats["errors_by_agent"][agent_id] += 1
             return self._simulated_decision(agent_id, task)
     
+    def get_rate_limit_status(self) -> Dict[str, Dict]:
+        """各API Key / base_url 的限流窗口与排队深度"""
+        return get_rate_limiter().snapshot()
+    
     def _create_kimi_config(self, api_config: AgentAPIConfig) -> KimiCodingConfig:
         """创建Kimi配置"""
         
@@ -280,6 +297,22 @@ class MultiAPICompanySystem(AdvancedCompanySystem):
             mode = "🤖 AI" if config.enabled else "📟 模拟"
             print(f"   {mode} {config.name}: {count}次调用" + (f" ({errors}错误)" if errors else ""))
         
+        limits = self.get_rate_limit_status()
+        if limits:
+            print("\n🚦 限流状态:")
+            for label, state in limits.items():
+                print(f"   {label}: 窗口 {state['window']} | 排队 {state['queue_depth']} | "
+                      f"429 {state['throttled']}次 | 5xx {state['server_errors']}次")
+        
+        resilience = get_resilience().get_stats()
+        if resilience["calls"]:
+            print("\n🛡️ 容错:")
+            print(f"   重试 {resilience['retries']}次 | 对冲 {resilience['hedges']}次 "
+                  f"(胜出 {resilience['hedge_wins']}) | 失败 {resilience['failures']}次")
+            for endpoint, breaker in resilience["breakers"].items():
+                print(f"   {endpoint}: {breaker['state']} | 熔断 {breaker['opened']}次 | "
+                      f"短路 {breaker['short_circuited']}次")
+        
         print(f"\n💰 财务:")
         print(f"   项目数: {len(self.projects)}")
         print(f"   现金流: ¥{self.financials['cash_flow']:,.0f}")
@@ -343,6 +376,8 @@ async def main():
         print(f"\n❌ 错误: {e}")
         import traceback
         traceback.print_exc()
+    finally:
+        await close_pool()
 
 
 if __name__ == "__main__":
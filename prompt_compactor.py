@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Prompt Compactor - 上下文压缩
+紧凑序列化 + 按步骤类型的字段白名单 + 长字符串截断 + 按token预算收紧，
+并统计每次调用节省的输入token
+"""
+
+import os
+import json
+from typing import Any, Dict, Optional, Tuple
+from dataclasses import dataclass, field
+
+from rate_limiter import estimate_tokens
+
+
+# 嵌入上下文的Agent决策只保留这些字段（raw_response、mode等不进入下游提示词）
+DEFAULT_DECISION_FIELDS: Tuple[str, ...] = (
+    "decision", "confidence", "reasoning", "risks", "budget_request", "timeline_days"
+)
+
+# 各步骤类型的决策字段白名单
+DEFAULT_STEP_KIND_FIELDS: Dict[str, Tuple[str, ...]] = {
+    "market_scan": ("decision", "confidence", "recommendations"),
+    "market_analysis": ("decision", "confidence", "reasoning", "recommendations"),
+    "strategic_decision": DEFAULT_DECISION_FIELDS + ("recommendations",),
+    "final_approval": ("decision", "confidence", "budget_request", "timeline_days", "risks"),
+}
+
+# 任何层级都丢弃的字段
+DROP_KEYS = {"raw_response", "mode", "timestamp", "stream_metrics"}
+
+
+@dataclass
+class CompactorConfig:
+    """压缩配置"""
+    enabled: bool = True
+    max_input_tokens: int = 6000     # 单次调用输入token预算（提示词整体）
+    max_string_chars: int = 300      # 字符串截断长度
+    max_list_items: int = 5          # 列表最多保留项数
+    min_string_chars: int = 40       # 按预算收紧时的下限
+    step_kind_fields: Dict[str, Tuple[str, ...]] = field(default_factory=lambda: dict(DEFAULT_STEP_KIND_FIELDS))
+
+    @classmethod
+    def from_env(cls) -> "CompactorConfig":
+        """从环境变量读取配置"""
+        config = cls()
+        config.enabled = os.getenv("NEXUS_PROMPT_COMPACT", "1").lower() not in ("0", "false", "no")
+        config.max_input_tokens = int(os.getenv("NEXUS_PROMPT_BUDGET", config.max_input_tokens))
+        config.max_string_chars = int(os.getenv("NEXUS_PROMPT_MAX_STR", config.max_string_chars))
+        return config
+
+
+@dataclass
+class CompactResult:
+    """一次压缩的结果"""
+    text: str
+    original_tokens: int   # 原 indent=2 序列化的估算token
+    tokens: int            # 压缩后估算token
+    truncated: bool = False
+
+    @property
+    def saved(self) -> int:
+        return max(0, self.original_tokens - self.tokens)
+
+
+class PromptCompactor:
+    """上下文压缩器"""
+
+    def __init__(self, config: CompactorConfig = None):
+        self.config = config or CompactorConfig.from_env()
+        self.stats = {"calls": 0, "original_tokens": 0, "tokens": 0, "over_budget": 0}
+
+    def compact(self, context: Dict, step_kind: Optional[str] = None, reserved_tokens: int = 0) -> CompactResult:
+        """
+        压缩上下文
+
+        Args:
+            context: 上下文字典
+            step_kind: 步骤类型（决定决策字段白名单）
+            reserved_tokens: 提示词其余部分已占用的token，预算 = max_input_tokens - reserved_tokens
+        """
+        original = json.dumps(context, ensure_ascii=False, indent=2, default=str)
+        original_tokens = estimate_tokens(original)
+
+        if not self.config.enabled:
+            return self._record(CompactResult(original, original_tokens, original_tokens))
+
+        budget = max(0, self.config.max_input_tokens - reserved_tokens)
+        fields = self.config.step_kind_fields.get(step_kind, DEFAULT_DECISION_FIELDS)
+        max_chars, max_items = self.config.max_string_chars, self.config.max_list_items
+
+        # 逐步收紧截断长度和列表长度，直到满足预算
+        while True:
+            pruned = self._prune(context, fields, max_chars, max_items)
+            text = json.dumps(pruned, ensure_ascii=False, separators=(",", ":"), default=str)
+            tokens = estimate_tokens(text)
+            if tokens <= budget or (max_chars <= self.config.min_string_chars and max_items <= 1):
+                break
+            max_chars = max(self.config.min_string_chars, max_chars // 2)
+            max_items = max(1, max_items // 2)
+
+        truncated = False
+        if tokens > budget:
+            # 仍超预算：按比例截断序列化文本
+            self.stats["over_budget"] += 1
+            keep = max(0, int(len(text) * budget / tokens) - 1)
+            text = text[:keep] + "…"
+            tokens = estimate_tokens(text)
+            truncated = True
+
+        return self._record(CompactResult(text, original_tokens, tokens, truncated))
+
+    def _record(self, result: CompactResult) -> CompactResult:
+        self.stats["calls"] += 1
+        self.stats["original_tokens"] += result.original_tokens
+        self.stats["tokens"] += result.tokens
+        return result
+
+    def _prune(self, value: Any, fields: Tuple[str, ...], max_chars: int, max_items: int) -> Any:
+        """递归应用白名单、截断字符串和列表"""
+        if isinstance(value, str):
+            return value if len(value) <= max_chars else value[:max_chars] + "…"
+        if isinstance(value, dict):
+            if _is_decision(value):
+                value = {k: value[k] for k in fields if k in value}
+            return {
+                k: self._prune(v, fields, max_chars, max_items)
+                for k, v in value.items() if k not in DROP_KEYS
+            }
+        if isinstance(value, (list, tuple)):
+            items = [self._prune(v, fields, max_chars, max_items) for v in value[:max_items]]
+            if len(value) > max_items:
+                items.append(f"…(+{len(value) - max_items})")
+            return items
+        return value
+
+    def get_stats(self) -> Dict:
+        """压缩统计"""
+        saved = self.stats["original_tokens"] - self.stats["tokens"]
+        return {
+            **self.stats,
+            "saved_tokens": saved,
+            "saved_ratio": saved / self.stats["original_tokens"] if self.stats["original_tokens"] else 0.0
+        }
+
+
+def _is_decision(value: Dict) -> bool:
+    """是否为Agent决策字典"""
+    return "decision" in value and "confidence" in value
+
+
+# ============== 全局单例 ==============
+
+_compactor: Optional[PromptCompactor] = None
+
+
+def get_prompt_compactor() -> PromptCompactor:
+    """获取进程级上下文压缩器（NEXUS_PROMPT_COMPACT=0 可关闭）"""
+    global _compactor
+    if _compactor is None:
+        _compactor = PromptCompactor()
+    return _compactor
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Quorum Gather - 法定人数/截止时间收集并行评估
+k/n 个评估到齐或截止时间已过即返回，不再等待最慢的Agent；
+迟到的评估按策略取消，或在到达后作为事后输入记录到决策上
+"""
+
+import os
+import time
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+from dataclasses import dataclass, field
+
+
+@dataclass
+class QuorumPolicy:
+    """法定人数策略（默认等待全部评估，与原 asyncio.gather 行为一致）"""
+    quorum: Optional[int] = None       # 到齐k个即决策，None表示全部
+    deadline: Optional[float] = None   # 截止秒数，None表示不限（至少等到一个评估）
+    late: str = "record"               # record: 迟到评估事后记录；cancel: 取消迟到评估
+
+    @classmethod
+    def from_env(cls) -> "QuorumPolicy":
+        """从环境变量读取配置"""
+        quorum = os.getenv("NEXUS_EVAL_QUORUM")
+        deadline = os.getenv("NEXUS_EVAL_DEADLINE")
+        return cls(
+            quorum=int(quorum) if quorum else None,
+            deadline=float(deadline) if deadline else None,
+            late=os.getenv("NEXUS_EVAL_LATE", "record").lower()
+        )
+
+
+@dataclass
+class QuorumResult:
+    """一次收集的结果"""
+    results: Dict[str, Any]                     # 按提交顺序，决策时已到达的评估
+    missing: List[str]                          # 决策时未到达的评估
+    failed: Dict[str, str] = field(default_factory=dict)
+    late: Dict[str, Any] = field(default_factory=dict)   # 决策后到达的评估（late=record）
+    reason: str = "all"                         # all / quorum / deadline
+    elapsed: float = 0.0
+
+    def inputs(self) -> Dict:
+        """决策依据说明，附在决策上"""
+        return {
+            "used": list(self.results),
+            "missing": list(self.missing),
+            "failed": dict(self.failed),
+            "late": self.late,   # 同一字典，迟到评估到达后自动出现
+            "reason": self.reason,
+            "elapsed_ms": round(self.elapsed * 1000, 1)
+        }
+
+
+async def gather_quorum(evaluations: Dict[str, Awaitable], policy: QuorumPolicy = None,
+                        on_late: Callable[[str, Any], None] = None) -> QuorumResult:
+    """
+    并行执行评估，满足法定人数或截止时间后返回
+
+    Args:
+        evaluations: {agent_id: 评估协程}
+        policy: 法定人数策略，默认读取 NEXUS_EVAL_QUORUM / NEXUS_EVAL_DEADLINE / NEXUS_EVAL_LATE
+        on_late: 迟到评估到达时的回调 (agent_id, 评估)
+    """
+    policy = policy or QuorumPolicy.from_env()
+    started = time.monotonic()
+    tasks = {asyncio.ensure_future(coro): agent_id for agent_id, coro in evaluations.items()}
+    needed = min(policy.quorum or len(tasks), len(tasks))
+    arrived: Dict[str, Any] = {}
+    failed: Dict[str, str] = {}
+    pending = set(tasks)
+    reason = "all"
+
+    while pending:
+        if len(arrived) >= needed:
+            reason = "quorum"
+            break
+        timeout = None
+        if policy.deadline is not None and arrived:
+            timeout = policy.deadline - (time.monotonic() - started)
+            if timeout <= 0:
+                reason = "deadline"
+                break
+        done, pending = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            agent_id = tasks[task]
+            if task.exception() is not None:
+                failed[agent_id] = str(task.exception())
+            else:
+                arrived[agent_id] = task.result()
+
+    result = QuorumResult(
+        results={agent_id: arrived[agent_id] for agent_id in evaluations if agent_id in arrived},
+        missing=[tasks[task] for task in tasks if task in pending],
+        failed=failed,
+        reason=reason,
+        elapsed=time.monotonic() - started
+    )
+
+    for task in pending:
+        if policy.late == "cancel":
+            task.cancel()
+        else:
+            task.add_done_callback(lambda t, agent_id=tasks[task]: _record_late(result, agent_id, t, on_late))
+    return result
+
+
+def _record_late(result: QuorumResult, agent_id: str, task: asyncio.Future, on_late: Optional[Callable]):
+    """迟到评估到达后记录"""
+    if task.cancelled() or task.exception() is not None:
+        return
+    result.late[agent_id] = task.result()
+    if on_late:
+        on_late(agent_id, task.result())
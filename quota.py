@@ -0,0 +1,266 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Quota Gates - 滑动窗口配额计数
+按 step_kind 维护分桶滑动窗口计数（hourly / daily），提案检查为 O(1)，不再扫描全部历史步骤。
+步骤开始执行时计入窗口；提案通过检查时为其步骤预留名额，并发提案不会重复放行。
+设置数据库时计数按桶写入SQLite，重启后配额依然有效
+
+    NEXUS_QUOTA_DB=data/quotas.db python3 closed_loop_company.py
+    NEXUS_STATE_DB=data/state.db python3 closed_loop_company.py    # 未设置 NEXUS_QUOTA_DB 时与状态存储共用数据库
+    默认均不设置，即仅内存计数（与状态存储一致，每次运行重新计数）
+
+配额配置沿用公司策略中的 cap_gates，同一步骤类型可同时设置多个窗口:
+    "cap_gates": {
+        "market_scan": {"limit": 10, "window": "daily"},
+        "tweet_post": [{"limit": 2, "window": "hourly"}, {"limit": 8, "window": "daily"}]
+    }
+"""
+
+import os
+import time
+import sqlite3
+import threading
+from collections import Counter, deque
+from typing import Deque, Dict, List, Optional, Tuple, Union
+from dataclasses import dataclass
+
+
+WINDOW_SECONDS = {
+    "hourly": 3600,
+    "daily": 86400,
+}
+
+
+@dataclass
+class QuotaConfig:
+    """配额计数配置"""
+    buckets: int = 60                           # 每个窗口的桶数（计数精度 = 窗口 / 桶数）
+    db_path: Optional[str] = None               # SQLite路径，None表示仅内存（默认）
+
+    @classmethod
+    def from_env(cls) -> "QuotaConfig":
+        """从环境变量读取配置"""
+        return cls(
+            buckets=int(os.getenv("NEXUS_QUOTA_BUCKETS", "60")),
+            db_path=os.getenv("NEXUS_QUOTA_DB") or os.getenv("NEXUS_STATE_DB") or None
+        )
+
+
+def window_seconds(window: Union[str, int, float]) -> int:
+    """窗口名称（hourly / daily）或秒数"""
+    if isinstance(window, (int, float)):
+        return int(window)
+    return WINDOW_SECONDS.get(window, WINDOW_SECONDS["hourly"])
+
+
+class SlidingWindowCounter:
+    """
+    分桶滑动窗口计数
+    记录按时间落入宽度为 window/buckets 的桶，桶整体滑出窗口后才扣除，
+    计数可能比精确值多保留不到一个桶宽的记录，只会偏严不会超发
+    """
+
+    def __init__(self, window: int, buckets: int = 60):
+        self.window = window
+        self.width = max(1, window // max(1, buckets))
+        self._buckets: Deque[List[int]] = deque()   # [桶序号, 计数]
+        self.total = 0
+
+    def bucket_of(self, ts: float) -> int:
+        return int(ts // self.width)
+
+    def add(self, ts: float, n: int = 1):
+        """计入 n 次（时间早于最新桶时并入最新桶）"""
+        index = self.bucket_of(ts)
+        if self._buckets and self._buckets[-1][0] >= index:
+            self._buckets[-1][1] += n
+        else:
+            self._buckets.append([index, n])
+        self.total += n
+
+    def count(self, now: float) -> int:
+        """窗口内的计数"""
+        self._expire(now)
+        return self.total
+
+    def _expire(self, now: float):
+        horizon = now - self.window
+        while self._buckets and (self._buckets[0][0] + 1) * self.width <= horizon:
+            self.total -= self._buckets.popleft()[1]
+
+    def oldest_live_bucket(self, now: float) -> int:
+        """仍在窗口内的最早桶序号"""
+        return self.bucket_of(now - self.window)
+
+
+@dataclass
+class QuotaRule:
+    """一个步骤类型在一个窗口上的配额"""
+    step_kind: str
+    limit: int
+    window: str
+    counter: SlidingWindowCounter
+
+
+class QuotaGates:
+    """
+    按 step_kind 的配额闸门
+    admit() 在提案阶段检查并预留名额，步骤开始时 consume() 把预留转为窗口计数，
+    步骤未执行（提案未获批、依赖失败被取消）时 release() 归还预留
+    """
+
+    def __init__(self, gates: Dict[str, Union[Dict, List[Dict]]], config: QuotaConfig = None):
+        self.config = config or QuotaConfig.from_env()
+        self.rules: Dict[str, List[QuotaRule]] = {}
+        for step_kind, specs in gates.items():
+            for spec in specs if isinstance(specs, list) else [specs]:
+                seconds = window_seconds(spec["window"])
+                self.rules.setdefault(step_kind, []).append(QuotaRule(
+                    step_kind=step_kind,
+                    limit=int(spec["limit"]),
+                    window=spec["window"],
+                    counter=SlidingWindowCounter(seconds, self.config.buckets)
+                ))
+        self.reserved: Counter = Counter()
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+        self.stats = {
+            "admitted": 0,
+            "rejected": 0,
+            "consumed": 0,
+            "released": 0
+        }
+
+        if self.config.db_path and self.rules:
+            self._init_db(self.config.db_path)
+
+    def _init_db(self, db_path: str):
+        """初始化计数表并恢复窗口内的计数"""
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._db = sqlite3.connect(db_path, check_same_thread=False)
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS quota_buckets (
+                step_kind TEXT NOT NULL,
+                width INTEGER NOT NULL,
+                bucket INTEGER NOT NULL,
+                count INTEGER NOT NULL,
+                PRIMARY KEY (step_kind, width, bucket)
+            )
+        """)
+        now = time.time()
+        for step_kind, rules in self.rules.items():
+            for rule in rules:
+                counter = rule.counter
+                rows = self._db.execute(
+                    "SELECT bucket, count FROM quota_buckets WHERE step_kind = ? AND width = ? AND bucket >= ? "
+                    "ORDER BY bucket",
+                    (step_kind, counter.width, counter.oldest_live_bucket(now))
+                ).fetchall()
+                for bucket, count in rows:
+                    counter.add(bucket * counter.width, count)
+        # 清理已滑出最长窗口的桶
+        longest = max(rule.counter.window for rules in self.rules.values() for rule in rules)
+        self._db.execute("DELETE FROM quota_buckets WHERE (bucket + 1) * width <= ?", (now - longest,))
+        self._db.commit()
+
+    # ============== Admit / Consume / Release ==============
+
+    def check(self, step_kind: str, n: int = 1, now: float = None) -> Dict:
+        """检查一个步骤类型能否再执行 n 次（含已预留的名额），不预留"""
+        rules = self.rules.get(step_kind)
+        if not rules:
+            return {"ok": True}
+        now = time.time() if now is None else now
+        result = {"ok": True}
+        for rule in rules:
+            current = rule.counter.count(now) + self.reserved[step_kind]
+            if current + n > rule.limit:
+                return {
+                    "ok": False,
+                    "current": current,
+                    "limit": rule.limit,
+                    "window": rule.window,
+                    "reason": f"{step_kind} quota reached ({current}/{rule.limit} in {rule.window})"
+                }
+            result = {"ok": True, "current": current, "limit": rule.limit, "window": rule.window}
+        return result
+
+    def admit(self, step_kinds: List[str]) -> Tuple[bool, Dict[str, Dict]]:
+        """
+        提案检查：全部步骤类型都有名额时一次性预留，否则不预留
+
+        Returns:
+            (是否通过, {step_kind: 检查结果})，检查在第一个不通过的步骤类型处停止
+        """
+        needed = Counter(step_kinds)
+        results: Dict[str, Dict] = {}
+        with self._lock:
+            now = time.time()
+            for step_kind in dict.fromkeys(step_kinds):
+                result = self.check(step_kind, needed[step_kind], now)
+                results[step_kind] = result
+                if not result["ok"]:
+                    self.stats["rejected"] += 1
+                    return False, results
+            for step_kind, n in needed.items():
+                if step_kind in self.rules:
+                    self.reserved[step_kind] += n
+            self.stats["admitted"] += 1
+        return True, results
+
+    def consume(self, step_kind: str, ts: float = None):
+        """步骤开始执行：预留名额转为窗口计数"""
+        rules = self.rules.get(step_kind)
+        if not rules:
+            return
+        ts = time.time() if ts is None else ts
+        with self._lock:
+            if self.reserved[step_kind] > 0:
+                self.reserved[step_kind] -= 1
+            for rule in rules:
+                rule.counter.add(ts)
+                if self._db:
+                    self._db.execute(
+                        "INSERT INTO quota_buckets (step_kind, width, bucket, count) VALUES (?, ?, ?, 1) "
+                        "ON CONFLICT(step_kind, width, bucket) DO UPDATE SET count = count + 1",
+                        (step_kind, rule.counter.width, rule.counter.bucket_of(ts))
+                    )
+            if self._db:
+                self._db.commit()
+            self.stats["consumed"] += 1
+
+    def release(self, step_kinds: Union[str, List[str]]):
+        """归还未执行步骤的预留名额"""
+        if isinstance(step_kinds, str):
+            step_kinds = [step_kinds]
+        with self._lock:
+            for step_kind in step_kinds:
+                if step_kind in self.rules and self.reserved[step_kind] > 0:
+                    self.reserved[step_kind] -= 1
+                    self.stats["released"] += 1
+
+    # ============== Stats ==============
+
+    def usage(self) -> Dict[str, Dict]:
+        """各配额的当前用量 {step_kind: {window: (已用, 预留, 上限)}}"""
+        now = time.time()
+        with self._lock:
+            return {
+                step_kind: {
+                    rule.window: (rule.counter.count(now), self.reserved[step_kind], rule.limit)
+                    for rule in rules
+                }
+                for step_kind, rules in self.rules.items()
+            }
+
+    def get_stats(self) -> Dict:
+        """配额统计"""
+        return {**self.stats, "usage": self.usage()}
+
+    def close(self):
+        if self._db:
+            self._db.close()
+            self._db = None
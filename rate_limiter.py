@@ -0,0 +1,296 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Adaptive Rate Limiter - 自适应限流与并发控制
+按 API Key 和 base_url 两级令牌桶（请求/分钟 + token/分钟），
+并发窗口采用AIMD：成功时加性增长，429/5xx时乘性退避，并遵守Retry-After
+"""
+
+import os
+import time
+import hashlib
+import asyncio
+from contextlib import asynccontextmanager
+from typing import Dict, List, Optional, Tuple
+from dataclasses import dataclass
+
+
+class APIStatusError(Exception):
+    """API返回非200状态"""
+
+    def __init__(self, status: int, message: str, retry_after: Optional[float] = None):
+        super().__init__(f"API Error {status}: {message}")
+        self.status = status
+        self.retry_after = retry_after
+
+    @property
+    def overloaded(self) -> bool:
+        """是否为过载信号（429/5xx）"""
+        return self.status == 429 or self.status >= 500
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """解析Retry-After头（仅支持秒数格式）"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        return None
+
+
+def estimate_tokens(text: str) -> int:
+    """粗略估算token数：CJK字符约1 token/字，其他约4字符/token"""
+    if not text:
+        return 0
+    cjk = sum(1 for ch in text if "一" <= ch <= "鿿")
+    return cjk + (len(text) - cjk) // 4 + 1
+
+
+def key_fingerprint(api_key: str) -> str:
+    """API Key 的非敏感标识（短哈希 + 末4位），同前缀的Key（如 sk-kimi-）也能区分"""
+    if not api_key:
+        return "none"
+    digest = hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:8]
+    return f"{digest}…{api_key[-4:]}"
+
+
+@dataclass
+class RateLimitConfig:
+    """限流配置"""
+    requests_per_minute: int = 60
+    tokens_per_minute: int = 200000
+    initial_window: float = 4.0      # 初始并发窗口
+    min_window: float = 1.0
+    max_window: float = 16.0
+    decrease_factor: float = 0.5     # 过载时窗口乘性收缩
+    decrease_cooldown: float = 1.0   # 两次收缩的最小间隔(秒)，避免同一波429反复收缩
+
+    @classmethod
+    def from_env(cls, prefix: str, **defaults) -> "RateLimitConfig":
+        """从环境变量读取配置，如 NEXUS_KEY_RPM / NEXUS_HOST_RPM"""
+        config = cls(**defaults)
+        config.requests_per_minute = int(os.getenv(f"{prefix}_RPM", config.requests_per_minute))
+        config.tokens_per_minute = int(os.getenv(f"{prefix}_TPM", config.tokens_per_minute))
+        config.max_window = float(os.getenv(f"{prefix}_MAX_CONCURRENCY", config.max_window))
+        return config
+
+
+class TokenBucket:
+    """令牌桶（允许透支，透支部分转化为等待时间）"""
+
+    def __init__(self, per_minute: int):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.tokens = float(per_minute)
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self, amount: float) -> float:
+        """预留令牌，返回需要等待的秒数"""
+        self._refill()
+        self.tokens -= amount
+        if self.tokens >= 0 or self.rate <= 0:
+            return 0.0
+        return -self.tokens / self.rate
+
+    def adjust(self, delta: float):
+        """按实际用量修正（delta>0 表示多扣）"""
+        self._refill()
+        self.tokens -= delta
+
+
+class LimiterState:
+    """单个限流维度（某个API Key或某个base_url）的状态"""
+
+    def __init__(self, label: str, config: RateLimitConfig, loop: asyncio.AbstractEventLoop = None):
+        self.label = label
+        self.config = config
+        self.loop = loop
+        self.requests = TokenBucket(config.requests_per_minute)
+        self.tokens = TokenBucket(config.tokens_per_minute)
+        self.window = config.initial_window
+        self.in_flight = 0
+        self.waiting = 0
+        self.blocked_until = 0.0
+        self.last_decrease = 0.0
+        self.condition = asyncio.Condition()
+        self.stats = {"admitted": 0, "succeeded": 0, "throttled": 0, "server_errors": 0, "wait_seconds": 0.0}
+
+    async def enter(self, est_tokens: int):
+        """等待并发窗口、Retry-After封禁和令牌桶"""
+        started = time.monotonic()
+        self.waiting += 1
+        try:
+            async with self.condition:
+                while True:
+                    blocked = self.blocked_until - time.monotonic()
+                    if blocked > 0:
+                        # 等待Retry-After封禁结束（期间释放锁）
+                        try:
+                            await asyncio.wait_for(self.condition.wait(), timeout=blocked)
+                        except asyncio.TimeoutError:
+                            pass
+                        continue
+                    if self.in_flight < max(1, int(self.window)):
+                        break
+                    await self.condition.wait()
+                self.in_flight += 1
+
+            delay = max(self.requests.reserve(1), self.tokens.reserve(est_tokens))
+            if delay > 0:
+                try:
+                    await asyncio.sleep(delay)
+                except BaseException:
+                    # 等待令牌时被取消：已占用的并发名额不会再经 leave() 释放，这里归还
+                    await self._release()
+                    raise
+        finally:
+            self.waiting -= 1
+        self.stats["admitted"] += 1
+        self.stats["wait_seconds"] += time.monotonic() - started
+
+    async def leave(self, status: Optional[int], retry_after: Optional[float]):
+        """释放并发名额并按结果调整窗口"""
+        now = time.monotonic()
+        if status == 200:
+            self.stats["succeeded"] += 1
+            # 加性增长：每个窗口的成功量使窗口+1
+            self.window = min(self.config.max_window, self.window + 1.0 / max(self.window, 1.0))
+        elif status is not None and (status == 429 or status >= 500):
+            self.stats["throttled" if status == 429 else "server_errors"] += 1
+            if now - self.last_decrease >= self.config.decrease_cooldown:
+                self.window = max(self.config.min_window, self.window * self.config.decrease_factor)
+                self.last_decrease = now
+            if retry_after:
+                self.blocked_until = max(self.blocked_until, now + retry_after)
+
+        await self._release()
+
+    async def _release(self):
+        async with self.condition:
+            self.in_flight -= 1
+            self.condition.notify_all()
+
+    def snapshot(self) -> Dict:
+        """当前状态"""
+        return {
+            "window": round(self.window, 2),
+            "in_flight": self.in_flight,
+            "queue_depth": self.waiting,
+            "blocked_for": round(max(0.0, self.blocked_until - time.monotonic()), 2),
+            **self.stats
+        }
+
+
+class Permit:
+    """一次调用的通行证，调用方可填写实际token用量"""
+
+    def __init__(self, est_tokens: int):
+        self.est_tokens = est_tokens
+        self.tokens_used: Optional[int] = None
+        self.queue_wait: float = 0.0
+
+
+class AdaptiveRateLimiter:
+    """
+    自适应限流器
+    每次调用依次进入 base_url 维度和 API Key 维度（固定顺序，避免互相等待）
+    """
+
+    def __init__(self, key_config: RateLimitConfig = None, host_config: RateLimitConfig = None):
+        self.key_config = key_config or RateLimitConfig.from_env("NEXUS_KEY")
+        self.host_config = host_config or RateLimitConfig.from_env(
+            "NEXUS_HOST", requests_per_minute=300, tokens_per_minute=1000000, max_window=64.0
+        )
+        self._states: Dict[Tuple[int, str, str], LimiterState] = {}
+
+    def _state(self, kind: str, ident: str) -> LimiterState:
+        # asyncio.Condition 绑定事件循环，按循环隔离状态（循环id可能被新循环复用，需核对循环本身）
+        loop = asyncio.get_running_loop()
+        key = (id(loop), kind, ident)
+        state = self._states.get(key)
+        if state is None or state.loop is not loop:
+            # 丢弃已关闭循环的状态
+            for stale in [k for k, s in self._states.items() if s.loop.is_closed()]:
+                del self._states[stale]
+            if kind == "host":
+                label, config = f"host:{ident}", self.host_config
+            else:
+                label, config = f"key:{key_fingerprint(ident)}", self.key_config
+            state = LimiterState(label, config, loop)
+            self._states[key] = state
+        return state
+
+    @asynccontextmanager
+    async def acquire(self, api_key: str, base_url: str, est_tokens: int = 0):
+        """
+        获取调用名额
+
+        用法:
+            async with limiter.acquire(api_key, base_url, est_tokens) as permit:
+                ...  # 非200时抛出 APIStatusError，限流器据此退避
+                permit.tokens_used = usage_total
+        """
+        states: List[LimiterState] = [
+            self._state("host", base_url.rstrip("/")),
+            self._state("key", api_key or "")
+        ]
+        permit = Permit(est_tokens)
+        started = time.monotonic()
+        entered: List[LimiterState] = []
+        try:
+            for state in states:
+                await state.enter(est_tokens)
+                entered.append(state)
+        except BaseException:
+            for state in entered:
+                await state.leave(None, None)
+            raise
+        permit.queue_wait = time.monotonic() - started
+
+        status, retry_after = None, None
+        try:
+            yield permit
+            status = 200
+        except APIStatusError as e:
+            status, retry_after = e.status, e.retry_after
+            raise
+        finally:
+            if status == 200 and permit.tokens_used is not None:
+                for state in entered:
+                    state.tokens.adjust(permit.tokens_used - est_tokens)
+            for state in entered:
+                await state.leave(status, retry_after)
+
+    def capacity(self, api_key: str, base_url: str) -> int:
+        """当前可并发的调用数（两个维度并发窗口的较小值）"""
+        host = self._state("host", base_url.rstrip("/"))
+        key = self._state("key", api_key or "")
+        return max(1, int(min(host.window, key.window)))
+
+    def snapshot(self) -> Dict[str, Dict]:
+        """所有维度的窗口、队列深度等指标"""
+        snapshot: Dict[str, Dict] = {}
+        for state in self._states.values():
+            # 同一维度在多个事件循环中各有状态时按循环区分
+            label = state.label if state.label not in snapshot else f"{state.label}@loop{id(state.loop):x}"
+            snapshot[label] = state.snapshot()
+        return snapshot
+
+
+# ============== 全局单例 ==============
+
+_rate_limiter: Optional[AdaptiveRateLimiter] = None
+
+
+def get_rate_limiter() -> AdaptiveRateLimiter:
+    """获取进程级限流器"""
+    global _rate_limiter
+    if _rate_limiter is None:
+        _rate_limiter = AdaptiveRateLimiter()
+    return _rate_limiter
@@ -12,7 +12,13 @@ from datetime import datetime
 from typing import Dict, List, Optional
 
 # 导入Kimi Agent模块
-from kimi_agent_runner import KimiAgentRunner, KimiAgentFactory, KimiAgentConfig
+from kimi_agent_runner import KimiAgentFactory, KimiAgentConfig
+from agent_client import AgentRoster, get_provider_router
+from http_pool import close_pool
+from prompt_compactor import get_prompt_compactor
+from cassette import get_cassette, pace
+from quorum import gather_quorum
+from decision_history import DecisionHistory
 
 # 导入基础公司系统
 from advanced_company_v3 import AdvancedCompanySystem, Project, ProjectPhase, Task, TaskPriority
@@ -35,8 +41,8 @@ class RealAICompanySystem(AdvancedCompanySystem):
         # 初始化AI Agent配置
         self._init_ai_agents()
         
-        # AI决策记录
-        self.ai_decisions: List[Dict] = []
+        # AI决策记录（内存有界，超出部分落盘，可按 agent / type / 时间查询）
+        self.ai_decisions = DecisionHistory("real-ai-decisions", agent_key="agent")
         
         print(f"🤖 真实AI公司系统已启动: {company_name}")
         print(f"   API Key: {self.api_key[:20]}...")
@@ -54,6 +60,16 @@ class RealAICompanySystem(AdvancedCompanySystem):
             "coo": factory.create_coo_agent(self.api_key),
             "chro": factory.create_chro_agent(self.api_key),
         }
+        observer_config = KimiAgentConfig(
+            agent_id="observer",
+            name="System AI",
+            role="Observer",
+            system_prompt="你是公司运营观察员，负责总结每日运营情况。",
+            api_key=self.api_key
+        )
+        
+        # 长期Agent客户端：随模拟启动时打开并预连接，每天的调用只做供应商路由
+        self.roster = AgentRoster({**self.ai_configs, "observer": observer_config})
         
         print(f"   已初始化 {len(self.ai_configs)} 个AI Agent")
     
@@ -63,30 +79,38 @@ class RealAICompanySystem(AdvancedCompanySystem):
         print(f"🚀 启动AI驱动模拟 - {days} 天")
         print(f"{'='*70}")
         
-        for day in range(1, days + 1):
-            self.metrics["day"] = day
-            
-            print(f"\n📅 Day {day} - AI Agent工作模式")
-            print("-" * 50)
-            
-            # 1. AI CMO扫描市场
-            opportunities = await self._ai_cmo_market_scan()
-            
-            # 2. 对每个机会进行AI评估
-            for opp in opportunities[:2]:  # 限制每天评估2个
-                await self._ai_evaluate_opportunity(opp)
-            
-            # 3. AI管理项目执行
-            await self._ai_manage_projects()
-            
-            # 4. AI HR管理
-            await self._ai_hr_management()
-            
-            # 5. 生成日报
-            await self._ai_daily_report()
-            
-            print(f"\n✅ Day {day} 完成")
-            await asyncio.sleep(1)
+        await self.roster.start()
+        stats = self.roster.get_stats()
+        print(f"🔌 Agent客户端: {stats['clients']}个 | 预连接 {stats['preconnected']}条 "
+              f"(失败 {stats['preconnect_failed']}) | 耗时 {stats['startup_ms']:.0f}ms")
+        
+        try:
+            for day in range(1, days + 1):
+                self.metrics["day"] = day
+                
+                print(f"\n📅 Day {day} - AI Agent工作模式")
+                print("-" * 50)
+                
+                # 1. AI CMO扫描市场
+                opportunities = await self._ai_cmo_market_scan()
+                
+                # 2. 对每个机会进行AI评估
+                for opp in opportunities[:2]:  # 限制每天评估2个
+                    await self._ai_evaluate_opportunity(opp)
+                
+                # 3. AI管理项目执行
+                await self._ai_manage_projects()
+                
+                # 4. AI HR管理
+                await self._ai_hr_management()
+                
+                # 5. 生成日报
+                await self._ai_daily_report()
+                
+                print(f"\n✅ Day {day} 完成")
+                await pace(1)
+        finally:
+            await self.roster.close()
         
         # 输出总结
         self._print_summary()
@@ -95,49 +119,48 @@ class RealAICompanySystem(AdvancedCompanySystem):
         """AI CMO扫描市场"""
         print("\n📊 AI CMO正在分析市场...")
         
-        config = self.ai_configs["cmo"]
+        cmo = self.roster.client("cmo", "market_scan")
+        result = await cmo.think(
+            task="分析当前AI市场趋势，识别最有潜力的3个创业机会。考虑：市场规模、增长趋势、竞争格局、进入壁垒",
+            context={
+                "company": self.company_name,
+                "current_projects": [
+                    {"name": p.name, "phase": p.phase.value, "progress": p.progress}
+                    for p in self.projects.values()
+                ],
+                "cash_position": self.financials["cash_flow"],
+                "existing_products": ["AI内容平台", "自动化工具"]
+            },
+            step_kind="market_scan"
+        )
         
-        async with KimiAgentRunner(config) as cmo:
-            result = await cmo.think(
-                task="分析当前AI市场趋势，识别最有潜力的3个创业机会。考虑：市场规模、增长趋势、竞争格局、进入壁垒",
-                context={
-                    "company": self.company_name,
-                    "current_projects": [
-                        {"name": p.name, "phase": p.phase.value, "progress": p.progress}
-                        for p in self.projects.values()
-                    ],
-                    "cash_position": self.financials["cash_flow"],
-                    "existing_products": ["AI内容平台", "自动化工具"]
-                }
-            )
-            
-            print(f"   🤖 CMO决策: {result.get('decision')}")
-            print(f"   📈 信心度: {result.get('confidence', 0)}")
-            
-            # 从AI响应中提取机会
-            opportunities = []
-            recommendations = result.get('recommendations', [])
-            
-            for i, rec in enumerate(recommendations[:3]):
-                opp = {
-                    "id": f"ai_opp_{self.metrics['day']}_{i}",
-                    "name": rec if isinstance(rec, str) else rec.get('name', f'机会{i+1}'),
-                    "description": result.get('reasoning', '')[:200],
-                    "confidence": result.get('confidence', 0.7),
-                    "market_size": random.randint(50, 500) * 1000000
-                }
-                opportunities.append(opp)
-                print(f"   💡 发现机会: {opp['name']}")
-            
-            # 记录决策
-            self.ai_decisions.append({
-                "timestamp": datetime.now().isoformat(),
-                "agent": "CMO",
-                "type": "market_scan",
-                "result": result
-            })
-            
-            return opportunities
+        print(f"   🤖 CMO决策: {result.get('decision')}")
+        print(f"   📈 信心度: {result.get('confidence', 0)}")
+        
+        # 从AI响应中提取机会
+        opportunities = []
+        recommendations = result.get('recommendations', [])
+        
+        for i, rec in enumerate(recommendations[:3]):
+            opp = {
+                "id": f"ai_opp_{self.metrics['day']}_{i}",
+                "name": rec if isinstance(rec, str) else rec.get('name', f'机会{i+1}'),
+                "description": result.get('reasoning', '')[:200],
+                "confidence": result.get('confidence', 0.7),
+                "market_size": random.randint(50, 500) * 1000000
+            }
+            opportunities.append(opp)
+            print(f"   💡 发现机会: {opp['name']}")
+        
+        # 记录决策
+        self.ai_decisions.append({
+            "timestamp": datetime.now().isoformat(),
+            "agent": "CMO",
+            "type": "market_scan",
+            "result": result
+        })
+        
+        return opportunities
     
     async def _ai_evaluate_opportunity(self, opportunity: Dict):
         """AI多Agent评估机会"""
@@ -152,58 +175,59 @@ class RealAICompanySystem(AdvancedCompanySystem):
             projected_revenue=opportunity.get('market_size', 0) * 0.01
         )
         
+        meeting_context = {
+            "opportunity": opportunity,
+            "company_resources": {
+                "cash": self.financials["cash_flow"],
+                "team_size": len(self.agents)
+            }
+        }
+        
         # 并行收集各Agent评估
         async def get_agent_evaluation(agent_id: str, aspect: str) -> Dict:
-            config = self.ai_configs[agent_id]
-            async with KimiAgentRunner(config) as agent:
-                return await agent.think(
-                    task=f"从{aspect}角度评估项目'{opportunity['name']}'",
-                    context={
-                        "opportunity": opportunity,
-                        "company_resources": {
-                            "cash": self.financials["cash_flow"],
-                            "team_size": len(self.agents)
-                        }
-                    }
-                )
+            agent = self.roster.client(agent_id)
+            # 机会与公司资源对四位评估者相同，作为共享前缀放在任务之前
+            return await agent.think(
+                task=f"从{aspect}角度评估项目'{opportunity['name']}'",
+                shared_context=meeting_context
+            )
         
-        # 并行执行评估
+        # 并行执行评估（达到法定人数或截止时间即进入CEO决策）
         print("   ⏳ 并行评估中...")
-        eval_results = await asyncio.gather(
-            get_agent_evaluation("cto", "技术可行性"),
-            get_agent_evaluation("cfo", "财务可行性"),
-            get_agent_evaluation("cpo", "产品可行性"),
-            get_agent_evaluation("coo", "运营可行性")
-        )
-        
-        cto_eval, cfo_eval, cpo_eval, coo_eval = eval_results
-        
-        print(f"   💻 CTO: {cto_eval.get('decision')} (置信度: {cto_eval.get('confidence')})")
-        print(f"   💰 CFO: {cfo_eval.get('decision')} (置信度: {cfo_eval.get('confidence')})")
-        print(f"   🎨 CPO: {cpo_eval.get('decision')} (置信度: {cpo_eval.get('confidence')})")
-        print(f"   ⚙️  COO: {coo_eval.get('decision')} (置信度: {coo_eval.get('confidence')})")
+        gathered = await gather_quorum({
+            "cto": get_agent_evaluation("cto", "技术可行性"),
+            "cfo": get_agent_evaluation("cfo", "财务可行性"),
+            "cpo": get_agent_evaluation("cpo", "产品可行性"),
+            "coo": get_agent_evaluation("coo", "运营可行性")
+        })
+        evaluations = gathered.results
+        
+        icons = {"cto": "💻", "cfo": "💰", "cpo": "🎨", "coo": "⚙️ "}
+        for agent_id, evaluation in evaluations.items():
+            print(f"   {icons[agent_id]} {agent_id.upper()}: {evaluation.get('decision')} (置信度: {evaluation.get('confidence')})")
+        if gathered.missing:
+            print(f"   ⏱️ 未等待: {', '.join(a.upper() for a in gathered.missing)} ({gathered.reason})")
         
         # AI CEO综合决策
         print("\n👔 AI CEO正在综合决策...")
         
-        ceo_config = self.ai_configs["ceo"]
-        async with KimiAgentRunner(ceo_config) as ceo:
-            final_decision = await ceo.think(
-                task=f"基于各部门评估，决定是否投资'{opportunity['name']}'项目",
-                context={
-                    "opportunity": opportunity,
-                    "evaluations": {
-                        "cto": cto_eval,
-                        "cfo": cfo_eval,
-                        "cpo": cpo_eval,
-                        "coo": coo_eval
-                    },
-                    "company_status": {
-                        "cash_flow": self.financials["cash_flow"],
-                        "active_projects": len(self.projects)
-                    }
+        ceo = self.roster.client("ceo", "strategic_decision")
+        final_decision = await ceo.think(
+            task=f"基于各部门评估，决定是否投资'{opportunity['name']}'项目",
+            shared_context=meeting_context,
+            context={
+                "evaluations": evaluations,
+                "missing_evaluations": gathered.missing,
+                "company_status": {
+                    "cash_flow": self.financials["cash_flow"],
+                    "active_projects": len(self.projects)
                 }
-            )
+            },
+            step_kind="strategic_decision"
+        )
+        
+        # 注明决策所依据的评估（迟到评估到达后出现在 inputs["late"]）
+        final_decision["inputs"] = gathered.inputs()
         
         # 解析CEO决策
         decision_text = final_decision.get('decision', '').lower()
@@ -254,20 +278,19 @@ class RealAICompanySystem(AdvancedCompanySystem):
                 continue
             
             # AI COO评估项目进度
-            coo_config = self.ai_configs["coo"]
-            async with KimiAgentRunner(coo_config) as coo:
-                result = await coo.think(
-                    task=f"评估项目'{project.name}'的执行情况和下一步行动",
-                    context={
-                        "project": {
-                            "name": project.name,
-                            "progress": project.progress,
-                            "phase": project.phase.value,
-                            "budget": project.budget,
-                            "spent": project.spent
-                        }
+            coo = self.roster.client("coo")
+            result = await coo.think(
+                task=f"评估项目'{project.name}'的执行情况和下一步行动",
+                context={
+                    "project": {
+                        "name": project.name,
+                        "progress": project.progress,
+                        "phase": project.phase.value,
+                        "budget": project.budget,
+                        "spent": project.spent
                     }
-                )
+                }
+            )
             
             # 根据AI建议更新项目
             action = result.get('decision', '')
@@ -288,8 +311,6 @@ class RealAICompanySystem(AdvancedCompanySystem):
         """AI HR管理"""
         print("\n👥 AI HR团队管理...")
         
-        chro_config = self.ai_configs["chro"]
-        
         # 检查团队状态
         team_status = {
             agent.id: {
@@ -301,11 +322,11 @@ class RealAICompanySystem(AdvancedCompanySystem):
             for agent in self.agents.values() if agent.id != "observer"
         }
         
-        async with KimiAgentRunner(chro_config) as chro:
-            result = await chro.think(
-                task="评估团队状态，提供管理建议",
-                context={"team_status": team_status}
-            )
+        chro = self.roster.client("chro")
+        result = await chro.think(
+            task="评估团队状态，提供管理建议",
+            context={"team_status": team_status}
+        )
         
         recommendations = result.get('recommendations', [])
         if recommendations:
@@ -319,25 +340,17 @@ class RealAICompanySystem(AdvancedCompanySystem):
         """AI生成日报"""
         print("\n📋 AI生成日报...")
         
-        observer_config = self.ai_configs.get("observer") or KimiAgentConfig(
-            agent_id="observer",
-            name="System AI",
-            role="Observer",
-            system_prompt="你是公司运营观察员，负责总结每日运营情况。",
-            api_key=self.api_key
+        observer = self.roster.client("observer")
+        result = await observer.think(
+            task="总结今日公司运营情况",
+            context={
+                "day": self.metrics["day"],
+                "projects": len(self.projects),
+                "cash_flow": self.financials["cash_flow"],
+                "employee_satisfaction": self.metrics["employee_satisfaction"]
+            }
         )
         
-        async with KimiAgentRunner(observer_config) as observer:
-            result = await observer.think(
-                task="总结今日公司运营情况",
-                context={
-                    "day": self.metrics["day"],
-                    "projects": len(self.projects),
-                    "cash_flow": self.financials["cash_flow"],
-                    "employee_satisfaction": self.metrics["employee_satisfaction"]
-                }
-            )
-        
         summary = result.get('reasoning', '今日运营正常')[:100]
         print(f"   📝 {summary}...")
     
@@ -359,17 +372,28 @@ class RealAICompanySystem(AdvancedCompanySystem):
         print(f"\n🤖 AI决策记录:")
         print(f"   总决策数: {len(self.ai_decisions)}")
         
-        # 按类型统计
-        decision_types = {}
-        for d in self.ai_decisions:
-            t = d.get('type', 'unknown')
-            decision_types[t] = decision_types.get(t, 0) + 1
-        
-        for t, count in decision_types.items():
+        # 按类型统计（包含已落盘的记录）
+        for t, count in self.ai_decisions.counts().items():
             print(f"   - {t}: {count}次")
         
+        compaction = get_prompt_compactor().get_stats()
+        if compaction["calls"]:
+            print(f"\n✂️ 上下文压缩:")
+            print(f"   节省 {compaction['saved_tokens']:,} tokens ({compaction['saved_ratio']:.0%}) | "
+                  f"超预算截断 {compaction['over_budget']}次")
+        
         print(f"\n👥 团队状态:")
         print(f"   满意度: {self.metrics['employee_satisfaction']:.1f}%")
+        
+        tape = get_cassette().get_stats()
+        if tape["mode"] != "off":
+            print(f"\n📼 磁带({tape['mode']}): 录制 {tape['recorded']} | 精确回放 {tape['exact_hits']} | "
+                  f"顺序回放 {tape['sequence_hits']} | 未命中 {tape['misses']}")
+        
+        routing = get_provider_router().get_stats()
+        if routing["providers"]:
+            routed = " | ".join(f"{name} {count}次" for name, count in routing["routed"].items())
+            print(f"\n🔀 供应商路由({routing['policy']}): {routed or '无调用'}")
 
 
 # ============== 辅助函数 ==============
@@ -400,6 +424,8 @@ async def main():
         print(f"\n❌ 错误: {e}")
         import traceback
         traceback.print_exc()
+    finally:
+        await close_pool()
 
 
 if __name__ == "__main__":
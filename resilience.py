@@ -0,0 +1,284 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Resilience Layer - Agent API调用容错层
+抖动指数退避重试 + 关键步骤对冲请求 + 按端点熔断
+"""
+
+import os
+import time
+import random
+import asyncio
+import aiohttp
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional, Set, Tuple
+from dataclasses import dataclass, field
+
+from rate_limiter import APIStatusError
+
+
+# 对延迟敏感、允许发起对冲请求的步骤类型
+DEFAULT_HEDGED_STEP_KINDS = {"strategic_decision", "final_approval"}
+
+
+class CircuitOpenError(Exception):
+    """熔断器打开，调用被短路"""
+
+    def __init__(self, endpoint: str, retry_in: float):
+        super().__init__(f"Circuit open for {endpoint} (retry in {retry_in:.0f}s)")
+        self.endpoint = endpoint
+        self.retry_in = retry_in
+
+
+def is_retryable(error: BaseException) -> bool:
+    """是否为可重试错误：429/5xx/408、超时、连接错误"""
+    if isinstance(error, APIStatusError):
+        return error.overloaded or error.status == 408
+    return isinstance(error, (asyncio.TimeoutError, aiohttp.ClientConnectionError, aiohttp.ServerDisconnectedError))
+
+
+@dataclass
+class ResilienceConfig:
+    """容错配置"""
+    max_attempts: int = 3
+    base_delay: float = 0.5          # 首次重试基础延迟(秒)
+    max_delay: float = 8.0
+    failure_threshold: int = 5       # 连续失败多少次后熔断
+    reset_timeout: float = 30.0      # 熔断后多久进入半开状态
+    hedged_step_kinds: Set[str] = field(default_factory=lambda: set(DEFAULT_HEDGED_STEP_KINDS))
+    hedge_min_samples: int = 20      # p95样本不足时不对冲
+    hedge_floor: float = 1.0         # 对冲延迟下限(秒)
+
+    @classmethod
+    def from_env(cls) -> "ResilienceConfig":
+        """从环境变量读取配置"""
+        config = cls()
+        config.max_attempts = int(os.getenv("NEXUS_RETRY_ATTEMPTS", config.max_attempts))
+        config.failure_threshold = int(os.getenv("NEXUS_BREAKER_THRESHOLD", config.failure_threshold))
+        config.reset_timeout = float(os.getenv("NEXUS_BREAKER_RESET", config.reset_timeout))
+        return config
+
+
+class LatencyTracker:
+    """滑动窗口延迟统计，用于计算对冲延迟"""
+
+    def __init__(self, size: int = 200):
+        self.size = size
+        self._samples: Dict[Tuple[str, Optional[str]], Deque[float]] = {}
+
+    def record(self, endpoint: str, step_kind: Optional[str], seconds: float):
+        key = (endpoint, step_kind)
+        if key not in self._samples:
+            self._samples[key] = deque(maxlen=self.size)
+        self._samples[key].append(seconds)
+
+    def percentile(self, endpoint: str, step_kind: Optional[str], pct: float = 0.95) -> Tuple[Optional[float], int]:
+        """返回 (分位数, 样本数)"""
+        samples = self._samples.get((endpoint, step_kind))
+        if not samples:
+            return None, 0
+        ordered = sorted(samples)
+        index = min(len(ordered) - 1, int(len(ordered) * pct))
+        return ordered[index], len(ordered)
+
+
+class CircuitBreaker:
+    """
+    熔断器
+    closed: 正常；open: 短路所有调用；half_open: 放行一个探测请求
+    """
+
+    def __init__(self, endpoint: str, failure_threshold: int, reset_timeout: float):
+        self.endpoint = endpoint
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self.probe_in_flight = False
+        self.stats = {"opened": 0, "short_circuited": 0}
+
+    def is_open(self) -> bool:
+        """是否处于短路状态（不改变状态）"""
+        if self.state == "open":
+            return time.monotonic() - self.opened_at < self.reset_timeout
+        return self.state == "half_open" and self.probe_in_flight
+
+    def allow(self) -> bool:
+        """是否放行本次调用"""
+        if self.state == "closed":
+            return True
+        if self.state == "open":
+            if time.monotonic() - self.opened_at < self.reset_timeout:
+                self.stats["short_circuited"] += 1
+                return False
+            self.state = "half_open"
+            self.probe_in_flight = False
+        if self.probe_in_flight:
+            self.stats["short_circuited"] += 1
+            return False
+        self.probe_in_flight = True
+        return True
+
+    def retry_in(self) -> float:
+        return max(0.0, self.reset_timeout - (time.monotonic() - self.opened_at))
+
+    def record_success(self):
+        self.state = "closed"
+        self.failures = 0
+        self.probe_in_flight = False
+
+    def release_probe(self):
+        """调用被取消（未得到结果）：不计成功或失败，只释放探测名额"""
+        self.probe_in_flight = False
+
+    def record_failure(self):
+        self.failures += 1
+        self.probe_in_flight = False
+        if self.state == "half_open" or self.failures >= self.failure_threshold:
+            if self.state != "open":
+                self.stats["opened"] += 1
+            self.state = "open"
+            self.opened_at = time.monotonic()
+
+
+class ResilienceManager:
+    """容错调用入口"""
+
+    def __init__(self, config: ResilienceConfig = None):
+        self.config = config or ResilienceConfig.from_env()
+        self.latency = LatencyTracker()
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self.stats = {"calls": 0, "retries": 0, "hedges": 0, "hedge_wins": 0, "failures": 0}
+
+    def breaker(self, endpoint: str) -> CircuitBreaker:
+        """获取端点熔断器"""
+        if endpoint not in self._breakers:
+            self._breakers[endpoint] = CircuitBreaker(
+                endpoint, self.config.failure_threshold, self.config.reset_timeout
+            )
+        return self._breakers[endpoint]
+
+    def backoff(self, attempt: int, retry_after: Optional[float] = None) -> float:
+        """全抖动指数退避，且不短于服务端给出的Retry-After"""
+        ceiling = min(self.config.max_delay, self.config.base_delay * (2 ** attempt))
+        delay = random.uniform(0, ceiling)
+        return max(delay, retry_after or 0.0)
+
+    def hedge_delay(self, endpoint: str, step_kind: Optional[str]) -> Optional[float]:
+        """对冲延迟：该端点/步骤类型的p95，样本不足时不对冲"""
+        if step_kind not in self.config.hedged_step_kinds:
+            return None
+        p95, count = self.latency.percentile(endpoint, step_kind)
+        if p95 is None or count < self.config.hedge_min_samples:
+            return None
+        return max(self.config.hedge_floor, p95)
+
+    async def call(self, endpoint: str, fn: Callable[[], Awaitable[Any]],
+                   step_kind: str = None, trace: Dict = None) -> Any:
+        """
+        带重试/对冲/熔断的调用
+
+        Args:
+            endpoint: 端点标识（熔断与延迟统计的维度）
+            fn: 实际调用（每次尝试重新调用）
+            step_kind: 步骤类型（决定是否对冲）
+            trace: 可选，写入 attempts / hedged 供调用方记录
+        """
+        trace = trace if trace is not None else {}
+        trace.update({"attempts": 0, "hedged": False})
+        self.stats["calls"] += 1
+        breaker = self.breaker(endpoint)
+
+        for attempt in range(self.config.max_attempts):
+            if not breaker.allow():
+                raise CircuitOpenError(endpoint, breaker.retry_in())
+
+            trace["attempts"] = attempt + 1
+            started = time.monotonic()
+            try:
+                delay = self.hedge_delay(endpoint, step_kind)
+                if delay is not None:
+                    result = await self._hedged(fn, delay, trace)
+                else:
+                    result = await fn()
+            except Exception as e:
+                if not is_retryable(e):
+                    if isinstance(e, APIStatusError) and 400 <= e.status < 500:
+                        # 请求本身的问题（如400）：上游有响应，视为健康
+                        breaker.record_success()
+                    else:
+                        # 解析失败等本地错误不说明端点健康与否，只归还半开探测名额
+                        breaker.release_probe()
+                    raise
+                breaker.record_failure()
+                if attempt + 1 >= self.config.max_attempts:
+                    self.stats["failures"] += 1
+                    raise
+                self.stats["retries"] += 1
+                await asyncio.sleep(self.backoff(attempt, getattr(e, "retry_after", None)))
+                continue
+            except BaseException:
+                # 被取消（对冲落败、截止时间、法定人数取消等）：半开探测名额需归还，否则熔断器一直短路
+                breaker.release_probe()
+                raise
+
+            breaker.record_success()
+            self.latency.record(endpoint, step_kind, time.monotonic() - started)
+            return result
+
+    async def _hedged(self, fn: Callable[[], Awaitable[Any]], delay: float, trace: Dict) -> Any:
+        """主请求超过delay未返回时发起一个对冲请求，取先成功者"""
+        primary = asyncio.ensure_future(fn())
+        try:
+            done, _ = await asyncio.wait({primary}, timeout=delay)
+        except BaseException:
+            primary.cancel()
+            raise
+        if done:
+            return primary.result()
+
+        self.stats["hedges"] += 1
+        trace["hedged"] = True
+        hedge = asyncio.ensure_future(fn())
+        pending = {primary, hedge}
+        error: Optional[BaseException] = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.cancelled():
+                        error = error or asyncio.CancelledError()
+                        continue
+                    if task.exception() is None:
+                        if task is hedge:
+                            self.stats["hedge_wins"] += 1
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    def get_stats(self) -> Dict:
+        """容错统计"""
+        return {
+            **self.stats,
+            "breakers": {
+                endpoint: {"state": b.state, "failures": b.failures, **b.stats}
+                for endpoint, b in self._breakers.items()
+            }
+        }
+
+
+# ============== 全局单例 ==============
+
+_resilience: Optional[ResilienceManager] = None
+
+
+def get_resilience() -> ResilienceManager:
+    """获取进程级容错管理器"""
+    global _resilience
+    if _resilience is None:
+        _resilience = ResilienceManager()
+    return _resilience
@@ -0,0 +1,275 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Request Scheduler - 全局LLM请求调度
+所有Agent调用在进入限流器之前按上游资源（API Key + base_url）排队，
+并发名额跟随限流器的AIMD窗口，空出名额时按以下顺序放行：
+    1. 优先级类别（CRITICAL > HIGH > MEDIUM > LOW，按 step_kind 或 TaskPriority 确定）
+       - 截止时间临近的请求提升为 CRITICAL
+       - 等待超过 aging_seconds 的请求每次提升一级（防止饥饿）
+    2. 截止时间早者优先
+    3. Agent间加权公平排队（虚拟完成时间小者优先）
+"""
+
+import os
+import time
+import asyncio
+from contextlib import asynccontextmanager
+from typing import Any, Dict, List, Optional, Tuple
+from dataclasses import dataclass, field
+
+from rate_limiter import get_rate_limiter
+from telemetry import Histogram
+
+
+# 与 advanced_company_v3.TaskPriority 同名，数值越小越优先
+PRIORITY_CLASSES: Tuple[str, ...] = ("CRITICAL", "HIGH", "MEDIUM", "LOW")
+DEFAULT_PRIORITY = "MEDIUM"
+
+DEFAULT_STEP_KIND_PRIORITY: Dict[str, str] = {
+    # 阻塞决策与故障处理
+    "strategic_decision": "CRITICAL",
+    "final_approval": "CRITICAL",
+    "diagnose": "CRITICAL",
+    "diagnosis": "CRITICAL",
+    "recovery_plan": "CRITICAL",
+    # 任务关键评估
+    "tech_eval": "HIGH",
+    "financial_check": "HIGH",
+    "backend_architecture": "HIGH",
+    "api_design": "HIGH",
+    "infrastructure": "HIGH",
+    "security_review": "HIGH",
+    "cost_estimation": "HIGH",
+    "pricing_analysis": "HIGH",
+    "revenue_model": "HIGH",
+    # 后台工作
+    "market_scan": "LOW",
+    "market_analysis": "LOW",
+    "marketing_strategy": "LOW",
+    "customer_acquisition": "LOW",
+    "customer_support": "LOW",
+    "customer_retention": "LOW",
+    "service_design": "LOW",
+}
+
+DEFAULT_AGENT_WEIGHTS: Dict[str, float] = {"ceo": 2.0}
+
+
+@dataclass
+class SchedulerConfig:
+    """调度配置"""
+    enabled: bool = True
+    aging_seconds: float = 15.0     # 每等待该时长提升一级优先级
+    urgent_slack: float = 5.0       # 距截止时间不足该秒数时提升为CRITICAL
+    step_kind_priority: Dict[str, str] = field(default_factory=lambda: dict(DEFAULT_STEP_KIND_PRIORITY))
+    agent_weights: Dict[str, float] = field(default_factory=lambda: dict(DEFAULT_AGENT_WEIGHTS))
+
+    @classmethod
+    def from_env(cls) -> "SchedulerConfig":
+        """从环境变量读取配置（NEXUS_SCHED_WEIGHTS 格式: ceo:2,cto:1.5）"""
+        config = cls()
+        config.enabled = os.getenv("NEXUS_SCHEDULER", "1").lower() not in ("0", "false", "no")
+        config.aging_seconds = float(os.getenv("NEXUS_SCHED_AGING", config.aging_seconds))
+        config.urgent_slack = float(os.getenv("NEXUS_SCHED_URGENT_SLACK", config.urgent_slack))
+        for item in os.getenv("NEXUS_SCHED_WEIGHTS", "").split(","):
+            agent_id, _, weight = item.partition(":")
+            if agent_id.strip() and weight:
+                config.agent_weights[agent_id.strip()] = float(weight)
+        return config
+
+
+def resolve_priority(priority: Any = None, step_kind: Optional[str] = None,
+                     step_kind_priority: Dict[str, str] = None) -> int:
+    """
+    优先级类别下标
+    priority 可为 TaskPriority、类别名或下标；未指定时按 step_kind 映射
+    """
+    if priority is not None:
+        name = getattr(priority, "name", priority)
+        if isinstance(name, int):
+            return max(0, min(len(PRIORITY_CLASSES) - 1, name))
+        if str(name).upper() in PRIORITY_CLASSES:
+            return PRIORITY_CLASSES.index(str(name).upper())
+    mapping = step_kind_priority if step_kind_priority is not None else DEFAULT_STEP_KIND_PRIORITY
+    return PRIORITY_CLASSES.index(mapping.get(step_kind, DEFAULT_PRIORITY))
+
+
+class _Waiter:
+    """排队中的请求"""
+
+    __slots__ = ("agent_id", "priority", "deadline", "finish", "seq", "enqueued", "future")
+
+    def __init__(self, agent_id: str, priority: int, deadline: Optional[float], finish: float, seq: int):
+        self.agent_id = agent_id
+        self.priority = priority
+        self.deadline = deadline
+        self.finish = finish
+        self.seq = seq
+        self.enqueued = time.monotonic()
+        self.future: asyncio.Future = asyncio.get_running_loop().create_future()
+
+
+class ClassStats:
+    """单个优先级类别的指标"""
+
+    def __init__(self):
+        self.queued = 0
+        self.admitted = 0
+        self.promoted = 0
+        self.deadline_missed = 0
+        self.wait_ms = Histogram()
+
+    def to_dict(self) -> Dict:
+        return {
+            "queue_depth": self.queued,
+            "admitted": self.admitted,
+            "promoted": self.promoted,
+            "deadline_missed": self.deadline_missed,
+            "wait_ms": self.wait_ms.to_dict()
+        }
+
+
+class ResourceQueue:
+    """单个上游资源（API Key + base_url）的调度队列"""
+
+    def __init__(self, api_key: str, base_url: str, loop: asyncio.AbstractEventLoop):
+        self.api_key = api_key
+        self.base_url = base_url
+        self.loop = loop
+        self.in_flight = 0
+        self.waiters: List[_Waiter] = []
+        self.virtual_time = 0.0
+        self.agent_finish: Dict[str, float] = {}
+
+
+class RequestScheduler:
+    """全局请求调度器"""
+
+    def __init__(self, config: SchedulerConfig = None):
+        self.config = config or SchedulerConfig.from_env()
+        self._queues: Dict[Tuple[int, str, str], ResourceQueue] = {}
+        self._seq = 0
+        self.classes: Dict[str, ClassStats] = {name: ClassStats() for name in PRIORITY_CLASSES}
+
+    def _queue(self, api_key: str, base_url: str) -> ResourceQueue:
+        # Future 绑定事件循环，按循环隔离队列（循环id可能被新循环复用，需核对循环本身）
+        loop = asyncio.get_running_loop()
+        key = (id(loop), api_key or "", base_url.rstrip("/"))
+        queue = self._queues.get(key)
+        if queue is None or queue.loop is not loop:
+            # 丢弃已关闭循环的队列
+            for stale in [k for k, q in self._queues.items() if q.loop.is_closed()]:
+                del self._queues[stale]
+            queue = self._queues[key] = ResourceQueue(api_key or "", base_url.rstrip("/"), loop)
+        return queue
+
+    def priority_for(self, step_kind: Optional[str] = None, priority: Any = None) -> int:
+        return resolve_priority(priority, step_kind, self.config.step_kind_priority)
+
+    @asynccontextmanager
+    async def slot(self, agent_id: str, api_key: str, base_url: str, step_kind: Optional[str] = None,
+                   priority: Any = None, deadline: Optional[float] = None, cost: float = 1.0):
+        """
+        获取调度名额
+
+        Args:
+            agent_id: 发起调用的Agent（公平排队维度）
+            api_key / base_url: 上游资源
+            step_kind / priority: 优先级类别（priority 优先，可为 TaskPriority）
+            deadline: 截止时间（time.monotonic() 时间戳）
+            cost: 本次调用的估算开销（如估算token），用于加权公平排队
+
+        用法:
+            async with scheduler.slot(agent_id, api_key, base_url, step_kind) as waited:
+                ...  # waited 为排队秒数
+        """
+        if not self.config.enabled:
+            yield 0.0
+            return
+
+        queue = self._queue(api_key, base_url)
+        level = self.priority_for(step_kind, priority)
+        weight = self.config.agent_weights.get(agent_id, 1.0)
+        start = max(queue.virtual_time, queue.agent_finish.get(agent_id, 0.0))
+        finish = start + max(cost, 1.0) / weight
+        queue.agent_finish[agent_id] = finish
+        self._seq += 1
+        waiter = _Waiter(agent_id, level, deadline, finish, self._seq)
+
+        queue.waiters.append(waiter)
+        self.classes[PRIORITY_CLASSES[level]].queued += 1
+        self._dispatch(queue)
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            if waiter in queue.waiters:
+                queue.waiters.remove(waiter)
+                self.classes[PRIORITY_CLASSES[level]].queued -= 1
+            elif waiter.future.done() and not waiter.future.cancelled():
+                # 已放行但未使用，归还名额
+                queue.in_flight -= 1
+                self._dispatch(queue)
+            raise
+
+        waited = time.monotonic() - waiter.enqueued
+        try:
+            yield waited
+        finally:
+            queue.in_flight -= 1
+            self._dispatch(queue)
+
+    def _capacity(self, queue: ResourceQueue) -> int:
+        """并发名额跟随限流器窗口，使排序在限流器之前生效"""
+        return get_rate_limiter().capacity(queue.api_key, queue.base_url)
+
+    def _effective(self, waiter: _Waiter, now: float) -> int:
+        """有效优先级：老化提升，截止时间临近时提升为CRITICAL"""
+        if waiter.deadline is not None and waiter.deadline - now <= self.config.urgent_slack:
+            return 0
+        if self.config.aging_seconds > 0:
+            return max(0, waiter.priority - int((now - waiter.enqueued) / self.config.aging_seconds))
+        return waiter.priority
+
+    def _dispatch(self, queue: ResourceQueue):
+        """名额空出时按 (有效优先级, 截止时间, 虚拟完成时间, 入队顺序) 放行"""
+        capacity = self._capacity(queue)
+        while queue.waiters and queue.in_flight < capacity:
+            now = time.monotonic()
+            ranked = [
+                (self._effective(w, now), w.deadline if w.deadline is not None else float("inf"), w.finish, w.seq, w)
+                for w in queue.waiters
+            ]
+            level, _, _, _, waiter = min(ranked, key=lambda item: item[:4])
+            queue.waiters.remove(waiter)
+            queue.in_flight += 1
+            queue.virtual_time = max(queue.virtual_time, waiter.finish)
+
+            stats = self.classes[PRIORITY_CLASSES[waiter.priority]]
+            stats.queued -= 1
+            stats.admitted += 1
+            stats.promoted += 1 if level < waiter.priority else 0
+            stats.deadline_missed += 1 if waiter.deadline is not None and waiter.deadline < now else 0
+            stats.wait_ms.observe((now - waiter.enqueued) * 1000)
+            waiter.future.set_result(None)
+
+    def get_stats(self) -> Dict:
+        """各优先级类别的队列深度与等待时间"""
+        return {
+            "by_class": {name: stats.to_dict() for name, stats in self.classes.items()},
+            "queue_depth": sum(len(q.waiters) for q in self._queues.values()),
+            "in_flight": sum(q.in_flight for q in self._queues.values())
+        }
+
+
+# ============== 全局单例 ==============
+
+_scheduler: Optional[RequestScheduler] = None
+
+
+def get_scheduler() -> RequestScheduler:
+    """获取进程级请求调度器（NEXUS_SCHEDULER=0 可关闭）"""
+    global _scheduler
+    if _scheduler is None:
+        _scheduler = RequestScheduler()
+    return _scheduler
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Single Flight - 并发请求合并
+相同Key的请求在飞行中只发起一次上游调用，其余调用方共享结果；
+leader 被取消时，仍在等待的调用方重新发起（其中一个成为新的 leader），不会连带被取消
+"""
+
+import os
+import copy
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+
+class SingleFlight:
+    """
+    请求合并组
+    第一个调用方（leader）执行实际调用，同Key的后续调用方等待并获得结果副本
+    """
+
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self.stats = {
+            "calls": 0,       # 总调用数
+            "executed": 0,    # 实际执行的上游调用
+            "coalesced": 0,   # 被合并的调用
+            "rejoined": 0     # leader被取消后重新发起的等待方
+        }
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """
+        执行或加入同Key的飞行中调用
+
+        Returns:
+            (结果, 是否为合并调用)
+        """
+        self.stats["calls"] += 1
+
+        if not self.enabled:
+            self.stats["executed"] += 1
+            return await fn(), False
+
+        while key in self._inflight:
+            future = self._inflight[key]
+            self.stats["coalesced"] += 1
+            try:
+                # shield: 单个等待方被取消不影响leader
+                result = await asyncio.shield(future)
+            except asyncio.CancelledError:
+                task = asyncio.current_task()
+                if future.cancelled() and not task.cancelling():
+                    # leader被取消而本调用方没有：重新发起
+                    self.stats["coalesced"] -= 1
+                    self.stats["rejoined"] += 1
+                    continue
+                raise
+            return copy.deepcopy(result), True
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        self.stats["executed"] += 1
+        try:
+            result = await fn()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            future.exception()  # 标记已读取，避免无人等待时的告警
+            raise
+        else:
+            future.set_result(result)
+            return result, False
+        finally:
+            self._inflight.pop(key, None)
+
+    def in_flight(self) -> int:
+        """当前飞行中的请求数"""
+        return len(self._inflight)
+
+    def get_stats(self) -> Dict:
+        """合并统计"""
+        calls = self.stats["calls"]
+        return {
+            **self.stats,
+            "in_flight": self.in_flight(),
+            "coalesce_rate": self.stats["coalesced"] / calls if calls else 0.0
+        }
+
+
+# ============== 全局单例 ==============
+
+_single_flight: Optional[SingleFlight] = None
+
+
+def get_single_flight() -> SingleFlight:
+    """获取进程级请求合并组（NEXUS_SINGLE_FLIGHT=0 可关闭）"""
+    global _single_flight
+    if _single_flight is None:
+        enabled = os.getenv("NEXUS_SINGLE_FLIGHT", "1").lower() not in ("0", "false", "no")
+        _single_flight = SingleFlight(enabled=enabled)
+    return _single_flight
@@ -0,0 +1,267 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+State Log - 事件溯源状态日志
+每次状态变化（提案创建/审批、步骤开始/结束、任务结束、财务变动、完成一天）追加一条记录到日志分段:
+    data/state_log/log-000000000001.jsonl          每行 {"seq", "ts", "op", "data"}
+    data/state_log/snapshot-000000001000.json.gz   截至 seq 的完整状态
+每 snapshot_every 条记录做一次快照并开始新分段；重启时加载最新快照，只重放其后的记录，
+不再重新运行模拟的每一天。快照之前的分段和多余的旧快照会被删除（压缩），长期运行磁盘占用有界
+
+    NEXUS_STATE_LOG=data/state_log python3 closed_loop_company.py
+    默认不设置，即不记录
+"""
+
+import os
+import re
+import gzip
+import json
+import time
+import dataclasses
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+from dataclasses import dataclass
+
+from state_store import StateTable, to_record
+
+
+# 表名 → 记录类型前缀（op = 前缀_状态，如 proposal_pending / step_running / mission_failed）
+TABLE_OPS = {
+    "proposals": "proposal",
+    "missions": "mission",
+    "steps": "step",
+}
+OP_TABLES = {prefix: table for table, prefix in TABLE_OPS.items()}
+
+
+@dataclass
+class StateLogConfig:
+    """状态日志配置"""
+    log_dir: Optional[str] = None       # 日志目录，None表示不记录（默认）
+    snapshot_every: int = 1000          # 每多少条记录做一次快照
+    keep_snapshots: int = 2             # 保留的快照数（最旧快照之前的分段会被删除）
+    retain_finished: int = 1000         # 快照中每张表保留的已结束记录数
+
+    @classmethod
+    def from_env(cls) -> "StateLogConfig":
+        """从环境变量读取配置"""
+        return cls(
+            log_dir=os.getenv("NEXUS_STATE_LOG") or None,
+            snapshot_every=int(os.getenv("NEXUS_STATE_SNAPSHOT_EVERY", "1000")),
+            keep_snapshots=int(os.getenv("NEXUS_STATE_KEEP_SNAPSHOTS", "2")),
+            retain_finished=int(os.getenv("NEXUS_STATE_RETAIN_FINISHED", "1000"))
+        )
+
+
+_SEGMENT = re.compile(r"^log-(\d{12})\.jsonl$")
+_SNAPSHOT = re.compile(r"^snapshot-(\d{12})\.json\.gz$")
+
+
+class StateLog:
+    """
+    状态日志
+    表的变化由 StateStore.observe(log.record) 自动记录，财务变动、完成一天等由公司系统调用 append()；
+    capture 回调返回快照需要的额外状态（财务、已完成天数等）
+    """
+
+    def __init__(self, config: StateLogConfig = None):
+        self.config = config or StateLogConfig.from_env()
+        self.tables: Dict[str, StateTable] = {}
+        self.capture: Optional[Callable[[], Dict[str, Any]]] = None
+        self.seq = 0
+        self.snapshot_seq = 0
+        self._file = None
+        self._since_snapshot = 0
+        self.stats = {
+            "appended": 0,
+            "replayed": 0,
+            "snapshots": 0,
+            "compacted_segments": 0,
+            "compacted_snapshots": 0,
+            "snapshot_ms": 0.0,
+            "recovery_ms": 0.0
+        }
+        if self.config.log_dir:
+            os.makedirs(self.config.log_dir, exist_ok=True)
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.config.log_dir)
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.config.log_dir, name)
+
+    def _listing(self, pattern) -> List[Tuple[int, str]]:
+        return sorted((int(m.group(1)), f) for f in os.listdir(self.config.log_dir) if (m := pattern.match(f)))
+
+    # ============== 写入 ==============
+
+    def record(self, table: str, obj):
+        """表记录变化（StateStore 观察者回调），整条记录写入，重放时按 id 覆盖"""
+        if table in TABLE_OPS:
+            status = getattr(obj, "status", None)
+            status = getattr(status, "value", status)
+            self.append(f"{TABLE_OPS[table]}_{status}", to_record(obj))
+
+    def append(self, op: str, data: Dict[str, Any]):
+        """追加一条状态变化记录，达到快照间隔时做快照"""
+        if not self.enabled:
+            return
+        if self._file is None:
+            self._file = open(self._path(f"log-{self.seq + 1:012d}.jsonl"), "a", encoding="utf-8")
+        self.seq += 1
+        self._file.write(json.dumps(
+            {"seq": self.seq, "ts": datetime.now().isoformat(), "op": op, "data": data},
+            ensure_ascii=False, separators=(",", ":"), default=str
+        ) + "\n")
+        self._file.flush()
+        self.stats["appended"] += 1
+        self._since_snapshot += 1
+        if self._since_snapshot >= self.config.snapshot_every:
+            self.snapshot()
+
+    # ============== 快照与压缩 ==============
+
+    def snapshot(self):
+        """写入截至当前 seq 的完整状态快照，开始新分段并压缩旧日志"""
+        if not self.enabled or self.seq == self.snapshot_seq:
+            return
+        started = time.perf_counter()
+        state = {"tables": {name: self._capture_table(table) for name, table in self.tables.items()}}
+        if self.capture:
+            state.update(self.capture())
+
+        path = self._path(f"snapshot-{self.seq:012d}.json.gz")
+        with gzip.open(path + ".tmp", "wt", encoding="utf-8") as f:
+            json.dump({"seq": self.seq, "created_at": datetime.now().isoformat(), "state": state},
+                      f, ensure_ascii=False, separators=(",", ":"), default=str)
+        os.replace(path + ".tmp", path)
+
+        if self._file:
+            self._file.close()
+            self._file = None
+        self.snapshot_seq = self.seq
+        self._since_snapshot = 0
+        self.stats["snapshots"] += 1
+        self.stats["snapshot_ms"] += (time.perf_counter() - started) * 1000
+        self.compact()
+
+    def _capture_table(self, table: StateTable) -> List[Dict]:
+        """未结束的记录全部保留，已结束的只保留最近 retain_finished 条"""
+        objects = list(table.memory.values())
+        finished = [obj for obj in objects if not table.is_live(obj)]
+        dropped = set(id(obj) for obj in finished[:max(0, len(finished) - self.config.retain_finished)])
+        return [to_record(obj) for obj in objects if id(obj) not in dropped]
+
+    def compact(self):
+        """删除多余的旧快照，以及最旧保留快照之前的日志分段"""
+        snapshots = self._listing(_SNAPSHOT)
+        for _, name in snapshots[:-max(1, self.config.keep_snapshots)]:
+            os.remove(self._path(name))
+            self.stats["compacted_snapshots"] += 1
+        kept = self._listing(_SNAPSHOT)
+        if not kept:
+            return
+        oldest = kept[0][0]
+        for first_seq, name in self._listing(_SEGMENT):
+            # 分段在快照时切换，起始 seq 不晚于最旧快照的分段已被快照完全覆盖
+            if first_seq <= oldest:
+                os.remove(self._path(name))
+                self.stats["compacted_segments"] += 1
+
+    # ============== 恢复 ==============
+
+    def recover(self, restore: Callable[[Dict[str, Any]], None], apply: Callable[[str, Dict[str, Any]], None]) -> bool:
+        """
+        加载最新快照并重放之后的记录
+
+        Args:
+            restore: 恢复快照中的额外状态（capture 返回的内容），在重放之前调用
+            apply: 非表记录（财务变动、完成一天等）的重放回调 apply(op, data)
+
+        Returns:
+            是否恢复了任何状态
+        """
+        if not self.enabled:
+            return False
+        started = time.perf_counter()
+        state = None
+        for _, name in reversed(self._listing(_SNAPSHOT)):
+            try:
+                with gzip.open(self._path(name), "rt", encoding="utf-8") as f:
+                    snapshot = json.load(f)
+            except (OSError, ValueError, EOFError):
+                continue   # 写入中断的快照，退回上一个
+            state = snapshot["state"]
+            self.snapshot_seq = self.seq = snapshot["seq"]
+            # Mission.steps 按 id 引用步骤，先恢复步骤
+            for table_name in ("steps", "missions", "proposals"):
+                for record in state.get("tables", {}).get(table_name, []):
+                    self._apply_record(table_name, record)
+            restore({k: v for k, v in state.items() if k != "tables"})
+            break
+
+        for entry in self._tail(self.snapshot_seq):
+            self.seq = entry["seq"]
+            prefix = entry["op"].split("_", 1)[0]
+            if prefix in OP_TABLES:
+                self._apply_record(OP_TABLES[prefix], entry["data"])
+            else:
+                apply(entry["op"], entry["data"])
+            self.stats["replayed"] += 1
+        self._since_snapshot = self.seq - self.snapshot_seq
+        self.stats["recovery_ms"] = (time.perf_counter() - started) * 1000
+        return state is not None or self.stats["replayed"] > 0
+
+    def _tail(self, after_seq: int) -> Iterator[Dict]:
+        for _, name in self._listing(_SEGMENT):
+            with open(self._path(name), encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        break   # 进程中断时写了一半的最后一行
+                    if entry["seq"] > after_seq:
+                        yield entry
+
+    def _apply_record(self, table_name: str, record: Dict[str, Any]):
+        """按 id 覆盖表中的记录（已存在的对象原地更新，保持 Mission.steps 等引用有效）"""
+        table = self.tables.get(table_name)
+        if table is None:
+            return
+        obj = table.decode(record)
+        existing = table.memory.get(obj.id)
+        if existing is None:
+            table[obj.id] = obj
+            return
+        for f in dataclasses.fields(obj):
+            setattr(existing, f.name, getattr(obj, f.name))
+        table.save(existing)
+
+    @staticmethod
+    def financial_delta(before: Dict[str, Any], after: Dict[str, Any]) -> Dict[str, float]:
+        """数值类财务字段的变化量"""
+        return {
+            key: value - before.get(key, 0)
+            for key, value in after.items()
+            if isinstance(value, (int, float)) and value != before.get(key, 0)
+        }
+
+    def close(self):
+        """做最后一次快照（下次启动无需重放）并关闭分段"""
+        self.snapshot()
+        if self._file:
+            self._file.close()
+            self._file = None
+
+    def get_stats(self) -> Dict:
+        """日志统计"""
+        if not self.enabled:
+            return {**self.stats, "enabled": False}
+        return {
+            **self.stats,
+            "enabled": True,
+            "seq": self.seq,
+            "snapshot_seq": self.snapshot_seq,
+            "disk_bytes": sum(os.path.getsize(self._path(f)) for f in os.listdir(self.config.log_dir))
+        }
@@ -0,0 +1,435 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+State Store - 提案/任务/步骤/事件/策略的SQLite持久化
+替代原来只存在内存中的 dict（原设计中的 Supabase 表），进程退出后状态不丢失:
+    - WAL 模式，写入采用 write-behind：修改只标记为脏，按批次（数量或时间间隔）合并为一个事务写入
+    - status / step_kind / started_at 等查询字段建索引，其余字段存为JSON
+    - 启动时只加载未结束的提案/任务/步骤，历史记录按需从库中读取（StateTable 惰性加载）
+
+    NEXUS_STATE_DB=data/state.db python3 closed_loop_company.py
+    默认不设置，即纯内存模式（与原 dict 行为一致）
+"""
+
+import os
+import json
+import time
+import asyncio
+import sqlite3
+import dataclasses
+from collections import OrderedDict
+from datetime import datetime
+from enum import Enum
+from typing import (Any, Callable, Dict, Iterable, Iterator, List, MutableMapping, Optional, Tuple,
+                    Union, get_args, get_origin, get_type_hints)
+from dataclasses import dataclass
+
+
+@dataclass
+class StoreConfig:
+    """持久化配置"""
+    db_path: Optional[str] = None       # SQLite路径，None表示纯内存（默认）
+    flush_interval: float = 1.0         # 后台写入间隔(秒)
+    flush_batch: int = 500              # 脏记录达到该数量时立即写入
+    cache_size: int = 1000              # 每张表在内存中保留的已结束记录数
+
+    @classmethod
+    def from_env(cls) -> "StoreConfig":
+        """从环境变量读取配置"""
+        return cls(
+            db_path=os.getenv("NEXUS_STATE_DB") or None,
+            flush_interval=float(os.getenv("NEXUS_STATE_FLUSH_INTERVAL", "1.0")),
+            flush_batch=int(os.getenv("NEXUS_STATE_FLUSH_BATCH", "500")),
+            cache_size=int(os.getenv("NEXUS_STATE_CACHE", "1000"))
+        )
+
+
+# 表结构：单独成列（可建索引）的字段，其余字段存在 data(JSON) 中
+TABLES = {
+    "proposals": {
+        "columns": ["status", "proposed_by", "created_at"],
+        "indexes": [["status"], ["created_at"]],
+    },
+    "missions": {
+        "columns": ["proposal_id", "status", "created_at", "completed_at"],
+        "indexes": [["status"], ["proposal_id"]],
+    },
+    "steps": {
+        "columns": ["mission_id", "step_kind", "status", "assigned_to", "started_at", "completed_at"],
+        "indexes": [["status"], ["step_kind", "started_at"], ["mission_id"]],
+    },
+}
+
+EVENT_COLUMNS = ["id", "agent_id", "event_type", "created_at"]
+
+
+# ============== 序列化 ==============
+
+def _plain(value: Any) -> Any:
+    """列值/JSON值：datetime→ISO字符串，Enum→value"""
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, Enum):
+        return value.value
+    return value
+
+
+def to_record(obj) -> Dict[str, Any]:
+    """dataclass → 记录；嵌套的带 id 的 dataclass（如 Mission.steps）只保存 id"""
+    record = {}
+    for f in dataclasses.fields(obj):
+        value = getattr(obj, f.name)
+        if dataclasses.is_dataclass(value) and hasattr(value, "id"):
+            value = value.id
+        elif isinstance(value, list) and value and all(dataclasses.is_dataclass(v) and hasattr(v, "id") for v in value):
+            value = [v.id for v in value]
+        record[f.name] = _plain(value)
+    return record
+
+
+def from_record(cls, record: Dict[str, Any], resolvers: Dict[str, Callable[[Any], Any]] = None):
+    """记录 → dataclass；按类型注解还原 datetime / Enum，resolvers 还原按 id 保存的嵌套对象"""
+    resolvers = resolvers or {}
+    hints = get_type_hints(cls)
+    values = {}
+    for f in dataclasses.fields(cls):
+        if f.name not in record:
+            continue
+        value = record[f.name]
+        if f.name in resolvers:
+            value = resolvers[f.name](value)
+        elif value is not None:
+            value = _restore(hints.get(f.name), value)
+        values[f.name] = value
+    return cls(**values)
+
+
+def _restore(hint, value):
+    if get_origin(hint) is Union:
+        hint = next((a for a in get_args(hint) if a is not type(None)), None)
+    if hint is datetime and isinstance(value, str):
+        return datetime.fromisoformat(value)
+    if isinstance(hint, type) and issubclass(hint, Enum):
+        return hint(value)
+    return value
+
+
+def _dumps(value: Any) -> str:
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":"), default=str)
+
+
+# ============== Store ==============
+
+class StateStore:
+    """
+    状态存储
+    save() 只把对象标记为脏，flush() 把所有脏对象合并为一个事务写入；
+    同一对象在一个批次内多次修改只写一次
+    """
+
+    def __init__(self, config: StoreConfig = None):
+        self.config = config or StoreConfig.from_env()
+        self._db: Optional[sqlite3.Connection] = None
+        self._dirty: Dict[str, "OrderedDict[str, Any]"] = {table: OrderedDict() for table in TABLES}
+        self._events: List[Any] = []
+        self._tables: Dict[str, "StateTable"] = {}
+        self._observers: List[Callable[[str, Any], None]] = []
+        self._flusher: Optional[asyncio.Task] = None
+        self.stats = {
+            "flushes": 0,
+            "rows_written": 0,
+            "events_written": 0,
+            "lazy_loads": 0,
+            "evicted": 0,
+            "flush_ms": 0.0
+        }
+
+        if self.config.db_path:
+            self._init_db(self.config.db_path)
+
+    @property
+    def persistent(self) -> bool:
+        return self._db is not None
+
+    def _init_db(self, db_path: str):
+        """初始化数据库（WAL模式）"""
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._db = sqlite3.connect(db_path)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        for table, spec in TABLES.items():
+            columns = "".join(f", {c} TEXT" for c in spec["columns"])
+            self._db.execute(f"CREATE TABLE IF NOT EXISTS {table} (id TEXT PRIMARY KEY{columns}, data TEXT NOT NULL)")
+            for index in spec["indexes"]:
+                self._db.execute(
+                    f"CREATE INDEX IF NOT EXISTS idx_{table}_{'_'.join(index)} ON {table}({', '.join(index)})"
+                )
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS events (
+                seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                id TEXT, agent_id TEXT, event_type TEXT, created_at TEXT,
+                data TEXT NOT NULL
+            )
+        """)
+        self._db.execute("CREATE INDEX IF NOT EXISTS idx_events_type_created ON events(event_type, created_at)")
+        self._db.execute("CREATE TABLE IF NOT EXISTS policies (name TEXT PRIMARY KEY, data TEXT NOT NULL)")
+        self._db.commit()
+
+    # ============== 表 ==============
+
+    def table(self, name: str, decode: Callable[[Dict], Any], is_live: Callable[[Any], bool]) -> "StateTable":
+        """获取惰性加载的表视图（持久化模式下预先加载未结束的记录）"""
+        table = StateTable(self, name, decode, is_live)
+        self._tables[name] = table
+        return table
+
+    # ============== 写入 ==============
+
+    def observe(self, callback: Callable[[str, Any], None]):
+        """注册表变化观察者 callback(表名, 对象)（如状态日志），纯内存模式下同样生效"""
+        self._observers.append(callback)
+
+    def changed(self, table: str, obj):
+        """表中对象新增或修改：标记为脏并通知观察者"""
+        self.save(table, obj)
+        for callback in self._observers:
+            callback(table, obj)
+
+    def save(self, table: str, obj):
+        """标记对象为脏（write-behind）"""
+        if not self._db:
+            return
+        dirty = self._dirty[table]
+        dirty[obj.id] = obj
+        dirty.move_to_end(obj.id)
+        self._maybe_flush()
+
+    def append_event(self, event):
+        """追加事件（只写不改）"""
+        if not self._db:
+            return
+        self._events.append(event)
+        self._maybe_flush()
+
+    def pending_writes(self) -> int:
+        return sum(len(d) for d in self._dirty.values()) + len(self._events)
+
+    def _maybe_flush(self):
+        if self.pending_writes() >= self.config.flush_batch:
+            self.flush()
+
+    def flush(self):
+        """把所有脏对象和新事件合并为一个事务写入"""
+        if not self._db or not self.pending_writes():
+            return
+        started = time.perf_counter()
+        with self._db:
+            for table, dirty in self._dirty.items():
+                if not dirty:
+                    continue
+                columns = TABLES[table]["columns"]
+                rows = []
+                for obj in dirty.values():
+                    record = to_record(obj)
+                    rows.append((obj.id, *(record.get(c) for c in columns), _dumps(record)))
+                placeholders = ", ".join("?" * (len(columns) + 2))
+                updates = ", ".join(f"{c} = excluded.{c}" for c in [*columns, "data"])
+                self._db.executemany(
+                    f"INSERT INTO {table} (id, {', '.join(columns)}, data) VALUES ({placeholders}) "
+                    f"ON CONFLICT(id) DO UPDATE SET {updates}",
+                    rows
+                )
+                self.stats["rows_written"] += len(rows)
+                dirty.clear()
+            if self._events:
+                self._db.executemany(
+                    "INSERT INTO events (id, agent_id, event_type, created_at, data) VALUES (?, ?, ?, ?, ?)",
+                    [
+                        (*(_plain(getattr(e, c, None)) for c in EVENT_COLUMNS), _dumps(to_record(e)))
+                        for e in self._events
+                    ]
+                )
+                self.stats["events_written"] += len(self._events)
+                self._events.clear()
+        self.stats["flushes"] += 1
+        self.stats["flush_ms"] += (time.perf_counter() - started) * 1000
+        for table in self._tables.values():
+            table.evict()
+
+    def start(self):
+        """在当前事件循环中启动后台定时写入"""
+        if self._db and self._flusher is None:
+            self._flusher = asyncio.ensure_future(self._flush_loop())
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(self.config.flush_interval)
+            self.flush()
+
+    async def close(self):
+        """停止后台写入并写入剩余脏数据（连接保持打开，可继续使用）"""
+        if self._flusher:
+            self._flusher.cancel()
+            await asyncio.gather(self._flusher, return_exceptions=True)
+            self._flusher = None
+        self.flush()
+
+    # ============== 读取 ==============
+
+    def get(self, table: str, key: str) -> Optional[Dict]:
+        """按 id 读取记录（含尚未写入的脏对象）"""
+        if not self._db:
+            return None
+        obj = self._dirty[table].get(key)
+        if obj is not None:
+            return to_record(obj)
+        row = self._db.execute(f"SELECT data FROM {table} WHERE id = ?", (key,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def query(self, table: str, limit: Optional[int] = None, order_by: str = None, **filters) -> List[Dict]:
+        """按索引列查询记录（值为列表/元组时按 IN 匹配），查询前先写入脏数据"""
+        if not self._db:
+            return []
+        self.flush()
+        where, params = self._where(table, filters)
+        sql = f"SELECT data FROM {table}{where}"
+        if order_by:
+            sql += f" ORDER BY {self._column(table, order_by.lstrip('-'))}{' DESC' if order_by.startswith('-') else ''}"
+        if limit is not None:
+            sql += f" LIMIT {int(limit)}"
+        return [json.loads(row[0]) for row in self._db.execute(sql, params)]
+
+    def count(self, table: str, **filters) -> int:
+        """按索引列计数"""
+        if not self._db:
+            return 0
+        self.flush()
+        where, params = self._where(table, filters)
+        return self._db.execute(f"SELECT COUNT(*) FROM {table}{where}", params).fetchone()[0]
+
+    def _column(self, table: str, column: str) -> str:
+        columns = EVENT_COLUMNS if table == "events" else ["id", *TABLES[table]["columns"]]
+        if column not in columns:
+            raise ValueError(f"{table} 没有可查询的列: {column}")
+        return column
+
+    def _where(self, table: str, filters: Dict[str, Any]) -> Tuple[str, list]:
+        clauses, params = [], []
+        for column, value in filters.items():
+            column = self._column(table, column)
+            if isinstance(value, (list, tuple, set)):
+                values = [_plain(v) for v in value]
+                clauses.append(f"{column} IN ({', '.join('?' * len(values))})")
+                params.extend(values)
+            else:
+                clauses.append(f"{column} = ?")
+                params.append(_plain(value))
+        return (" WHERE " + " AND ".join(clauses) if clauses else ""), params
+
+    # ============== 策略 ==============
+
+    def load_policies(self, defaults: Dict[str, Any], keys: Iterable[str]) -> Dict[str, Any]:
+        """
+        策略表（替代 ops_policy 表）：keys 中的策略以库中已有的值为准（可直接修改表调整策略），
+        库中没有时写入默认值；其余策略始终使用代码中的默认值
+        """
+        policies = dict(defaults)
+        if not self._db:
+            return policies
+        with self._db:
+            for name in keys:
+                row = self._db.execute("SELECT data FROM policies WHERE name = ?", (name,)).fetchone()
+                if row:
+                    policies[name] = json.loads(row[0])
+                elif name in defaults:
+                    self._db.execute("INSERT INTO policies (name, data) VALUES (?, ?)", (name, _dumps(defaults[name])))
+        return policies
+
+    def get_stats(self) -> Dict:
+        """存储统计"""
+        return {
+            **self.stats,
+            "persistent": self.persistent,
+            "pending": self.pending_writes(),
+            "resident": {name: len(table.memory) for name, table in self._tables.items()}
+        }
+
+
+class StateTable(MutableMapping):
+    """
+    惰性加载的表视图，用法与原来的 dict 相同
+    内存中保留全部未结束的记录和最近 cache_size 条已结束的记录，更早的记录按 id 访问时从库中加载；
+    迭代 / values() 只覆盖内存中的记录，全量统计使用 count()
+    纯内存模式下就是普通 dict（不淘汰）
+    """
+
+    def __init__(self, store: StateStore, name: str, decode: Callable[[Dict], Any], is_live: Callable[[Any], bool]):
+        self.store = store
+        self.name = name
+        self.decode = decode
+        self.is_live = is_live
+        self.memory: "OrderedDict[str, Any]" = OrderedDict()
+
+    def load_live(self, **filters):
+        """启动时加载未结束的记录（filters 为匹配未结束状态的索引列条件）"""
+        for record in self.store.query(self.name, order_by="id", **filters):
+            self.memory[record["id"]] = self.decode(record)
+
+    def save(self, obj):
+        """对象被修改后调用，标记为脏"""
+        if obj.id in self.memory:
+            self.memory.move_to_end(obj.id)
+        self.store.changed(self.name, obj)
+
+    def count(self, **filters) -> int:
+        """按索引列计数（持久化模式下查询全量）"""
+        if self.store.persistent:
+            return self.store.count(self.name, **filters)
+        return sum(
+            1 for obj in self.memory.values()
+            if all(_plain(getattr(obj, k)) == _plain(v) for k, v in filters.items())
+        )
+
+    def evict(self):
+        """淘汰超出缓存容量的已结束记录（已写入库，之后按需加载）"""
+        excess = sum(1 for obj in self.memory.values() if not self.is_live(obj)) - self.store.config.cache_size
+        if excess <= 0 or not self.store.persistent:
+            return
+        for key in list(self.memory):
+            if excess <= 0:
+                break
+            if not self.is_live(self.memory[key]):
+                del self.memory[key]
+                excess -= 1
+                self.store.stats["evicted"] += 1
+
+    def __getitem__(self, key: str):
+        obj = self.memory.get(key)
+        if obj is not None:
+            return obj
+        record = self.store.get(self.name, key)
+        if record is None:
+            raise KeyError(key)
+        obj = self.decode(record)
+        self.memory[key] = obj
+        self.store.stats["lazy_loads"] += 1
+        return obj
+
+    def __setitem__(self, key: str, obj):
+        self.memory[key] = obj
+        self.memory.move_to_end(key)
+        self.store.changed(self.name, obj)
+
+    def __delitem__(self, key: str):
+        del self.memory[key]
+
+    def __contains__(self, key) -> bool:
+        return key in self.memory or self.store.get(self.name, key) is not None
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(list(self.memory))
+
+    def __len__(self) -> int:
+        return len(self.memory)
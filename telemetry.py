@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+LLM Telemetry - 调用级遥测
+记录每次Agent调用的排队等待、首字节延迟、总延迟、token用量、状态、重试和估算成本，
+按 agent_id / model / step_kind 聚合为直方图供仪表盘和总结读取
+"""
+
+import os
+import time
+from bisect import bisect_left
+from collections import deque
+from typing import Deque, Dict, List, Optional, Tuple, Union
+from dataclasses import dataclass, field, asdict
+
+
+# 每百万token价格 (输入, 输出)，单位：元
+MODEL_PRICING: Dict[str, Tuple[float, float]] = {
+    "kimi-coding/k2p5": (4.0, 16.0),
+    "kimi-k2": (4.0, 16.0),
+    "moonshot-v1-8k": (12.0, 12.0),
+}
+DEFAULT_PRICING = (4.0, 16.0)
+CACHE_READ_RATIO = 0.1    # 前缀缓存命中部分按输入价的比例计费
+CACHE_WRITE_RATIO = 1.25  # 前缀缓存写入部分按输入价的比例计费
+
+# 延迟直方图桶上界(ms)
+LATENCY_BUCKETS_MS = [50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000, 60000]
+
+
+def estimate_cost(model: str, input_tokens: int, output_tokens: int,
+                  cache_read_tokens: int = 0, cache_write_tokens: int = 0) -> float:
+    """估算单次调用成本（NEXUS_PRICE_INPUT / NEXUS_PRICE_OUTPUT 可覆盖价格）"""
+    price_in, price_out = MODEL_PRICING.get(model, DEFAULT_PRICING)
+    price_in = float(os.getenv("NEXUS_PRICE_INPUT", price_in))
+    price_out = float(os.getenv("NEXUS_PRICE_OUTPUT", price_out))
+    return (
+        input_tokens * price_in
+        + output_tokens * price_out
+        + cache_read_tokens * price_in * CACHE_READ_RATIO
+        + cache_write_tokens * price_in * CACHE_WRITE_RATIO
+    ) / 1_000_000
+
+
+@dataclass
+class CallRecord:
+    """单次Agent调用的指标"""
+    agent_id: str
+    model: str
+    step_kind: Optional[str]
+    status: Union[int, str]          # HTTP状态码，或 cache / replay / fallback / circuit_open / error
+    latency_ms: float
+    queue_wait_ms: float = 0.0
+    ttfb_ms: Optional[float] = None
+    input_tokens: int = 0
+    output_tokens: int = 0
+    cache_read_tokens: int = 0
+    cache_write_tokens: int = 0
+    retries: int = 0
+    hedged: bool = False
+    cache_hit: bool = False
+    coalesced: bool = False
+    cost: float = 0.0
+    timestamp: float = field(default_factory=time.time)
+
+    @property
+    def ok(self) -> bool:
+        return self.status in (200, "cache", "replay")
+
+
+class Histogram:
+    """固定桶直方图"""
+
+    def __init__(self, buckets: List[float] = None):
+        self.buckets = buckets or LATENCY_BUCKETS_MS
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.total += value
+        self.max = max(self.max, value)
+
+    def quantile(self, q: float) -> float:
+        """按桶上界近似分位数"""
+        if not self.count:
+            return 0.0
+        target = q * self.count
+        seen = 0
+        for i, c in enumerate(self.counts):
+            seen += c
+            if seen >= target:
+                return float(self.buckets[i]) if i < len(self.buckets) else self.max
+        return self.max
+
+    def to_dict(self) -> Dict:
+        return {
+            "count": self.count,
+            "avg": round(self.total / self.count, 1) if self.count else 0.0,
+            "p50": self.quantile(0.5),
+            "p95": self.quantile(0.95),
+            "max": round(self.max, 1),
+            "buckets": dict(zip([f"le_{b}" for b in self.buckets] + ["inf"], self.counts))
+        }
+
+
+class CallAggregate:
+    """某一维度取值下的累计指标"""
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.retries = 0
+        self.cache_hits = 0
+        self.coalesced = 0
+        self.input_tokens = 0
+        self.output_tokens = 0
+        self.cache_read_tokens = 0
+        self.cost = 0.0
+        self.latency = Histogram()
+        self.ttfb = Histogram()
+        self.queue_wait = Histogram()
+
+    def add(self, record: CallRecord):
+        self.calls += 1
+        self.errors += 0 if record.ok else 1
+        self.retries += record.retries
+        self.cache_hits += 1 if record.cache_hit else 0
+        self.coalesced += 1 if record.coalesced else 0
+        self.input_tokens += record.input_tokens
+        self.output_tokens += record.output_tokens
+        self.cache_read_tokens += record.cache_read_tokens
+        self.cost += record.cost
+        self.latency.observe(record.latency_ms)
+        self.queue_wait.observe(record.queue_wait_ms)
+        if record.ttfb_ms is not None:
+            self.ttfb.observe(record.ttfb_ms)
+
+    def to_dict(self) -> Dict:
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "retries": self.retries,
+            "cache_hits": self.cache_hits,
+            "coalesced": self.coalesced,
+            "input_tokens": self.input_tokens,
+            "output_tokens": self.output_tokens,
+            "cache_read_tokens": self.cache_read_tokens,
+            "cost": round(self.cost, 4),
+            "latency_ms": self.latency.to_dict(),
+            "ttfb_ms": self.ttfb.to_dict(),
+            "queue_wait_ms": self.queue_wait.to_dict()
+        }
+
+
+class TelemetryCollector:
+    """遥测收集器"""
+
+    DIMENSIONS = ("agent_id", "model", "step_kind")
+
+    def __init__(self, recent_size: int = 500):
+        self.recent: Deque[CallRecord] = deque(maxlen=recent_size)
+        self.totals = CallAggregate()
+        self._by: Dict[str, Dict[str, CallAggregate]] = {dim: {} for dim in self.DIMENSIONS}
+
+    def record(self, record: CallRecord):
+        """记录一次调用"""
+        self.recent.append(record)
+        self.totals.add(record)
+        for dim in self.DIMENSIONS:
+            value = getattr(record, dim) or "unknown"
+            aggregate = self._by[dim].get(value)
+            if aggregate is None:
+                aggregate = self._by[dim][value] = CallAggregate()
+            aggregate.add(record)
+
+    def by(self, dimension: str) -> Dict[str, Dict]:
+        """按维度读取聚合指标"""
+        return {value: agg.to_dict() for value, agg in self._by[dimension].items()}
+
+    def snapshot(self, recent: int = 10) -> Dict:
+        """仪表盘数据"""
+        return {
+            "totals": self.totals.to_dict(),
+            "by_agent": self.by("agent_id"),
+            "by_model": self.by("model"),
+            "by_step_kind": self.by("step_kind"),
+            "recent_calls": [asdict(r) for r in list(self.recent)[-recent:]]
+        }
+
+    def reset(self):
+        self.__init__(self.recent.maxlen)
+
+
+# ============== 全局单例 ==============
+
+_telemetry: Optional[TelemetryCollector] = None
+
+
+def get_telemetry() -> TelemetryCollector:
+    """获取进程级遥测收集器"""
+    global _telemetry
+    if _telemetry is None:
+        _telemetry = TelemetryCollector()
+    return _telemetry
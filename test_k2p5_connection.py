@@ -125,9 +125,18 @@ async def test_k2p5_connection():
     
     print(f"\n📝 API Key: {api_key[:15]}...{api_key[-10:]}")
     
-    # 测试所有端点
+    # 测试所有端点（设置 KIMI_BASE_URL 时优先测试该地址，如本地 mock_llm_server.py）
+    endpoints = list(API_ENDPOINTS)
+    custom_url = os.getenv("KIMI_BASE_URL")
+    if custom_url:
+        endpoints.insert(0, {
+            "name": "Custom (KIMI_BASE_URL)",
+            "base_url": custom_url.rstrip("/"),
+            "model": "kimi-coding/k2p5"
+        })
+
     results = []
-    for endpoint in API_ENDPOINTS:
+    for endpoint in endpoints:
         result = await test_endpoint(endpoint, api_key)
         results.append(result)
         
@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Nexus AI - 状态日志测试
+验证快照 + 日志分段的写入、重启恢复、中断后重放和压缩
+
+    python3 -m pytest test_state_log.py -q
+"""
+
+import os
+import sys
+from enum import Enum
+from pathlib import Path
+from dataclasses import dataclass
+
+sys.path.insert(0, str(Path(__file__).parent))
+
+from state_store import StateStore, StoreConfig, from_record
+from state_log import StateLog, StateLogConfig
+
+
+class Status(Enum):
+    RUNNING = "running"
+    DONE = "done"
+
+
+@dataclass
+class Step:
+    id: str
+    status: Status = Status.RUNNING
+    result: str = ""
+
+
+class Company:
+    """最小的公司系统：一张步骤表 + 一个随快照保存、按记录重放的现金字段"""
+
+    def __init__(self, log_dir: str, snapshot_every: int = 1000, keep_snapshots: int = 2):
+        self.store = StateStore(StoreConfig(db_path=None))
+        self.steps = self.store.table("steps", lambda r: from_record(Step, r), lambda s: s.status == Status.RUNNING)
+        self.cash = 0
+        self.log = StateLog(StateLogConfig(log_dir=log_dir, snapshot_every=snapshot_every,
+                                           keep_snapshots=keep_snapshots))
+        self.log.tables["steps"] = self.steps
+        self.log.capture = lambda: {"cash": self.cash}
+        self.recovered = self.log.recover(self._restore, self._apply)
+        self.store.observe(self.log.record)
+
+    def _restore(self, state):
+        self.cash = state.get("cash", 0)
+
+    def _apply(self, op, data):
+        if op == "cash_delta":
+            self.cash += data["amount"]
+
+    def start(self, step_id: str):
+        self.steps[step_id] = Step(step_id)
+
+    def finish(self, step_id: str, result: str):
+        step = self.steps[step_id]
+        step.status = Status.DONE
+        step.result = result
+        self.steps.save(step)
+
+    def spend(self, amount: int):
+        self.cash += amount
+        self.log.append("cash_delta", {"amount": amount})
+
+    def state(self):
+        return {sid: (s.status, s.result) for sid, s in self.steps.memory.items()}, self.cash
+
+
+def _files(log_dir, prefix: str):
+    return sorted(f for f in os.listdir(log_dir) if f.startswith(prefix))
+
+
+def test_snapshot_and_reopen(tmp_path):
+    """正常关闭时做最终快照，重启只加载快照不重放"""
+    company = Company(str(tmp_path))
+    assert not company.recovered
+    for i in range(5):
+        company.start(f"s{i}")
+    company.finish("s1", "ok")
+    company.finish("s3", "failed")
+    company.spend(-300)
+    expected = company.state()
+    company.log.close()
+
+    reopened = Company(str(tmp_path))
+    assert reopened.recovered
+    assert reopened.state() == expected
+    assert reopened.log.stats["replayed"] == 0
+    assert reopened.log.seq == company.log.seq
+    assert reopened.steps["s0"].status == Status.RUNNING
+    assert reopened.steps["s1"].result == "ok"
+
+
+def test_replay_after_crash_mid_segment(tmp_path):
+    """进程中断：最新快照之后的记录从分段重放，写了一半的最后一行被忽略"""
+    company = Company(str(tmp_path), snapshot_every=4)
+    for i in range(4):
+        company.start(f"s{i}")                 # seq 1-4，快照 4
+    company.finish("s0", "ok")                 # seq 5
+    company.spend(-100)                        # seq 6
+    company.finish("s2", "ok")                 # seq 7
+    expected = company.state()
+    # 不调用 close()：最后一个分段没有快照覆盖，末尾追加半行模拟写入中断
+    company.log._file.write('{"seq":8,"ts":"2026-')
+    company.log._file.flush()
+
+    reopened = Company(str(tmp_path), snapshot_every=4)
+    assert reopened.recovered
+    assert reopened.state() == expected
+    assert reopened.log.snapshot_seq == 4
+    assert reopened.log.stats["replayed"] == 3
+    assert reopened.log.seq == 7
+
+    # 恢复后继续写入新分段，再次重启仍能恢复
+    reopened.finish("s1", "late")
+    expected = reopened.state()
+    again = Company(str(tmp_path), snapshot_every=4)
+    assert again.state() == expected
+    assert again.log.seq == 8
+
+
+def test_compact_keeps_segments_after_oldest_snapshot(tmp_path):
+    """压缩只删除被最旧保留快照覆盖的分段，从最旧快照也能恢复到最新状态"""
+    company = Company(str(tmp_path), snapshot_every=3, keep_snapshots=2)
+    for i in range(10):
+        company.start(f"s{i}")                 # 快照 3 / 6 / 9，分段从 1 / 4 / 7 / 10 开始
+    expected = company.state()
+
+    assert _files(tmp_path, "snapshot-") == ["snapshot-000000000006.json.gz", "snapshot-000000000009.json.gz"]
+    assert _files(tmp_path, "log-") == ["log-000000000007.jsonl", "log-000000000010.jsonl"]
+    assert company.log.stats["compacted_snapshots"] == 1
+    assert company.log.stats["compacted_segments"] == 2
+
+    # 最新快照损坏时退回最旧的保留快照，其后的分段仍然完整
+    with open(tmp_path / "snapshot-000000000009.json.gz", "wb") as f:
+        f.write(b"broken")
+    reopened = Company(str(tmp_path), snapshot_every=3, keep_snapshots=2)
+    assert reopened.state() == expected
+    assert reopened.log.snapshot_seq == 6
+    assert reopened.log.stats["replayed"] == 4
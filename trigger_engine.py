@@ -0,0 +1,247 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Trigger Engine - 按事件类型索引的触发器引擎
+TriggerRule.condition 在注册时编译为谓词并按监听的事件类型建立索引，
+每个事件只评估监听该类型的规则；冷却时间和触发概率按规则单独判断
+
+条件语法（注册时解析，语法错误直接报错）:
+    mission.failed                                 事件类型 mission_failed
+    mission.failed | mission.cancelled             监听多个事件类型
+    market_scan.done if payload.potential == "high" and payload.score >= 0.7
+    proposal.rejected if tags contains "market_scan"
+    字符串字面量中的 " and " / "|" 不参与拆分
+
+动作为 "动词:参数"（如 create_proposal:diagnose），动词由公司系统注册处理函数:
+    engine = TriggerEngine(actions={"create_proposal": handler})   # async handler(rule, event, 参数)
+    engine.register_all(rules)
+    engine.attach(event_bus)
+"""
+
+import re
+import json
+import random
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+from dataclasses import dataclass
+
+
+_SELECTOR = re.compile(r"^[A-Za-z_][\w]*(\.[A-Za-z_][\w]*)?$")
+_CLAUSE = re.compile(r"^(?P<path>[A-Za-z_][\w.]*)\s*(?:(?P<op>==|!=|>=|<=|>|<|\bin\b|\bcontains\b)\s*(?P<value>.+))?$")
+
+_OPERATORS: Dict[str, Callable[[Any, Any], bool]] = {
+    "==": lambda a, b: a == b,
+    "!=": lambda a, b: a != b,
+    ">": lambda a, b: a is not None and a > b,
+    ">=": lambda a, b: a is not None and a >= b,
+    "<": lambda a, b: a is not None and a < b,
+    "<=": lambda a, b: a is not None and a <= b,
+    "in": lambda a, b: a in b,
+    "contains": lambda a, b: a is not None and b in a,
+}
+
+
+class ConditionError(ValueError):
+    """触发条件语法错误"""
+
+
+def _literal(text: str) -> Any:
+    """JSON字面量（数字、带引号字符串、true/false/null、列表），否则按裸字符串处理"""
+    text = text.strip()
+    try:
+        return json.loads(text)
+    except ValueError:
+        return text
+
+
+def _getter(path: str) -> Callable[[Any], Any]:
+    """事件字段读取：event_type / agent_id / tags / payload.a.b"""
+    head, *rest = path.split(".")
+    if head == "payload":
+        def get(event):
+            value = event.payload
+            for key in rest:
+                if not isinstance(value, dict):
+                    return None
+                value = value.get(key)
+            return value
+        return get
+    if rest:
+        raise ConditionError(f"无法解析的字段: {path}")
+    return lambda event: getattr(event, head, None)
+
+
+def _split(text: str, separator: str) -> List[str]:
+    """按分隔符拆分（引号内的分隔符不拆分）"""
+    parts: List[str] = []
+    start = 0
+    quote = ""
+    i = 0
+    while i < len(text):
+        ch = text[i]
+        if quote:
+            if ch == "\\":
+                i += 1
+            elif ch == quote:
+                quote = ""
+        elif ch in "\"'":
+            quote = ch
+        elif text.startswith(separator, i):
+            parts.append(text[start:i])
+            i += len(separator)
+            start = i
+            continue
+        i += 1
+    if quote:
+        raise ConditionError(f"字符串字面量未闭合: {text!r}")
+    parts.append(text[start:])
+    return parts
+
+
+def compile_condition(condition: str) -> Tuple[List[str], Callable[[Any], bool]]:
+    """
+    编译触发条件
+
+    Returns:
+        (监听的事件类型列表, 谓词 predicate(event) -> bool)
+    """
+    selector_text, *rest = _split(condition, " if ")
+    clause_text = " if ".join(rest)
+    event_types = []
+    for selector in selector_text.split("|"):
+        selector = selector.strip()
+        if not _SELECTOR.match(selector):
+            raise ConditionError(f"无法解析的事件选择器: {selector!r} (条件: {condition!r})")
+        event_types.append(selector.replace(".", "_"))
+
+    checks: List[Callable[[Any], bool]] = []
+    for clause in (c.strip() for c in _split(clause_text, " and ")) if clause_text else ():
+        match = _CLAUSE.match(clause)
+        if not match:
+            raise ConditionError(f"无法解析的条件子句: {clause!r} (条件: {condition!r})")
+        get = _getter(match.group("path"))
+        if match.group("op") is None:
+            checks.append(lambda event, get=get: bool(get(event)))
+        else:
+            op, value = _OPERATORS[match.group("op")], _literal(match.group("value"))
+            checks.append(lambda event, get=get, op=op, value=value: _safe(op, get(event), value))
+
+    if not checks:
+        return event_types, lambda event: True
+    return event_types, lambda event: all(check(event) for check in checks)
+
+
+def _safe(op: Callable[[Any, Any], bool], left: Any, right: Any) -> bool:
+    try:
+        return op(left, right)
+    except TypeError:
+        return False
+
+
+@dataclass
+class CompiledTrigger:
+    """编译后的触发器"""
+    rule: Any                               # TriggerRule（需有 id/condition/action/cooldown_minutes/probability/last_triggered）
+    event_types: List[str]
+    predicate: Callable[[Any], bool]
+    verb: str
+    argument: str
+
+    def cooling_down(self, now: datetime) -> bool:
+        last = self.rule.last_triggered
+        return bool(last and self.rule.cooldown_minutes and now < last + timedelta(minutes=self.rule.cooldown_minutes))
+
+
+class TriggerEngine:
+    """触发器引擎"""
+
+    def __init__(self, actions: Dict[str, Callable[[Any, Any, str], Awaitable[None]]]):
+        """
+        Args:
+            actions: {动词: async handler(rule, event, 参数)}
+        """
+        self.actions = actions
+        self.triggers: Dict[str, CompiledTrigger] = {}
+        self._by_type: Dict[str, List[CompiledTrigger]] = {}
+        self._attached: Optional[Tuple[Any, str]] = None    # (事件总线, 订阅者名称)
+        self.stats = {
+            "events": 0,
+            "evaluated": 0,
+            "fired": 0,
+            "cooldown": 0,
+            "probability": 0,
+            "failed": 0
+        }
+
+    def register(self, rule) -> CompiledTrigger:
+        """编译并索引一条规则（条件语法错误或动作未注册时抛出 ConditionError）"""
+        verb, _, argument = rule.action.partition(":")
+        if verb not in self.actions:
+            raise ConditionError(f"触发器 {rule.id} 的动作未注册: {rule.action}")
+        if rule.id in self.triggers:
+            self.unregister(rule.id)
+        event_types, predicate = compile_condition(rule.condition)
+        compiled = CompiledTrigger(rule, event_types, predicate, verb, argument)
+        self.triggers[rule.id] = compiled
+        for event_type in event_types:
+            self._by_type.setdefault(event_type, []).append(compiled)
+        self._sync_subscription()
+        return compiled
+
+    def register_all(self, rules: List[Any]):
+        for rule in rules:
+            self.register(rule)
+
+    def unregister(self, rule_id: str):
+        compiled = self.triggers.pop(rule_id, None)
+        if compiled:
+            for event_type in compiled.event_types:
+                self._by_type[event_type].remove(compiled)
+            self._sync_subscription()
+
+    def event_types(self) -> List[str]:
+        """已注册规则监听的事件类型"""
+        return [event_type for event_type, triggers in self._by_type.items() if triggers]
+
+    def attach(self, bus, name: str = "triggers"):
+        """订阅事件总线（只订阅规则监听的事件类型，之后注册/注销规则时同步更新）"""
+        self._attached = (bus, name)
+        bus.subscribe(name, self.dispatch, event_types=self._subscribed_types())
+
+    def _subscribed_types(self) -> List[str]:
+        # 没有规则时订阅一个不会出现的类型（空列表表示订阅全部事件）
+        return self.event_types() or ["__no_triggers__"]
+
+    def _sync_subscription(self):
+        if self._attached is None:
+            return
+        bus, name = self._attached
+        if set(self._subscribed_types()) != bus.subscriptions[name].event_types:
+            bus.resubscribe(name, event_types=self._subscribed_types())
+
+    async def dispatch(self, event):
+        """评估监听该事件类型的规则，满足条件、不在冷却中且通过概率判断时执行动作"""
+        self.stats["events"] += 1
+        for compiled in list(self._by_type.get(event.event_type, ())):
+            self.stats["evaluated"] += 1
+            if not compiled.predicate(event):
+                continue
+            now = datetime.now()
+            if compiled.cooling_down(now):
+                self.stats["cooldown"] += 1
+                continue
+            if random.random() > compiled.rule.probability:
+                self.stats["probability"] += 1
+                continue
+
+            compiled.rule.last_triggered = now
+            self.stats["fired"] += 1
+            try:
+                await self.actions[compiled.verb](compiled.rule, event, compiled.argument)
+            except Exception as e:
+                self.stats["failed"] += 1
+                print(f"   ⚠️ Trigger {compiled.rule.id} failed: {e}")
+
+    def get_stats(self) -> Dict:
+        """触发统计"""
+        return {**self.stats, "rules": len(self.triggers), "event_types": len(self.event_types())}